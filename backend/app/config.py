@@ -10,9 +10,98 @@ class Settings(BaseSettings):
     jwt_secret: str = "your-super-secret-jwt-key"
     jwt_algorithm: str = "HS256"
     access_token_expire_minutes: int = 10080  # 7 days
+    auth_token_mode: str = "session"  # session (long-lived, sub only) or claims
+    claims_token_expire_minutes: int = 15  # claims mode: entitlements are this stale at most
+    refresh_token_expire_days: int = 30
+    
+    # Token revocation (Bloom filter mirrored from revoked_tokens)
+    revocation_poll_seconds: float = 2.0  # revocations from other processes apply within this
+    revocation_rebuild_seconds: float = 3600.0  # full reload, dropping expired entries
+    revocation_filter_capacity: int = 100_000
+    revocation_filter_error_rate: float = 0.001
+    principal_cache_ttl_seconds: float = 30.0  # max staleness of the cached user; 0 disables
+    principal_cache_max_entries: int = 10000
+    
+    # Password hashing (bcrypt runs in a worker pool, off the event loop)
+    bcrypt_rounds: int = 12  # stored hashes with another cost are rehashed at login
+    password_pool_workers: int = 2
+    password_max_queue: int = 16  # hashes allowed to wait; beyond this auth returns 429
+    password_retry_after_seconds: int = 2
     
     # Gemini
     gemini_api_key: str = ""
+    gemini_model: str = "gemini-2.0-flash"
+    gemini_fallback_model: str = "gemini-2.0-flash-lite"  # empty disables routing
+    gemini_latency_slo_seconds: float = 8.0  # primary p95 above this shifts traffic
+    gemini_route_queue_threshold: int = 12  # ...as does this many waiting scans
+    gemini_route_error_rate: float = 0.2
+    gemini_route_min_dwell_seconds: float = 30.0
+    gemini_route_window_seconds: float = 60.0  # latency/error stats look back this far
+    gemini_max_concurrency: int = 8  # model calls in flight per process
+    gemini_max_queue: int = 16  # scans allowed to wait for a free slot
+    gemini_timeout_seconds: float = 30.0  # per scan, retries and hedges included
+    gemini_retry_after_seconds: int = 5
+    gemini_retry_attempts: int = 3  # total attempts per scan, first one included
+    gemini_retry_base_delay: float = 0.5
+    gemini_retry_max_delay: float = 4.0
+    gemini_retry_budget_ratio: float = 0.2  # retries allowed per first attempt
+    gemini_breaker_failure_threshold: int = 5
+    gemini_breaker_reset_seconds: float = 30.0
+    gemini_hedge_enabled: bool = False
+    gemini_hedge_min_delay: float = 2.0  # never hedge sooner than this
+    
+    # Image preprocessing
+    scan_max_upload_bytes: int = 15 * 1024 * 1024
+    image_max_edge: int = 1024  # longest edge sent to the model, in pixels
+    image_jpeg_quality: int = 85
+    image_max_pixels: int = 50_000_000
+    image_pool_workers: int = 2
+    image_preview_edge: int = 640
+    image_thumb_edge: int = 160
+    
+    # Image quality gate (rejects unusable photos before the model call)
+    image_quality_gate_enabled: bool = True
+    image_quality_edge: int = 256  # scores are computed on a copy this size
+    image_min_sharpness: float = 20.0  # Laplacian variance
+    image_min_brightness: float = 35.0  # mean gray level, 0-255
+    image_max_brightness: float = 225.0
+    image_max_clipped: float = 0.6  # share of crushed or blown-out pixels
+    image_max_center_offset: float = 0.3  # detail centroid distance from centre
+    
+    # Scan image storage
+    blob_store_backend: str = "local"  # local or gridfs
+    blob_store_path: str = "data/blobs"
+    
+    # Analysis cache
+    analysis_cache_enabled: bool = True
+    analysis_cache_ttl_seconds: int = 30 * 86400
+    analysis_cache_max_entries: int = 2048  # in-process LRU size
+    
+    # Courses
+    course_chapter_storage: str = "embedded"  # or "collection"; see app.tools.normalize_chapters
+    course_import_batch_size: int = 500  # writes per bulk_write
+    course_import_max_line_bytes: int = 1024 * 1024
+    
+    # Course catalog cache
+    catalog_cache_enabled: bool = True
+    catalog_version_poll_seconds: float = 2.0  # edits from other processes show within this
+    catalog_cache_max_entries: int = 1000  # bodies kept per catalog version
+    
+    # Course search
+    search_index_enabled: bool = True  # else every search uses the Mongo text index
+    search_index_rebuild_seconds: float = 3600.0  # full rebuild; edits are applied as they happen
+    
+    # Per-user scan stats
+    scan_stats_ema_alpha: float = 0.3
+    scan_stats_recent_window: int = 5  # scans in the rolling average
+    scan_stats_series_points: int = 180  # days kept in the time series
+    
+    # Scan jobs
+    scan_job_workers: int = 2  # in-process workers; 0 when running app.worker separately
+    scan_job_lease_seconds: int = 90
+    scan_job_max_attempts: int = 3
+    scan_job_poll_seconds: float = 1.0
+    scan_job_retention_seconds: int = 86400  # finished jobs are dropped after this
     
     # Stripe
     stripe_secret_key: str = ""
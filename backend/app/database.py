@@ -12,7 +12,29 @@ async def connect_to_mongo():
     
     # Create indexes
     await db.users.create_index("email", unique=True)
-    await db.scans.create_index("userId")
+    # History pages and "latest scan" are range reads on this index
+    await db.scans.create_index([("userId", 1), ("createdAt", -1), ("_id", -1)])
+    await db.scans.create_index("jobId", unique=True, sparse=True)
+    await db.scans.create_index("promptVersion")
+    await db.scan_jobs.create_index([("status", 1), ("createdAt", 1)])
+    await db.scan_jobs.create_index(
+        "finishedAt", expireAfterSeconds=settings.scan_job_retention_seconds
+    )
+    await db.analysis_cache.create_index(
+        "createdAt", expireAfterSeconds=settings.analysis_cache_ttl_seconds
+    )
+    await db.refresh_tokens.create_index("expiresAt", expireAfterSeconds=0)
+    await db.revoked_tokens.create_index("expiresAt", expireAfterSeconds=0)
+    await db.revoked_tokens.create_index("revokedAt")
+    await db.refresh_tokens.create_index("family")
+    await db.refresh_tokens.create_index("userId")
+    await db.chapters.create_index([("courseId", 1), ("moduleId", 1), ("order", 1), ("createdAt", 1)])
+    # Course search before the in-memory index is built
+    await db.courses.create_index(
+        [("title", "text"), ("description", "text"), ("modules.title", "text"), ("modules.chapters.title", "text")],
+        weights={"title": 10, "modules.title": 4, "modules.chapters.title": 2, "description": 1},
+        name="course_search"
+    )
     await db.progress.create_index([("userId", 1), ("courseId", 1)], unique=True)
     
     print("Connected to MongoDB")
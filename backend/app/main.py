@@ -1,17 +1,33 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 
+from .config import settings
 from .database import connect_to_mongo, close_mongo_connection
 from .routers import auth, users, courses, scan, payment, progress
+from .services.course_search import start_search_index
+from .services.gemini import get_analyzer_stats
+from .services.revocation import get_revocation_stats, refresh_revocations, start_revocation_poller
+from .services.scan_jobs import start_workers
+from .utils.metrics import get_metrics
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await connect_to_mongo()
+    await refresh_revocations(full=True)
+    stop_workers = asyncio.Event()
+    worker_tasks = start_workers(settings.scan_job_workers, stop_workers)
+    worker_tasks += start_revocation_poller(stop_workers)
+    worker_tasks += start_search_index()
     yield
     # Shutdown
+    stop_workers.set()
+    for task in worker_tasks:
+        task.cancel()
+    await asyncio.gather(*worker_tasks, return_exceptions=True)
     await close_mongo_connection()
 
 
@@ -29,6 +45,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Include routers
@@ -51,4 +68,12 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    analyzer = get_analyzer_stats()
+    # The API stays up while the model is down; report it as degraded
+    status = "degraded" if analyzer["circuit"]["state"] != "closed" else "healthy"
+    return {"status": status, "analyzer": analyzer, "revocation": get_revocation_stats()}
+
+
+@app.get("/metrics")
+async def metrics():
+    return get_metrics()
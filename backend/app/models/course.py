@@ -66,6 +66,28 @@ class CourseResponse(BaseModel):
         populate_by_name = True
 
 
+class CourseSummary(BaseModel):
+    """Catalog-screen view of a course: no modules."""
+    id: str
+    title: str
+    description: str
+    thumbnail: Optional[str] = None
+    isActive: bool = True
+    totalDuration: int = 0
+    totalChapters: int = 0
+    createdAt: Optional[datetime] = None
+
+
+class CourseSearchHit(BaseModel):
+    type: str  # course, module or chapter
+    courseId: str
+    moduleId: Optional[str] = None
+    chapterId: Optional[str] = None
+    title: str
+    courseTitle: str
+    score: float
+
+
 class CourseUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
@@ -87,3 +109,35 @@ class ChapterCreate(BaseModel):
     duration: Optional[int] = None
     order: int = 0
     thumbnail: Optional[str] = None
+
+
+class ModuleUpdate(BaseModel):
+    title: Optional[str] = None
+    description: Optional[str] = None
+    order: Optional[int] = None
+    thumbnail: Optional[str] = None
+
+
+class ChapterUpdate(BaseModel):
+    title: Optional[str] = None
+    type: Optional[str] = None
+    content: Optional[str] = None
+    duration: Optional[int] = None
+    order: Optional[int] = None
+    thumbnail: Optional[str] = None
+
+
+class CourseImport(CourseBase):
+    """A course record in an NDJSON import."""
+    isActive: bool = True
+
+
+class CourseImportResult(BaseModel):
+    courses: List[str]  # ids of the created courses
+    modules: int
+    chapters: int
+
+
+class OrderUpdate(BaseModel):
+    """Module or chapter ids in their new order."""
+    ids: List[str] = Field(..., min_length=1)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Dict, Optional, List, Union
 from datetime import datetime
 
 
@@ -17,6 +17,15 @@ class ScanAnalysis(BaseModel):
     topPriorities: List[str] = []
 
 
+class LockedCategory(BaseModel):
+    name: str
+
+
+class LockedAnalysis(BaseModel):
+    """What a free user sees of an analysis: the category names."""
+    categories: List[LockedCategory] = []
+
+
 class ScanBase(BaseModel):
     imageUrl: Optional[str] = None
 
@@ -29,7 +38,8 @@ class ScanInDB(ScanBase):
     id: Optional[str] = Field(None, alias="_id")
     userId: str
     analysis: Optional[ScanAnalysis] = None
-    isBlurred: bool = True  # Blurred until subscribed
+    isFallback: bool = False
+    model: Optional[str] = None  # Gemini model that produced the analysis
     createdAt: datetime = Field(default_factory=datetime.utcnow)
 
     class Config:
@@ -40,9 +50,78 @@ class ScanResponse(BaseModel):
     id: str
     userId: str
     imageUrl: Optional[str] = None
-    analysis: Optional[ScanAnalysis] = None
-    isBlurred: bool = True
+    imagePath: Optional[str] = None  # stored copy, see GET /scans/{id}/image
+    analysis: Optional[Union[ScanAnalysis, LockedAnalysis]] = None
+    isFallback: bool = False  # analysis is a placeholder, the model failed
+    model: Optional[str] = None
+    isBlurred: bool = True  # no active subscription: analysis is LockedAnalysis
     createdAt: Optional[datetime] = None
 
     class Config:
         populate_by_name = True
+
+
+class CategoryScore(BaseModel):
+    name: str
+    score: float
+
+
+class ScanSummary(BaseModel):
+    """History-list view of a scan: scores only, no text."""
+    id: str
+    overallScore: Optional[float] = None
+    categories: List[CategoryScore] = []
+    isFallback: bool = False
+    isBlurred: bool = True
+    createdAt: Optional[datetime] = None
+
+
+class ScorePoint(BaseModel):
+    score: float
+    at: datetime
+    scanId: str
+
+
+class CategoryStats(BaseModel):
+    name: str
+    count: int
+    min: float
+    max: float
+    ema: float  # exponential moving average, recent scans weigh more
+    latest: float
+
+
+class SeriesPoint(BaseModel):
+    day: str  # YYYY-MM-DD (UTC)
+    average: float
+    count: int
+
+
+class ScanStats(BaseModel):
+    count: int = 0
+    first: Optional[ScorePoint] = None
+    latest: Optional[ScorePoint] = None
+    average: Optional[float] = None
+    rollingAverage: Optional[float] = None  # mean of the last few scans
+    categories: Dict[str, CategoryStats] = {}
+    series: List[SeriesPoint] = []  # one point per day with scans
+    isBlurred: bool = True  # no active subscription: only count is filled in
+    updatedAt: Optional[datetime] = None
+
+
+class ScanJobAccepted(BaseModel):
+    jobId: str
+    status: str
+    statusUrl: str
+    eventsUrl: str
+
+
+class ScanJobResponse(BaseModel):
+    id: str
+    status: str  # queued, running, done, failed
+    attempts: int = 0
+    scanId: Optional[str] = None
+    error: Optional[str] = None
+    scan: Optional[ScanResponse] = None
+    createdAt: Optional[datetime] = None
+    updatedAt: Optional[datetime] = None
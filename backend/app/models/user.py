@@ -87,7 +87,22 @@ class UserUpdate(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None  # claims mode only
+    expires_in: Optional[int] = None  # seconds, claims mode only
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
 
 
 class TokenData(BaseModel):
     user_id: Optional[str] = None
+    jti: Optional[str] = None  # absent on tokens issued before revocation existed
+    expiresAt: Optional[datetime] = None
+    # Signed entitlement claims, present on claims-mode tokens
+    isAdmin: Optional[bool] = None
+    subscription: Optional[dict] = None
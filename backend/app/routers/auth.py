@@ -1,8 +1,25 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi.security import HTTPAuthorizationCredentials
 from datetime import timedelta
-from ..models.user import UserCreate, UserLogin, UserResponse, Token
+from ..models.user import UserCreate, UserLogin, UserResponse, Token, RefreshRequest, LogoutRequest
 from ..database import get_database
-from ..utils.auth import get_password_hash, verify_password, create_access_token
+from ..services.refresh_tokens import (
+    create_refresh_token,
+    rotate_refresh_token,
+    revoke_refresh_token_family,
+    InvalidRefreshTokenError
+)
+from ..services.revocation import revoke_token
+from ..utils.auth import (
+    hash_password,
+    verify_and_update_password,
+    create_access_token,
+    create_claims_token,
+    verify_token,
+    security,
+    PasswordHasherBusyError,
+    PRINCIPAL_PROJECTION
+)
 from ..config import settings
 from bson import ObjectId
 from datetime import datetime
@@ -10,6 +27,74 @@ from datetime import datetime
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 
+def _busy(e: PasswordHasherBusyError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
+async def _issue_tokens(user: dict) -> dict:
+    """
+    The tokens a sign-in returns.
+    
+    In ``session`` mode a long-lived access token with only ``sub``; in
+    ``claims`` mode a short-lived one carrying the user's entitlements plus
+    a refresh token.
+    """
+    user_id = str(user["_id"])
+    
+    if settings.auth_token_mode != "claims":
+        access_token = create_access_token(
+            data={"sub": user_id},
+            expires_delta=timedelta(minutes=settings.access_token_expire_minutes)
+        )
+        return {"access_token": access_token, "token_type": "bearer"}
+    
+    return {
+        "access_token": create_claims_token(user),
+        "token_type": "bearer",
+        "refresh_token": await create_refresh_token(user_id),
+        "expires_in": settings.claims_token_expire_minutes * 60
+    }
+
+
+async def _authenticate(user_data: UserLogin) -> dict:
+    """
+    The user matching the credentials, or 401.
+    
+    A hash made with another bcrypt cost is replaced on a successful login.
+    """
+    db = get_database()
+    
+    user = await db.users.find_one({"email": user_data.email})
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password"
+        )
+    
+    try:
+        verified, new_hash = await verify_and_update_password(user_data.password, user["password"])
+    except PasswordHasherBusyError as e:
+        raise _busy(e)
+    
+    if not verified:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password"
+        )
+    
+    if new_hash:
+        await db.users.update_one(
+            {"_id": user["_id"], "password": user["password"]},
+            {"$set": {"password": new_hash, "updatedAt": datetime.utcnow()}}
+        )
+    
+    return user
+
+
 @router.post("/register", response_model=Token)
 async def register(user_data: UserCreate):
     """Register a new user."""
@@ -23,11 +108,16 @@ async def register(user_data: UserCreate):
             detail="Email already registered"
         )
     
+    try:
+        password_hash = await hash_password(user_data.password)
+    except PasswordHasherBusyError as e:
+        raise _busy(e)
+    
     # Create user document
     user_doc = {
         "email": user_data.email,
         "name": user_data.name,
-        "password": get_password_hash(user_data.password),
+        "password": password_hash,
         "onboarding": {
             "age": None,
             "gender": None,
@@ -50,74 +140,82 @@ async def register(user_data: UserCreate):
     }
     
     result = await db.users.insert_one(user_doc)
-    user_id = str(result.inserted_id)
+    user_doc["_id"] = result.inserted_id
     
-    # Create access token
-    access_token = create_access_token(
-        data={"sub": user_id},
-        expires_delta=timedelta(minutes=settings.access_token_expire_minutes)
-    )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+    return await _issue_tokens(user_doc)
 
 
 @router.post("/login", response_model=Token)
 async def login(user_data: UserLogin):
     """Login and get access token."""
-    db = get_database()
+    user = await _authenticate(user_data)
     
-    user = await db.users.find_one({"email": user_data.email})
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password"
-        )
-    
-    if not verify_password(user_data.password, user["password"]):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password"
-        )
-    
-    user_id = str(user["_id"])
-    
-    access_token = create_access_token(
-        data={"sub": user_id},
-        expires_delta=timedelta(minutes=settings.access_token_expire_minutes)
-    )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+    return await _issue_tokens(user)
 
 
 @router.post("/admin/login", response_model=Token)
 async def admin_login(user_data: UserLogin):
     """Admin login endpoint."""
-    db = get_database()
+    user = await _authenticate(user_data)
     
-    user = await db.users.find_one({"email": user_data.email})
-    if not user:
+    if not user.get("isAdmin", False):
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized for admin access"
         )
     
-    if not verify_password(user_data.password, user["password"]):
+    return await _issue_tokens(user)
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh(request: RefreshRequest):
+    """
+    Exchange a refresh token for a new access/refresh pair.
+    
+    The access token's claims are read fresh from the user, so call this
+    after a subscription change. The presented refresh token is spent.
+    """
+    db = get_database()
+    
+    try:
+        user_id, refresh_token = await rotate_refresh_token(request.refresh_token)
+    except InvalidRefreshTokenError as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password"
+            detail=str(e)
         )
     
-    if not user.get("isAdmin", False):
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, PRINCIPAL_PROJECTION)
+    if not user:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized for admin access"
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
         )
     
-    user_id = str(user["_id"])
-    
-    access_token = create_access_token(
-        data={"sub": user_id},
-        expires_delta=timedelta(minutes=settings.access_token_expire_minutes)
-    )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {
+        "access_token": create_claims_token(user),
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": settings.claims_token_expire_minutes * 60
+    }
+
+
+@router.post("/logout")
+async def logout(
+    request: LogoutRequest = None,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """
+    Revoke the presented access token, and the refresh token if given.
+    
+    Tokens issued before revocation existed carry no id and stay valid
+    until they expire.
+    """
+    token_data = await verify_token(credentials.credentials)
+    
+    if token_data.jti and token_data.expiresAt:
+        await revoke_token(token_data.jti, token_data.user_id, token_data.expiresAt)
+    if request and request.refresh_token:
+        await revoke_refresh_token_family(request.refresh_token)
+    
+    return {"message": "Logged out"}
@@ -1,12 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Union
 from ..models.course import (
-    CourseCreate, CourseResponse, CourseUpdate,
-    Module, ModuleCreate, Chapter, ChapterCreate
+    CourseCreate, CourseImportResult, CourseResponse, CourseSearchHit, CourseSummary, CourseUpdate,
+    Module, ModuleCreate, ModuleUpdate, Chapter, ChapterCreate, ChapterUpdate,
+    OrderUpdate
 )
 from ..database import get_database
+from ..services import courses as course_edits
+from ..services.course_bulk import InvalidImportError, export_courses, import_courses
+from ..services.course_search import search_catalog
+from ..services.catalog import (
+    bump_catalog_version, course_body, course_list_body, module_body,
+    parse_fields, read_courses, SUMMARY_FIELDS
+)
 from ..utils.auth import get_current_active_user, get_admin_user
+from ..utils.serialization import DocumentResponse
 from bson import ObjectId
+from pymongo import ReturnDocument
 from datetime import datetime
 import uuid
 
@@ -17,58 +28,142 @@ def generate_id():
     return str(uuid.uuid4())
 
 
-@router.get("/", response_model=List[CourseResponse])
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _catalog_response(request: Request, body: bytes, etag: str) -> Response:
+    """A cached catalog body, or an empty 304 when the client already has it."""
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _selected_fields(fields: Optional[str]):
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/", response_model=Union[List[CourseResponse], List[CourseSummary]])
 async def list_courses(
+    request: Request,
+    view: str = Query("full", pattern="^(full|summary)$"),
+    fields: Optional[str] = Query(None, description="Comma-separated course fields to return"),
     current_user: dict = Depends(get_current_active_user)
 ):
-    """List all active courses."""
-    db = get_database()
+    """
+    List all active courses (cached; honours If-None-Match).
+    
+    ``view=summary`` leaves out the modules; ``fields`` returns only the
+    named fields (plus ``id``) and overrides ``view``.
+    """
+    selected = _selected_fields(fields)
+    if selected is None and view == "summary":
+        selected = SUMMARY_FIELDS
+    
+    body, etag = await course_list_body(selected)
+    return _catalog_response(request, body, etag)
+
+
+# Declared before /{course_id} so "search" and "export" are not taken for a course id
+@router.get("/search", response_model=List[CourseSearchHit])
+async def search_courses(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Search active courses, modules and chapters, best matches first.
     
-    courses = await db.courses.find({"isActive": True}).to_list(100)
+    Matches titles and course descriptions by word, word prefix, or with a
+    typo. When there are more hits, the ``X-Next-Cursor`` header carries
+    the ``cursor`` for the next page.
+    """
+    try:
+        offset = int(cursor) if cursor else 0
+        if offset < 0:
+            raise ValueError
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    hits, more = await search_catalog(q, limit, offset)
+    headers = {"X-Next-Cursor": str(offset + limit)} if more else None
+    return DocumentResponse(hits, CourseSearchHit, headers=headers)
+
+
+@router.get("/export")
+async def export_catalog(
+    admin_user: dict = Depends(get_admin_user)
+):
+    """Stream every course as NDJSON, in the import format (admin only)."""
+    return StreamingResponse(
+        export_courses(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="courses.ndjson"'}
+    )
+
+
+@router.post("/import", response_model=CourseImportResult)
+async def import_catalog(
+    request: Request,
+    admin_user: dict = Depends(get_admin_user)
+):
+    """
+    Create courses from an NDJSON upload (admin only).
     
-    return [
-        CourseResponse(
-            id=str(course["_id"]),
-            title=course["title"],
-            description=course["description"],
-            thumbnail=course.get("thumbnail"),
-            modules=course.get("modules", []),
-            isActive=course.get("isActive", True),
-            totalDuration=course.get("totalDuration", 0),
-            totalChapters=course.get("totalChapters", 0),
-            createdAt=course.get("createdAt")
-        )
-        for course in courses
-    ]
+    The body is read as a stream: one course, module or chapter record per
+    line (see ``app.services.course_bulk``). A bad record rejects the whole
+    upload with its line number.
+    """
+    try:
+        return await import_courses(request.stream())
+    except InvalidImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/{course_id}", response_model=CourseResponse)
 async def get_course(
     course_id: str,
+    request: Request,
+    fields: Optional[str] = Query(None, description="Comma-separated course fields to return"),
     current_user: dict = Depends(get_current_active_user)
 ):
-    """Get a specific course with all modules and chapters."""
-    db = get_database()
-    
-    try:
-        course = await db.courses.find_one({"_id": ObjectId(course_id)})
-    except:
+    """Get a specific course with all modules and chapters (cached; honours If-None-Match)."""
+    selected = _selected_fields(fields)
+    if not ObjectId.is_valid(course_id):
         raise HTTPException(status_code=404, detail="Course not found")
     
-    if not course:
+    cached = await course_body(course_id, selected)
+    if cached is None:
         raise HTTPException(status_code=404, detail="Course not found")
     
-    return CourseResponse(
-        id=str(course["_id"]),
-        title=course["title"],
-        description=course["description"],
-        thumbnail=course.get("thumbnail"),
-        modules=course.get("modules", []),
-        isActive=course.get("isActive", True),
-        totalDuration=course.get("totalDuration", 0),
-        totalChapters=course.get("totalChapters", 0),
-        createdAt=course.get("createdAt")
-    )
+    return _catalog_response(request, *cached)
+
+
+@router.get("/{course_id}/modules/{module_id}", response_model=Module)
+async def get_module(
+    course_id: str,
+    module_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Get one module of a course with its chapters (cached; honours If-None-Match)."""
+    if not ObjectId.is_valid(course_id):
+        raise HTTPException(status_code=404, detail="Module not found")
+    
+    cached = await module_body(course_id, module_id)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Module not found")
+    
+    return _catalog_response(request, *cached)
 
 
 # Admin endpoints
@@ -77,24 +172,9 @@ async def list_all_courses(
     admin_user: dict = Depends(get_admin_user)
 ):
     """List all courses including inactive (admin only)."""
-    db = get_database()
-    
-    courses = await db.courses.find().to_list(100)
+    courses = await read_courses({})
     
-    return [
-        CourseResponse(
-            id=str(course["_id"]),
-            title=course["title"],
-            description=course["description"],
-            thumbnail=course.get("thumbnail"),
-            modules=course.get("modules", []),
-            isActive=course.get("isActive", True),
-            totalDuration=course.get("totalDuration", 0),
-            totalChapters=course.get("totalChapters", 0),
-            createdAt=course.get("createdAt")
-        )
-        for course in courses
-    ]
+    return DocumentResponse(courses, CourseResponse)
 
 
 @router.post("/", response_model=CourseResponse)
@@ -113,24 +193,34 @@ async def create_course(
         "isActive": True,
         "totalDuration": 0,
         "totalChapters": 0,
-        "createdAt": datetime.utcnow(),
-        "updatedAt": datetime.utcnow()
+        "createdAt": datetime.utcnow()
     }
     
-    result = await db.courses.insert_one(course_doc)
-    course_doc["_id"] = result.inserted_id
-    
-    return CourseResponse(
-        id=str(course_doc["_id"]),
-        title=course_doc["title"],
-        description=course_doc["description"],
-        thumbnail=course_doc.get("thumbnail"),
-        modules=[],
-        isActive=True,
-        totalDuration=0,
-        totalChapters=0,
-        createdAt=course_doc["createdAt"]
+    # An upsert rather than insert_one, so updatedAt comes from the database
+    course_doc = await db.courses.find_one_and_update(
+        {"_id": ObjectId()},
+        {"$setOnInsert": course_doc, "$currentDate": course_edits.TOUCH},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
     )
+    await bump_catalog_version()
+    
+    return DocumentResponse(course_doc, CourseResponse)
+
+
+async def _edited(course: Optional[dict], detail: str) -> DocumentResponse:
+    """Response for an atomic edit: 404 if it matched nothing, else bump the catalog."""
+    if course is None:
+        raise HTTPException(status_code=404, detail=detail)
+    await bump_catalog_version()
+    return DocumentResponse(course, CourseResponse)
+
+
+def _check_ids(course_id: str, order: Optional[OrderUpdate] = None):
+    if not ObjectId.is_valid(course_id):
+        raise HTTPException(status_code=404, detail="Course not found")
+    if order is not None and len(set(order.ids)) != len(order.ids):
+        raise HTTPException(status_code=400, detail="Duplicate ids in order")
 
 
 @router.put("/{course_id}", response_model=CourseResponse)
@@ -140,38 +230,16 @@ async def update_course(
     admin_user: dict = Depends(get_admin_user)
 ):
     """Update a course (admin only)."""
-    db = get_database()
-    
-    update_data = {}
-    if course_update.title is not None:
-        update_data["title"] = course_update.title
-    if course_update.description is not None:
-        update_data["description"] = course_update.description
-    if course_update.thumbnail is not None:
-        update_data["thumbnail"] = course_update.thumbnail
-    if course_update.isActive is not None:
-        update_data["isActive"] = course_update.isActive
-    
-    if update_data:
-        update_data["updatedAt"] = datetime.utcnow()
-        await db.courses.update_one(
-            {"_id": ObjectId(course_id)},
-            {"$set": update_data}
-        )
+    _check_ids(course_id)
     
-    course = await db.courses.find_one({"_id": ObjectId(course_id)})
+    update_data = course_update.model_dump(exclude_none=True)
+    if not update_data:
+        courses = await read_courses({"_id": ObjectId(course_id)}, limit=1)
+        if not courses:
+            raise HTTPException(status_code=404, detail="Course not found")
+        return DocumentResponse(courses[0], CourseResponse)
     
-    return CourseResponse(
-        id=str(course["_id"]),
-        title=course["title"],
-        description=course["description"],
-        thumbnail=course.get("thumbnail"),
-        modules=course.get("modules", []),
-        isActive=course.get("isActive", True),
-        totalDuration=course.get("totalDuration", 0),
-        totalChapters=course.get("totalChapters", 0),
-        createdAt=course.get("createdAt")
-    )
+    return await _edited(await course_edits.update_course(course_id, update_data), "Course not found")
 
 
 @router.delete("/{course_id}")
@@ -180,14 +248,17 @@ async def delete_course(
     admin_user: dict = Depends(get_admin_user)
 ):
     """Delete a course (admin only)."""
+    _check_ids(course_id)
     db = get_database()
     
     result = await db.courses.delete_one({"_id": ObjectId(course_id)})
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Course not found")
+    await bump_catalog_version()
     
-    # Delete related progress
+    # Delete its chapters (normalized layout) and related progress
+    await db.chapters.delete_many({"courseId": ObjectId(course_id)})
     await db.progress.delete_many({"courseId": course_id})
     
     return {"message": "Course deleted successfully"}
@@ -201,7 +272,7 @@ async def add_module(
     admin_user: dict = Depends(get_admin_user)
 ):
     """Add a module to a course (admin only)."""
-    db = get_database()
+    _check_ids(course_id)
     
     module = {
         "_id": generate_id(),
@@ -212,27 +283,34 @@ async def add_module(
         "chapters": []
     }
     
-    await db.courses.update_one(
-        {"_id": ObjectId(course_id)},
-        {
-            "$push": {"modules": module},
-            "$set": {"updatedAt": datetime.utcnow()}
-        }
-    )
-    
-    course = await db.courses.find_one({"_id": ObjectId(course_id)})
-    
-    return CourseResponse(
-        id=str(course["_id"]),
-        title=course["title"],
-        description=course["description"],
-        thumbnail=course.get("thumbnail"),
-        modules=course.get("modules", []),
-        isActive=course.get("isActive", True),
-        totalDuration=course.get("totalDuration", 0),
-        totalChapters=course.get("totalChapters", 0),
-        createdAt=course.get("createdAt")
-    )
+    return await _edited(await course_edits.add_module(course_id, module), "Course not found")
+
+
+# Declared before /{module_id} so "order" is not taken for a module id
+@router.put("/{course_id}/modules/order", response_model=CourseResponse)
+async def reorder_modules(
+    course_id: str,
+    order: OrderUpdate,
+    admin_user: dict = Depends(get_admin_user)
+):
+    """Set module order to the position of each id in ``ids`` (admin only)."""
+    _check_ids(course_id, order)
+    return await _edited(await course_edits.reorder_modules(course_id, order.ids), "Course or module not found")
+
+
+@router.put("/{course_id}/modules/{module_id}", response_model=CourseResponse)
+async def update_module(
+    course_id: str,
+    module_id: str,
+    module_update: ModuleUpdate,
+    admin_user: dict = Depends(get_admin_user)
+):
+    """Update a module's details (admin only)."""
+    _check_ids(course_id)
+    update_data = module_update.model_dump(exclude_none=True)
+    if not update_data:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    return await _edited(await course_edits.update_module(course_id, module_id, update_data), "Module not found")
 
 
 @router.delete("/{course_id}/modules/{module_id}")
@@ -242,15 +320,8 @@ async def delete_module(
     admin_user: dict = Depends(get_admin_user)
 ):
     """Delete a module from a course (admin only)."""
-    db = get_database()
-    
-    await db.courses.update_one(
-        {"_id": ObjectId(course_id)},
-        {
-            "$pull": {"modules": {"_id": module_id}},
-            "$set": {"updatedAt": datetime.utcnow()}
-        }
-    )
+    _check_ids(course_id)
+    await _edited(await course_edits.delete_module(course_id, module_id), "Module not found")
     
     return {"message": "Module deleted successfully"}
 
@@ -264,7 +335,7 @@ async def add_chapter(
     admin_user: dict = Depends(get_admin_user)
 ):
     """Add a chapter to a module (admin only)."""
-    db = get_database()
+    _check_ids(course_id)
     
     chapter = {
         "_id": generate_id(),
@@ -276,39 +347,52 @@ async def add_chapter(
         "thumbnail": chapter_data.thumbnail
     }
     
-    # Update the specific module's chapters array
-    await db.courses.update_one(
-        {"_id": ObjectId(course_id), "modules._id": module_id},
-        {
-            "$push": {"modules.$.chapters": chapter},
-            "$set": {"updatedAt": datetime.utcnow()}
-        }
-    )
-    
-    # Update total chapters count
-    course = await db.courses.find_one({"_id": ObjectId(course_id)})
-    total_chapters = sum(len(m.get("chapters", [])) for m in course.get("modules", []))
-    total_duration = sum(
-        c.get("duration", 0) 
-        for m in course.get("modules", []) 
-        for c in m.get("chapters", [])
+    return await _edited(await course_edits.add_chapter(course_id, module_id, chapter), "Module not found")
+
+
+@router.put("/{course_id}/modules/{module_id}/chapters/order", response_model=CourseResponse)
+async def reorder_chapters(
+    course_id: str,
+    module_id: str,
+    order: OrderUpdate,
+    admin_user: dict = Depends(get_admin_user)
+):
+    """Set chapter order to the position of each id in ``ids`` (admin only)."""
+    _check_ids(course_id, order)
+    return await _edited(
+        await course_edits.reorder_chapters(course_id, module_id, order.ids),
+        "Module or chapter not found"
     )
-    
-    await db.courses.update_one(
-        {"_id": ObjectId(course_id)},
-        {"$set": {"totalChapters": total_chapters, "totalDuration": total_duration}}
+
+
+@router.put("/{course_id}/modules/{module_id}/chapters/{chapter_id}", response_model=CourseResponse)
+async def update_chapter(
+    course_id: str,
+    module_id: str,
+    chapter_id: str,
+    chapter_update: ChapterUpdate,
+    admin_user: dict = Depends(get_admin_user)
+):
+    """Update a chapter (admin only)."""
+    _check_ids(course_id)
+    update_data = chapter_update.model_dump(exclude_none=True)
+    if not update_data:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    return await _edited(
+        await course_edits.update_chapter(course_id, module_id, chapter_id, update_data),
+        "Chapter not found"
     )
+
+
+@router.delete("/{course_id}/modules/{module_id}/chapters/{chapter_id}")
+async def delete_chapter(
+    course_id: str,
+    module_id: str,
+    chapter_id: str,
+    admin_user: dict = Depends(get_admin_user)
+):
+    """Delete a chapter from a module (admin only)."""
+    _check_ids(course_id)
+    await _edited(await course_edits.delete_chapter(course_id, module_id, chapter_id), "Chapter not found")
     
-    course = await db.courses.find_one({"_id": ObjectId(course_id)})
-    
-    return CourseResponse(
-        id=str(course["_id"]),
-        title=course["title"],
-        description=course["description"],
-        thumbnail=course.get("thumbnail"),
-        modules=course.get("modules", []),
-        isActive=course.get("isActive", True),
-        totalDuration=course.get("totalDuration", 0),
-        totalChapters=course.get("totalChapters", 0),
-        createdAt=course.get("createdAt")
-    )
+    return {"message": "Chapter deleted successfully"}
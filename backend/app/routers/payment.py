@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, Request, status
 from ..database import get_database
-from ..utils.auth import get_current_active_user
+from ..utils.auth import get_current_active_user, invalidate_principal
 from ..services.stripe_service import (
     create_customer,
     create_checkout_session,
@@ -10,6 +10,7 @@ from ..services.stripe_service import (
     handle_successful_payment
 )
 from ..config import settings
+from ..services.entitlements import has_full_access
 from bson import ObjectId
 from datetime import datetime
 from pydantic import BaseModel
@@ -49,6 +50,7 @@ async def create_checkout(
             {"_id": ObjectId(user_id)},
             {"$set": {"subscription.stripeCustomerId": customer_id}}
         )
+        invalidate_principal(user_id)
     
     # Create checkout session
     session = await create_checkout_session(user_id, customer_id)
@@ -80,6 +82,7 @@ async def create_mobile_payment_intent(
             {"_id": ObjectId(user_id)},
             {"$set": {"subscription.stripeCustomerId": customer_id}}
         )
+        invalidate_principal(user_id)
     
     # Create payment intent
     intent = await create_payment_intent(user_id, customer_id)
@@ -137,9 +140,14 @@ async def get_subscription_status(
 ):
     """Get current subscription status."""
     subscription = current_user.get("subscription", {})
+    is_active = has_full_access(current_user)
+    sub_status = subscription.get("status", "free")
+    # A one-off payment past expiresAt is still stored as "active"
+    if sub_status == "active" and not is_active:
+        sub_status = "expired"
     
     return {
-        "status": subscription.get("status", "free"),
+        "status": sub_status,
         "expiresAt": subscription.get("expiresAt"),
-        "isActive": subscription.get("status") == "active"
+        "isActive": is_active
     }
@@ -3,6 +3,7 @@ from typing import List
 from ..models.progress import ProgressCreate, ProgressResponse, ProgressUpdate
 from ..database import get_database
 from ..utils.auth import get_current_active_user
+from ..utils.serialization import DocumentResponse
 from bson import ObjectId
 from datetime import datetime
 
@@ -19,19 +20,7 @@ async def list_user_progress(
     
     progress_list = await db.progress.find({"userId": user_id}).to_list(100)
     
-    return [
-        ProgressResponse(
-            id=str(p["_id"]),
-            userId=p["userId"],
-            courseId=p["courseId"],
-            currentModuleId=p.get("currentModuleId"),
-            currentChapterId=p.get("currentChapterId"),
-            completedChapters=p.get("completedChapters", []),
-            percentComplete=p.get("percentComplete", 0.0),
-            lastAccessedAt=p.get("lastAccessedAt")
-        )
-        for p in progress_list
-    ]
+    return DocumentResponse(progress_list, ProgressResponse)
 
 
 @router.get("/{course_id}", response_model=ProgressResponse)
@@ -64,16 +53,7 @@ async def get_course_progress(
         result = await db.progress.insert_one(progress)
         progress["_id"] = result.inserted_id
     
-    return ProgressResponse(
-        id=str(progress["_id"]),
-        userId=progress["userId"],
-        courseId=progress["courseId"],
-        currentModuleId=progress.get("currentModuleId"),
-        currentChapterId=progress.get("currentChapterId"),
-        completedChapters=progress.get("completedChapters", []),
-        percentComplete=progress.get("percentComplete", 0.0),
-        lastAccessedAt=progress.get("lastAccessedAt")
-    )
+    return DocumentResponse(progress, ProgressResponse)
 
 
 @router.put("/{course_id}", response_model=ProgressResponse)
@@ -87,7 +67,7 @@ async def update_progress(
     user_id = current_user["_id"]
     
     # Get the course to calculate percentage
-    course = await db.courses.find_one({"_id": ObjectId(course_id)})
+    course = await db.courses.find_one({"_id": ObjectId(course_id)}, {"totalChapters": 1})
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
     
@@ -144,16 +124,7 @@ async def update_progress(
     # Get updated progress
     progress = await db.progress.find_one({"_id": progress["_id"]})
     
-    return ProgressResponse(
-        id=str(progress["_id"]),
-        userId=progress["userId"],
-        courseId=progress["courseId"],
-        currentModuleId=progress.get("currentModuleId"),
-        currentChapterId=progress.get("currentChapterId"),
-        completedChapters=progress.get("completedChapters", []),
-        percentComplete=progress.get("percentComplete", 0.0),
-        lastAccessedAt=progress.get("lastAccessedAt")
-    )
+    return DocumentResponse(progress, ProgressResponse)
 
 
 @router.post("/{course_id}/complete-chapter/{chapter_id}")
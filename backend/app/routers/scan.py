@@ -1,150 +1,509 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List
-from ..models.scan import ScanCreate, ScanResponse, ScanAnalysis
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response, StreamingResponse
+from pydantic import ValidationError
+from typing import List, Optional, Tuple, Union
+from ..models.scan import (
+    ScanCreate, ScanResponse, ScanSummary, ScanStats, ScanAnalysis, ScanJobAccepted,
+    ScanJobResponse
+)
+from ..config import settings
 from ..database import get_database
-from ..utils.auth import get_current_active_user
-from ..services.gemini import analyze_face
+from ..utils.auth import get_current_principal
+from ..utils.serialization import DocumentResponse, serializer_for
+from ..utils.uploads import is_multipart, read_body, read_multipart_upload
+from ..services.gemini import AnalyzerBusyError, get_default_analysis
+from ..services.analysis_cache import analyze_face_cached, stream_analyze_face_cached
+from ..services.scans import (
+    SCAN_HISTORY_SORT, list_scans, save_scan, scan_summary_view, scan_to_response, scan_view
+)
+from ..services.image_processing import (
+    InvalidImageError, decode_base64_image, normalize_image_async, image_info
+)
+from ..services.image_quality import REASONS, assess_image_quality_async
+from ..services.entitlements import has_full_access, scan_projection
+from ..services.scan_stats import get_scan_stats
+from ..services.scan_jobs import enqueue_scan_job, get_scan_job
+from ..services.blob_store import load_scan_image, store_scan_image
 from bson import ObjectId
-from datetime import datetime
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/scans", tags=["Face Scans"])
 
 
-@router.post("/analyze", response_model=ScanResponse)
+# Either the legacy JSON body (base64 image) or a streamed multipart form
+SCAN_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": ScanCreate.model_json_schema()},
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["image"],
+                    "properties": {
+                        "image": {"type": "string", "format": "binary"},
+                        "imageUrl": {"type": "string"}
+                    }
+                }
+            }
+        }
+    }
+}
+
+
+async def _read_scan_upload(request: Request) -> Tuple[dict, Optional[str]]:
+    """
+    Read a scan upload and normalize its image.
+    
+    Multipart bodies are streamed straight into raw bytes; JSON bodies carry
+    the image as base64 in ``imageBase64``. Photos that fail the quality gate
+    are rejected with 422 and the reasons.
+    
+    Returns:
+        tuple: (normalized image dict, client image URL)
+    """
+    max_bytes = settings.scan_max_upload_bytes
+    
+    try:
+        if is_multipart(request):
+            upload = await read_multipart_upload(request, "image", max_bytes)
+            raw_image = upload["file"]
+            image_url = upload["fields"].get("imageUrl") or None
+        else:
+            scan_data = await _read_json_upload(request, max_bytes)
+            raw_image = decode_base64_image(scan_data.imageBase64) if scan_data.imageBase64 else None
+            image_url = scan_data.imageUrl
+        
+        if not raw_image:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Image data is required"
+            )
+        
+        image = await normalize_image_async(raw_image)
+        if settings.image_quality_gate_enabled:
+            await _check_image_quality(image)
+        return image, image_url
+    except InvalidImageError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+async def _check_image_quality(image: dict):
+    """Reject unusable photos before a model call; keep the scores on the image."""
+    quality = await assess_image_quality_async(image["data"])
+    image["quality"] = quality["scores"]
+    if not quality["passed"]:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={
+                "message": "Photo is not usable for analysis",
+                "reasons": [
+                    {"code": reason, "message": REASONS[reason]}
+                    for reason in quality["reasons"]
+                ],
+                "scores": quality["scores"]
+            }
+        )
+
+
+async def _read_json_upload(request: Request, max_bytes: int) -> ScanCreate:
+    """Parse the legacy JSON body with the base64 image."""
+    # base64 inflates the payload by a third
+    body = await read_body(request, max_bytes * 4 // 3 + 64 * 1024, max_bytes)
+    try:
+        return ScanCreate.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+
+@router.post("/analyze", response_model=ScanResponse, openapi_extra=SCAN_UPLOAD_BODY)
 async def analyze_face_scan(
-    scan_data: ScanCreate,
-    current_user: dict = Depends(get_current_active_user)
+    request: Request,
+    current_user: dict = Depends(get_current_principal)
 ):
     """Analyze a face image and save the scan results."""
-    db = get_database()
-    user_id = current_user["_id"]
+    image, image_url = await _read_scan_upload(request)
     
-    if not scan_data.imageBase64:
+    # Analyze face using Gemini while the image is stored
+    try:
+        image["sha256"], result = await asyncio.gather(
+            store_scan_image(image),
+            analyze_face_cached(image["data"], image["mimeType"])
+        )
+    except AnalyzerBusyError as e:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Image data is required"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
         )
     
-    # Analyze face using Gemini
-    result = await analyze_face(scan_data.imageBase64)
+    # Still save the scan even if analysis failed, flagged as a fallback
+    scan = await save_scan(
+        current_user,
+        result["analysis"],
+        image_url,
+        image=image_info(image),
+        is_fallback=result.get("fallback", False),
+        model=result.get("model")
+    )
     
-    if not result["success"]:
-        # Still save the scan even if analysis failed
-        analysis = result["analysis"]
-    else:
-        analysis = result["analysis"]
-    
-    # Check if user is subscribed
-    subscription = current_user.get("subscription", {})
-    is_subscribed = subscription.get("status") == "active"
-    
-    # Save scan to database
-    scan_doc = {
-        "userId": user_id,
-        "imageUrl": scan_data.imageUrl,
-        "analysis": analysis,
-        "isBlurred": not is_subscribed,
-        "createdAt": datetime.utcnow()
-    }
+    return DocumentResponse(scan_view(scan, has_full_access(current_user)), ScanResponse)
+
+
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+@router.post("/analyze/stream", openapi_extra=SCAN_UPLOAD_BODY)
+async def analyze_face_scan_stream(
+    request: Request,
+    current_user: dict = Depends(get_current_principal)
+):
+    """
+    Analyze a face image, streaming the analysis as server-sent events.
     
-    result = await db.scans.insert_one(scan_doc)
-    scan_id = str(result.inserted_id)
+    Events: ``started``, then ``overallScore``, ``summary``, one ``category``
+    per category and ``topPriorities`` as the model writes them, and finally
+    ``done`` with the saved scan (same body as ``POST /scans/analyze``).
+    Without a subscription only the category names are streamed. If the
+    analysis ends without a result, the last event is ``error`` and no
+    scan is saved.
+    """
+    image, image_url = await _read_scan_upload(request)
     
-    # Update user's hasCompletedFirstScan flag
-    await db.users.update_one(
-        {"_id": ObjectId(user_id)},
-        {
-            "$set": {
-                "hasCompletedFirstScan": True,
-                "updatedAt": datetime.utcnow()
-            }
-        }
+    store_task = asyncio.create_task(store_scan_image(image))
+    events = stream_analyze_face_cached(image["data"], image["mimeType"])
+    
+    # Pull the first event now so a full queue is still a plain 503
+    try:
+        first = await events.__anext__()
+    except AnalyzerBusyError as e:
+        store_task.cancel()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    full_access = has_full_access(current_user)
+    
+    async def stream():
+        result = None
+        yield _sse(first.pop("event"), json.dumps(first))
+        try:
+            async for event in events:
+                if event["event"] == "result":
+                    result = event["result"]
+                    continue
+                if not full_access:
+                    # Free users only get the category names as they arrive
+                    if event["event"] != "category":
+                        continue
+                    event["data"] = {"name": event["data"].get("name")}
+                name = event.pop("event")
+                yield _sse(name, json.dumps(event))
+        except Exception:
+            logger.exception("Scan stream failed")
+        
+        if result is None:
+            store_task.cancel()
+            yield _sse("error", json.dumps({"message": "Analysis ended without a result"}))
+            return
+        
+        # Persist only an analysis that matches the schema
+        analysis, is_fallback = result["analysis"], result.get("fallback", False)
+        try:
+            analysis = ScanAnalysis.model_validate(analysis).model_dump()
+        except ValidationError:
+            analysis, is_fallback = get_default_analysis(), True
+        
+        image["sha256"] = await store_task
+        scan = await save_scan(
+            current_user,
+            analysis,
+            image_url,
+            image=image_info(image),
+            is_fallback=is_fallback,
+            model=result.get("model")
+        )
+        yield _sse("done", serializer_for(ScanResponse).dump(scan_view(scan, full_access)).decode())
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post(
+    "/jobs",
+    response_model=ScanJobAccepted,
+    status_code=status.HTTP_202_ACCEPTED,
+    openapi_extra=SCAN_UPLOAD_BODY
+)
+async def create_scan_job(
+    request: Request,
+    current_user: dict = Depends(get_current_principal)
+):
+    """Queue a face scan for background analysis and return immediately."""
+    image, image_url = await _read_scan_upload(request)
+    image["sha256"] = await store_scan_image(image)
+    job = await enqueue_scan_job(current_user["_id"], image, image_url)
+    job_id = str(job["_id"])
+    
+    return ScanJobAccepted(
+        jobId=job_id,
+        status=job["status"],
+        statusUrl=f"/api/scans/jobs/{job_id}",
+        eventsUrl=f"/api/scans/jobs/{job_id}/events"
     )
+
+
+async def _job_to_response(job: dict, user: dict) -> ScanJobResponse:
+    scan = None
+    if job.get("scanId"):
+        db = get_database()
+        full_access = has_full_access(user)
+        scan_doc = await db.scans.find_one(
+            {"_id": ObjectId(job["scanId"]), "userId": user["_id"]},
+            scan_projection(full_access)
+        )
+        if scan_doc:
+            scan = scan_to_response(scan_doc, full_access)
     
-    return ScanResponse(
-        id=scan_id,
-        userId=user_id,
-        imageUrl=scan_data.imageUrl,
-        analysis=analysis,
-        isBlurred=not is_subscribed,
-        createdAt=scan_doc["createdAt"]
+    return ScanJobResponse(
+        id=str(job["_id"]),
+        status=job["status"],
+        attempts=job.get("attempts", 0),
+        scanId=job.get("scanId"),
+        error=job.get("error"),
+        scan=scan,
+        createdAt=job.get("createdAt"),
+        updatedAt=job.get("updatedAt")
     )
 
 
-@router.get("/", response_model=List[ScanResponse])
-async def list_user_scans(
-    current_user: dict = Depends(get_current_active_user)
+@router.get("/jobs/{job_id}", response_model=ScanJobResponse)
+async def get_scan_job_status(
+    job_id: str,
+    current_user: dict = Depends(get_current_principal)
 ):
-    """List all scans for the current user."""
-    db = get_database()
+    """Poll a scan job; includes the scan once it has been written."""
+    job = await get_scan_job(job_id, current_user["_id"])
+    if not job:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    
+    return await _job_to_response(job, current_user)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_scan_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_principal)
+):
+    """Server-sent events for a scan job, ending once the job is settled."""
     user_id = current_user["_id"]
+    job = await get_scan_job(job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Scan job not found")
     
-    scans = await db.scans.find({"userId": user_id}).sort("createdAt", -1).to_list(100)
+    async def events():
+        last_status = None
+        current = job
+        while True:
+            if current["status"] != last_status:
+                last_status = current["status"]
+                payload = await _job_to_response(current, current_user)
+                event = "done" if last_status in ("done", "failed") else "status"
+                yield f"event: {event}\ndata: {payload.model_dump_json()}\n\n"
+                if event == "done":
+                    return
+            else:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+            
+            await asyncio.sleep(settings.scan_job_poll_seconds)
+            current = await get_scan_job(job_id, user_id)
+            if current is None:
+                return
     
-    return [
-        ScanResponse(
-            id=str(scan["_id"]),
-            userId=scan["userId"],
-            imageUrl=scan.get("imageUrl"),
-            analysis=scan.get("analysis"),
-            isBlurred=scan.get("isBlurred", True),
-            createdAt=scan.get("createdAt")
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/", response_model=Union[List[ScanResponse], List[ScanSummary]])
+async def list_user_scans(
+    limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = None,
+    view: str = Query("full", pattern="^(full|summary)$"),
+    current_user: dict = Depends(get_current_principal)
+):
+    """
+    List the current user's scans, newest first.
+    
+    Pages are keyset-based: when there are more scans, the ``X-Next-Cursor``
+    header carries the ``cursor`` for the next page. ``view=summary`` returns
+    only the date and scores of each scan.
+    """
+    full_access = has_full_access(current_user)
+    try:
+        scans, next_cursor = await list_scans(
+            current_user["_id"], limit, cursor,
+            summary=view == "summary", full_access=full_access
         )
-        for scan in scans
-    ]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    if view == "summary":
+        return DocumentResponse([scan_summary_view(scan, full_access) for scan in scans], ScanSummary, headers=headers)
+    return DocumentResponse([scan_view(scan, full_access) for scan in scans], ScanResponse, headers=headers)
+
+
+@router.get("/stats", response_model=ScanStats)
+async def get_user_scan_stats(
+    current_user: dict = Depends(get_current_principal)
+):
+    """Score trends for the current user, kept up to date on every scan."""
+    return await get_scan_stats(current_user["_id"], has_full_access(current_user))
 
 
 @router.get("/{scan_id}", response_model=ScanResponse)
 async def get_scan(
     scan_id: str,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     """Get a specific scan."""
     db = get_database()
     user_id = current_user["_id"]
+    full_access = has_full_access(current_user)
     
     try:
-        scan = await db.scans.find_one({
-            "_id": ObjectId(scan_id),
-            "userId": user_id
-        })
+        scan = await db.scans.find_one(
+            {"_id": ObjectId(scan_id), "userId": user_id},
+            scan_projection(full_access)
+        )
     except:
         raise HTTPException(status_code=404, detail="Scan not found")
     
     if not scan:
         raise HTTPException(status_code=404, detail="Scan not found")
     
-    return ScanResponse(
-        id=str(scan["_id"]),
-        userId=scan["userId"],
-        imageUrl=scan.get("imageUrl"),
-        analysis=scan.get("analysis"),
-        isBlurred=scan.get("isBlurred", True),
-        createdAt=scan.get("createdAt")
-    )
+    return DocumentResponse(scan_view(scan, full_access), ScanResponse)
 
 
 @router.get("/latest/result", response_model=ScanResponse)
 async def get_latest_scan(
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     """Get the most recent scan for the current user."""
     db = get_database()
     user_id = current_user["_id"]
     
+    full_access = has_full_access(current_user)
+    
     scan = await db.scans.find_one(
-        {"userId": user_id},
-        sort=[("createdAt", -1)]
+        {"userId": user_id}, scan_projection(full_access), sort=SCAN_HISTORY_SORT
     )
     
     if not scan:
         raise HTTPException(status_code=404, detail="No scans found")
     
-    return ScanResponse(
-        id=str(scan["_id"]),
-        userId=scan["userId"],
-        imageUrl=scan.get("imageUrl"),
-        analysis=scan.get("analysis"),
-        isBlurred=scan.get("isBlurred", True),
-        createdAt=scan.get("createdAt")
-    )
+    return DocumentResponse(scan_view(scan, full_access), ScanResponse)
+
+
+def _parse_range(range_header: str, length: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single ``bytes=`` range into inclusive (start, end).
+    
+    Returns None for headers we ignore (other units, multiple ranges,
+    malformed) and raises ValueError when the range cannot be satisfied.
+    """
+    unit, _, spec = range_header.partition("=")
+    start_s, _, end_s = spec.strip().partition("-")
+    if unit.strip() != "bytes" or "," in spec or not (start_s or end_s):
+        return None
+    if not (start_s.isdigit() or not start_s) or not (end_s.isdigit() or not end_s):
+        return None
+    if start_s:
+        start = int(start_s)
+        end = int(end_s) if end_s else length - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(length - int(end_s), 0)
+        end = length - 1
+    end = min(end, length - 1)
+    if start > end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+@router.get("/{scan_id}/image")
+async def get_scan_image(
+    scan_id: str,
+    request: Request,
+    size: str = Query("full", pattern="^(full|preview|thumb)$"),
+    current_user: dict = Depends(get_current_principal)
+):
+    """Serve the stored scan image or one of its derivatives."""
+    db = get_database()
+    
+    try:
+        scan = await db.scans.find_one(
+            {"_id": ObjectId(scan_id), "userId": current_user["_id"]},
+            {"image.sha256": 1}
+        )
+    except:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    
+    digest = (scan or {}).get("image", {}).get("sha256")
+    if not digest:
+        raise HTTPException(status_code=404, detail="Scan image not found")
+    
+    # Content-addressed, so the representation never changes
+    headers = {
+        "ETag": f'"{digest}-{size}"',
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes"
+    }
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or headers["ETag"] in if_none_match):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    data = await load_scan_image(digest, size)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Scan image not found")
+    
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == headers["ETag"]):
+        try:
+            byte_range = _parse_range(range_header, len(data))
+        except ValueError:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "Content-Range": f"bytes */{len(data)}"}
+            )
+        if byte_range:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            return Response(
+                content=data[start:end + 1],
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type="image/jpeg",
+                headers=headers
+            )
+    
+    return Response(content=data, media_type="image/jpeg", headers=headers)
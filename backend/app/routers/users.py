@@ -2,7 +2,9 @@ from fastapi import APIRouter, HTTPException, Depends, status
 from typing import List
 from ..models.user import UserResponse, UserUpdate, OnboardingData
 from ..database import get_database
-from ..utils.auth import get_current_active_user, get_admin_user
+from ..services.refresh_tokens import revoke_refresh_tokens
+from ..utils.auth import get_current_active_user, get_admin_user, invalidate_principal
+from ..utils.serialization import DocumentResponse
 from bson import ObjectId
 from datetime import datetime
 
@@ -12,16 +14,8 @@ router = APIRouter(prefix="/users", tags=["Users"])
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_profile(current_user: dict = Depends(get_current_active_user)):
     """Get current user's profile."""
-    return UserResponse(
-        id=current_user["_id"],
-        email=current_user["email"],
-        name=current_user["name"],
-        onboarding=current_user.get("onboarding"),
-        subscription=current_user.get("subscription"),
-        isOnboarded=current_user.get("isOnboarded", False),
-        hasCompletedFirstScan=current_user.get("hasCompletedFirstScan", False),
-        createdAt=current_user.get("createdAt")
-    )
+    # The cached principal carries everything the profile shows
+    return DocumentResponse(current_user, UserResponse)
 
 
 @router.put("/me", response_model=UserResponse)
@@ -48,21 +42,12 @@ async def update_current_user(
             {"_id": ObjectId(current_user["_id"])},
             {"$set": update_data}
         )
+        invalidate_principal(current_user["_id"])
     
     # Get updated user
-    updated_user = await db.users.find_one({"_id": ObjectId(current_user["_id"])})
-    updated_user["_id"] = str(updated_user["_id"])
-    
-    return UserResponse(
-        id=updated_user["_id"],
-        email=updated_user["email"],
-        name=updated_user["name"],
-        onboarding=updated_user.get("onboarding"),
-        subscription=updated_user.get("subscription"),
-        isOnboarded=updated_user.get("isOnboarded", False),
-        hasCompletedFirstScan=updated_user.get("hasCompletedFirstScan", False),
-        createdAt=updated_user.get("createdAt")
-    )
+    updated_user = await db.users.find_one({"_id": ObjectId(current_user["_id"])}, {"password": 0})
+    
+    return DocumentResponse(updated_user, UserResponse)
 
 
 @router.post("/onboarding")
@@ -83,6 +68,7 @@ async def save_onboarding(
             }
         }
     )
+    invalidate_principal(current_user["_id"])
     
     return {"message": "Onboarding data saved successfully"}
 
@@ -97,21 +83,9 @@ async def list_users(
     """List all users (admin only)."""
     db = get_database()
     
-    users = await db.users.find().skip(skip).limit(limit).to_list(limit)
-    
-    return [
-        UserResponse(
-            id=str(user["_id"]),
-            email=user["email"],
-            name=user["name"],
-            onboarding=user.get("onboarding"),
-            subscription=user.get("subscription"),
-            isOnboarded=user.get("isOnboarded", False),
-            hasCompletedFirstScan=user.get("hasCompletedFirstScan", False),
-            createdAt=user.get("createdAt")
-        )
-        for user in users
-    ]
+    users = await db.users.find({}, {"password": 0}).skip(skip).limit(limit).to_list(limit)
+    
+    return DocumentResponse(users, UserResponse)
 
 
 @router.get("/{user_id}", response_model=UserResponse)
@@ -123,23 +97,14 @@ async def get_user(
     db = get_database()
     
     try:
-        user = await db.users.find_one({"_id": ObjectId(user_id)})
+        user = await db.users.find_one({"_id": ObjectId(user_id)}, {"password": 0})
     except:
         raise HTTPException(status_code=404, detail="User not found")
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return UserResponse(
-        id=str(user["_id"]),
-        email=user["email"],
-        name=user["name"],
-        onboarding=user.get("onboarding"),
-        subscription=user.get("subscription"),
-        isOnboarded=user.get("isOnboarded", False),
-        hasCompletedFirstScan=user.get("hasCompletedFirstScan", False),
-        createdAt=user.get("createdAt")
-    )
+    return DocumentResponse(user, UserResponse)
 
 
 @router.delete("/{user_id}")
@@ -158,6 +123,9 @@ async def delete_user(
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
+    invalidate_principal(user_id)
+    await revoke_refresh_tokens(user_id)
+    
     # Also delete user's data
     await db.scans.delete_many({"userId": user_id})
     await db.progress.delete_many({"userId": user_id})
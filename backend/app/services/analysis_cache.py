@@ -0,0 +1,221 @@
+"""
+Content-addressed cache for face analyses.
+
+Entries are keyed by the SHA-256 of the normalized image bytes plus the
+prompt version, so a resubmitted photo (retry, double tap, re-scan after
+paying) is answered from the cache instead of a new Gemini call. Lookups go
+through an in-process LRU first, then the ``analysis_cache`` collection
+(expired by a TTL index). Identical submissions that arrive while the first
+one is still being analysed wait on the same model call, streamed or not.
+Only a successful analysis is shared that way: after a fallback or error
+the first waiter starts one new call and the rest join it, so an outage
+does not multiply model calls. ``cached`` is only set for answers read
+from the cache.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import AsyncIterator, Dict
+
+from ..config import settings
+from ..database import get_database
+from ..utils.metrics import incr
+from .gemini import analyze_face, analysis_events, stream_analyze_face, PROMPT_VERSION
+
+logger = logging.getLogger(__name__)
+
+# key -> (expires_at monotonic, entry)
+_lru: "OrderedDict[str, tuple]" = OrderedDict()
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+def cache_key(image: bytes) -> str:
+    return f"{hashlib.sha256(image).hexdigest()}:{PROMPT_VERSION}"
+
+
+def _lru_get(key: str):
+    item = _lru.get(key)
+    if item is None:
+        return None
+    expires_at, entry = item
+    if expires_at < time.monotonic():
+        del _lru[key]
+        return None
+    _lru.move_to_end(key)
+    return entry
+
+
+def _lru_put(key: str, entry: dict):
+    _lru[key] = (time.monotonic() + settings.analysis_cache_ttl_seconds, entry)
+    _lru.move_to_end(key)
+    while len(_lru) > settings.analysis_cache_max_entries:
+        _lru.popitem(last=False)
+
+
+async def _lookup(key: str):
+    entry = _lru_get(key)
+    if entry is not None:
+        incr("analysis_cache.hit.memory")
+        return entry
+
+    db = get_database()
+    doc = await db.analysis_cache.find_one({"_id": key})
+    if doc is not None:
+        incr("analysis_cache.hit.mongo")
+        entry = {"analysis": doc["analysis"], "model": doc.get("model")}
+        _lru_put(key, entry)
+        return entry
+
+    return None
+
+
+async def _store(key: str, analysis: dict, model: str = None):
+    entry = {"analysis": analysis, "model": model}
+    _lru_put(key, entry)
+
+    db = get_database()
+    await db.analysis_cache.replace_one(
+        {"_id": key},
+        {
+            "_id": key,
+            "analysis": analysis,
+            "model": model,
+            "promptVersion": PROMPT_VERSION,
+            "createdAt": datetime.utcnow()
+        },
+        upsert=True
+    )
+
+
+async def _analyze_and_store(key: str, image: bytes, mime_type: str) -> dict:
+    result = await analyze_face(image, mime_type)
+    # Never cache fallbacks; the next attempt should reach the model again
+    if result["success"]:
+        try:
+            await _store(key, result["analysis"], result.get("model"))
+        except Exception:
+            logger.exception("Failed to store cached analysis")
+    return result
+
+
+def _register(key: str, future: asyncio.Future) -> asyncio.Future:
+    _inflight[key] = future
+    future.add_done_callback(lambda done: _inflight.pop(key) if _inflight.get(key) is done else None)
+    return future
+
+
+async def _join_inflight(key: str):
+    """
+    The result of an identical analysis already running, if any.
+
+    A failed call is not shared; its waiters join the one call that replaces
+    it and take that result whatever it is. ``None`` means the caller must
+    make (and register) its own call, which it has to do before its next
+    ``await`` so that the other waiters find it.
+    """
+    failed = None
+    while True:
+        pending = _inflight.get(key)
+        if pending is None or pending is failed:
+            return None
+        incr("analysis_cache.coalesced")
+        try:
+            result = await asyncio.shield(pending)
+        except Exception:
+            result = None
+        if result is not None and (result["success"] or failed is not None):
+            return result
+        if failed is not None:
+            return None
+        failed = pending
+
+
+async def analyze_face_cached(image: bytes, mime_type: str = "image/jpeg") -> dict:
+    """
+    ``analyze_face`` with a content-addressed cache in front of it.
+
+    Returns the same dict as ``analyze_face`` with an extra ``cached`` flag.
+    """
+    if not settings.analysis_cache_enabled:
+        return {**await analyze_face(image, mime_type), "cached": False}
+
+    key = cache_key(image)
+
+    try:
+        entry = await _lookup(key)
+    except Exception:
+        logger.warning("Analysis cache lookup failed", exc_info=True)
+        entry = None
+    if entry is not None:
+        return {
+            "success": True,
+            "analysis": entry["analysis"],
+            "model": entry.get("model"),
+            "cached": True
+        }
+
+    # Single flight: piggyback on an identical analysis already running
+    result = await _join_inflight(key)
+    if result is not None:
+        return {**result, "cached": False}
+
+    incr("analysis_cache.miss")
+    future = _register(key, asyncio.ensure_future(_analyze_and_store(key, image, mime_type)))
+    return {**await asyncio.shield(future), "cached": False}
+
+
+async def stream_analyze_face_cached(image: bytes, mime_type: str = "image/jpeg") -> AsyncIterator[dict]:
+    """
+    ``stream_analyze_face`` with the same cache in front of it.
+
+    A cached or coalesced analysis is replayed as the same events at once;
+    the final ``result`` event carries the ``cached`` flag.
+    """
+    key = cache_key(image)
+    result = None
+    cached = False
+
+    if settings.analysis_cache_enabled:
+        try:
+            entry = await _lookup(key)
+        except Exception:
+            logger.warning("Analysis cache lookup failed", exc_info=True)
+            entry = None
+        if entry is not None:
+            result = {"success": True, "analysis": entry["analysis"], "model": entry.get("model")}
+            cached = True
+        else:
+            result = await _join_inflight(key)
+
+    if result is not None:
+        yield {"event": "started", "model": result.get("model")}
+        for event in analysis_events(result["analysis"]):
+            yield event
+        yield {"event": "result", "result": {**result, "cached": cached}}
+        return
+
+    incr("analysis_cache.miss")
+    # Non-streaming submissions of the same image wait on this call too
+    future = asyncio.get_running_loop().create_future()
+    if settings.analysis_cache_enabled:
+        _register(key, future)
+    try:
+        async for event in stream_analyze_face(image, mime_type):
+            if event["event"] == "result":
+                result = event["result"]
+                if settings.analysis_cache_enabled and result["success"]:
+                    try:
+                        await _store(key, result["analysis"], result.get("model"))
+                    except Exception:
+                        logger.exception("Failed to store cached analysis")
+                future.set_result(result)
+                event = {"event": "result", "result": {**result, "cached": False}}
+            yield event
+    finally:
+        # Stream failed or the client went away: waiters make their own call
+        if not future.done():
+            future.set_exception(RuntimeError("analysis stream ended without a result"))
+            future.exception()
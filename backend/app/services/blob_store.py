@@ -0,0 +1,180 @@
+"""
+Content-addressed storage for scan images.
+
+Blobs are keyed by the SHA-256 of the analysed (normalized) image, so the
+same photo is stored once no matter how many scans reference it. Each image
+also gets ``preview`` and ``thumb`` derivatives for history screens.
+
+Backends:
+    local   files under ``blob_store_path`` (single host / shared volume)
+    gridfs  the ``scan_images`` GridFS bucket on the app's Mongo database
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from ..config import settings
+from ..database import get_database
+from .image_processing import normalize_image_async
+
+# size name -> longest edge; "full" is the analysed image itself
+IMAGE_SIZES = {
+    "full": None,
+    "preview": settings.image_preview_edge,
+    "thumb": settings.image_thumb_edge
+}
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def blob_key(digest: str, size: str = "full") -> str:
+    return digest if size == "full" else f"{digest}-{size}"
+
+
+class BlobStore(ABC):
+    """Interface shared by the storage backends."""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def put(self, key: str, data: bytes, content_type: str = "image/jpeg"):
+        ...
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """The blob's bytes, or None if there is no such blob; other errors propagate."""
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        # Fan out into subdirectories so no directory grows unbounded
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self._path(key))
+
+    def _write(self, key: str, data: bytes):
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        finally:
+            # Only left behind if the write or rename failed
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    async def put(self, key: str, data: bytes, content_type: str = "image/jpeg"):
+        await asyncio.to_thread(self._write, key, data)
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, key)
+
+
+class GridFSBlobStore(BlobStore):
+    def __init__(self, bucket_name: str = "scan_images"):
+        self.bucket_name = bucket_name
+        self._bucket = None
+
+    @property
+    def bucket(self) -> AsyncIOMotorGridFSBucket:
+        if self._bucket is None:
+            self._bucket = AsyncIOMotorGridFSBucket(get_database(), bucket_name=self.bucket_name)
+        return self._bucket
+
+    async def exists(self, key: str) -> bool:
+        db = get_database()
+        return await db[f"{self.bucket_name}.files"].find_one({"filename": key}, {"_id": 1}) is not None
+
+    async def put(self, key: str, data: bytes, content_type: str = "image/jpeg"):
+        if await self.exists(key):
+            return
+        await self.bucket.upload_from_stream(key, data, metadata={"contentType": content_type})
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            stream = await self.bucket.open_download_stream_by_name(key)
+        except NoFile:
+            return None
+        return await stream.read()
+
+
+_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    """Return the configured blob store for this process."""
+    global _store
+    if _store is None:
+        if settings.blob_store_backend == "gridfs":
+            _store = GridFSBlobStore()
+        else:
+            _store = LocalBlobStore(settings.blob_store_path)
+    return _store
+
+
+async def _put_derivative(store: BlobStore, digest: str, size: str, data: bytes) -> bytes:
+    resized = await normalize_image_async(data, max_edge=IMAGE_SIZES[size])
+    await store.put(blob_key(digest, size), resized["data"])
+    return resized["data"]
+
+
+async def store_scan_image(image: dict) -> str:
+    """
+    Store a normalized image and its derivatives.
+
+    Args:
+        image: Result of ``normalize_image``
+
+    Returns:
+        str: The image's content hash
+    """
+    store = get_blob_store()
+    digest = content_hash(image["data"])
+
+    if not await store.exists(blob_key(digest)):
+        await store.put(blob_key(digest), image["data"], image["mimeType"])
+        await asyncio.gather(*(
+            _put_derivative(store, digest, size, image["data"])
+            for size in IMAGE_SIZES if size != "full"
+        ))
+
+    return digest
+
+
+async def load_scan_image(digest: str, size: str = "full") -> Optional[bytes]:
+    """Fetch an image, building a missing derivative from the full image."""
+    store = get_blob_store()
+    data = await store.get(blob_key(digest, size))
+    if data is not None or size == "full":
+        return data
+
+    full = await store.get(blob_key(digest))
+    if full is None:
+        return None
+    return await _put_derivative(store, digest, size, full)
@@ -0,0 +1,179 @@
+"""
+In-process cache of the course catalog as served to the app.
+
+The catalog only changes through the admin endpoints, which bump a
+version number kept in ``meta`` (``_id: "catalog"``). Cached responses are
+the finished JSON bodies plus a strong ETag, valid for the version they
+were built at; any bump empties the cache. Other processes notice a bump
+within ``catalog_version_poll_seconds``. Concurrent misses for the same
+body share one database read. Bodies limited to some fields are read with
+a projection, so the summary list never loads ``modules``.
+
+Anything that writes ``courses`` outside these endpoints (seed script,
+tools) must call ``bump_catalog_version`` or ``$inc`` the meta document.
+"""
+import asyncio
+import hashlib
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from ..config import settings
+from ..database import get_database
+from ..models.course import CourseResponse, Module
+from ..utils.metrics import incr
+from ..utils.serialization import serializer_for
+from .courses import assembly_pipeline, module_pipeline
+
+CATALOG_META_ID = "catalog"
+
+# What ``fields=`` may name, and the catalog screen's ``view=summary``
+COURSE_FIELDS = tuple(name for name in CourseResponse.model_fields if name != "id")
+SUMMARY_FIELDS = ("createdAt", "description", "isActive", "thumbnail", "title", "totalChapters", "totalDuration")
+
+_version: Optional[int] = None
+_version_checked_at = 0.0
+# key -> (body, etag), all built at _version
+_entries: Dict[str, Tuple[bytes, str]] = {}
+_inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+
+
+def _set_version(version: int):
+    global _version, _version_checked_at
+    if version != _version:
+        _entries.clear()
+        _version = version
+    _version_checked_at = time.monotonic()
+
+
+async def get_catalog_version() -> int:
+    """The catalog version, re-read from Mongo at most every poll interval."""
+    if _version is not None and time.monotonic() - _version_checked_at < settings.catalog_version_poll_seconds:
+        return _version
+
+    db = get_database()
+    meta = await db.meta.find_one({"_id": CATALOG_META_ID}, {"version": 1})
+    _set_version(meta["version"] if meta else 0)
+    return _version
+
+
+async def bump_catalog_version() -> int:
+    """Mark the catalog changed; call after every write to ``courses``."""
+    db = get_database()
+    meta = await db.meta.find_one_and_update(
+        {"_id": CATALOG_META_ID},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    _set_version(meta["version"])
+    return _version
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Normalize a ``fields=`` parameter ("title,thumbnail") to a sorted tuple.
+
+    Raises:
+        ValueError: If a name is not a course field
+    """
+    if not fields:
+        return None
+    names = sorted({name.strip() for name in fields.split(",") if name.strip()} - {"id"})
+    unknown = [name for name in names if name not in COURSE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown course fields: {', '.join(unknown)}")
+    return tuple(names)
+
+
+def _projection(fields: Optional[Tuple[str, ...]]) -> Optional[dict]:
+    return {name: 1 for name in fields} if fields is not None else None
+
+
+def _course_json(course: dict, fields: Optional[Tuple[str, ...]]) -> bytes:
+    return serializer_for(CourseResponse).dump(course, fields)
+
+
+async def get_catalog_body(key: str, build: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[Tuple[bytes, str]]:
+    """
+    A cached catalog response body and its ETag.
+
+    Args:
+        key: Identifies the body within the current catalog version
+        build: Reads and serializes the body, or returns None if not found
+
+    Returns:
+        tuple: JSON body and ETag, or None if ``build`` found nothing
+    """
+    async def build_with_etag():
+        body = await build()
+        return (body, _etag(body)) if body is not None else None
+
+    if not settings.catalog_cache_enabled:
+        return await build_with_etag()
+
+    version = await get_catalog_version()
+    cached = _entries.get(key)
+    if cached is not None:
+        incr("catalog_cache.hit")
+        return cached
+
+    pending = _inflight.get((key, version))
+    if pending is not None:
+        incr("catalog_cache.coalesced")
+        return await asyncio.shield(pending)
+
+    incr("catalog_cache.miss")
+    future = asyncio.ensure_future(build_with_etag())
+    _inflight[(key, version)] = future
+    future.add_done_callback(lambda _: _inflight.pop((key, version), None))
+    result = await asyncio.shield(future)
+    # Only keep it if no bump happened while it was being read
+    if result is not None and version == _version and len(_entries) < settings.catalog_cache_max_entries:
+        _entries[key] = result
+    return result
+
+
+async def read_courses(match: dict, fields: Optional[Tuple[str, ...]] = None, limit: int = 100) -> List[dict]:
+    """Courses with only ``fields``; the module tree is assembled only when asked for."""
+    db = get_database()
+    if fields is not None and "modules" not in fields:
+        return await db.courses.find(match, _projection(fields)).to_list(limit)
+    return await db.courses.aggregate(assembly_pipeline(match, _projection(fields), limit)).to_list(limit)
+
+
+async def course_list_body(fields: Optional[Tuple[str, ...]] = None) -> Tuple[bytes, str]:
+    """The active courses, whole or limited to ``fields`` (read with a projection)."""
+    async def build():
+        courses = await read_courses({"isActive": True}, fields)
+        return b"[" + b",".join(_course_json(course, fields) for course in courses) + b"]"
+
+    key = "list:" + ",".join(fields) if fields is not None else "list"
+    return await get_catalog_body(key, build)
+
+
+async def course_body(course_id: str, fields: Optional[Tuple[str, ...]] = None) -> Optional[Tuple[bytes, str]]:
+    async def build():
+        courses = await read_courses({"_id": ObjectId(course_id)}, fields, limit=1)
+        return _course_json(courses[0], fields) if courses else None
+
+    key = f"course:{course_id}" + (":" + ",".join(fields) if fields is not None else "")
+    return await get_catalog_body(key, build)
+
+
+async def module_body(course_id: str, module_id: str) -> Optional[Tuple[bytes, str]]:
+    """One module of a course, chapters included."""
+    async def build():
+        db = get_database()
+        found = await db.courses.aggregate(module_pipeline(ObjectId(course_id), module_id)).to_list(1)
+        if not found:
+            return None
+        return serializer_for(Module).dump(found[0]["module"])
+
+    return await get_catalog_body(f"module:{course_id}:{module_id}", build)
@@ -0,0 +1,314 @@
+"""
+Bulk import and export of course content as NDJSON.
+
+One JSON record per line, each with a ``kind``::
+
+    {"kind": "course", "title": "...", "description": "...", "isActive": true}
+    {"kind": "module", "title": "...", "order": 0}
+    {"kind": "chapter", "title": "...", "type": "text", "content": "...", "order": 0}
+
+A module belongs to the course above it, a chapter to the module above it;
+modules may also carry their chapters inline. Records are validated with
+the ``CourseImport``/``Module``/``Chapter`` models and written as they are
+read, in ordered ``bulk_write`` batches: consecutive chapters of a module
+become one ``$push`` with ``$each``, or plain inserts into ``chapters``
+with ``course_chapter_storage = "collection"``. Totals are counted along
+the way and set once at the end.
+
+An import always creates new courses with new ids (ids in the upload are
+ignored), so an export can be imported elsewhere as is. Courses are
+inactive until the import has finished; if any record is rejected,
+everything written so far is deleted again.
+"""
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional, Tuple
+
+from bson import ObjectId
+from pydantic import ValidationError
+from pydantic_core import to_json
+from pymongo import InsertOne, UpdateOne
+
+from ..config import settings
+from ..database import get_database
+from ..models.course import Chapter, CourseImport, Module
+from ..utils.serialization import serializer_for
+from .catalog import bump_catalog_version
+from .courses import TOUCH, chapter_document, normalized_storage
+
+# Export bodies are sent this many records at a time
+EXPORT_CHUNK_LINES = 500
+MODULE_HEADER_FIELDS = tuple(name for name in Module.model_fields if name != "chapters")
+
+
+class InvalidImportError(ValueError):
+    """Raised for a malformed or misplaced import record."""
+
+    def __init__(self, line: Optional[int], message: str):
+        super().__init__(f"Line {line}: {message}" if line else message)
+        self.line = line
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'record'}: {e['msg']}" for e in error.errors())
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    """Numbered non-blank lines of a byte stream; holds one chunk and a partial line at most."""
+    buffer = b""
+    number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            number += 1
+            line = buffer[start:end]
+            start = end + 1
+            if line.strip():
+                yield number, line
+        buffer = buffer[start:]
+        if len(buffer) > settings.course_import_max_line_bytes:
+            raise InvalidImportError(number + 1, "Line too long")
+    if buffer.strip():
+        yield number + 1, buffer
+
+
+class _Import:
+    """State of one import: pending writes and what was created so far."""
+
+    def __init__(self):
+        self.db = get_database()
+        self.normalized = normalized_storage()
+        self.started = datetime.utcnow()
+        self.course_ops: list = []
+        self.chapter_ops: list = []
+        # One per course: [_id, isActive, chapters, duration]
+        self.courses: List[list] = []
+        self.module_id: Optional[str] = None
+        # Embedded layout: chapters of module_id not yet pushed
+        self.pending: List[dict] = []
+        self.modules = 0
+        self.chapters = 0
+
+    async def add(self, record: dict):
+        kind = record.get("kind")
+        if kind == "course":
+            await self._course(CourseImport.model_validate(record))
+        elif kind == "module":
+            if not self.courses:
+                raise ValueError("Module before any course")
+            await self._module(Module.model_validate(record))
+        elif kind == "chapter":
+            if self.module_id is None:
+                raise ValueError("Chapter before any module")
+            await self._chapter(Chapter.model_validate(record))
+        else:
+            raise ValueError(f"Unknown record kind: {kind!r}")
+
+    async def _course(self, course: CourseImport):
+        self._push_pending()
+        course_id = ObjectId()
+        self.courses.append([course_id, course.isActive, 0, 0])
+        self.module_id = None
+        # An upsert rather than an insert, so the timestamps come from the
+        # database's clock like every other course write
+        self.course_ops.append(UpdateOne(
+            {"_id": course_id},
+            {
+                "$setOnInsert": {
+                    "title": course.title,
+                    "description": course.description,
+                    "thumbnail": course.thumbnail,
+                    "modules": [],
+                    "isActive": False,
+                    "totalDuration": 0,
+                    "totalChapters": 0
+                },
+                "$currentDate": {**TOUCH, "createdAt": True}
+            },
+            upsert=True
+        ))
+        await self._flush_full()
+
+    async def _module(self, module: Module):
+        self._push_pending()
+        self.module_id = str(uuid.uuid4())
+        self.modules += 1
+        self.course_ops.append(UpdateOne(
+            {"_id": self.courses[-1][0]},
+            {"$push": {"modules": {
+                "_id": self.module_id,
+                "title": module.title,
+                "description": module.description,
+                "order": module.order,
+                "thumbnail": module.thumbnail,
+                "chapters": []
+            }}}
+        ))
+        await self._flush_full()
+        for chapter in module.chapters:
+            await self._chapter(chapter)
+
+    async def _chapter(self, chapter: Chapter):
+        course = self.courses[-1]
+        doc = {
+            "_id": str(uuid.uuid4()),
+            "title": chapter.title,
+            "type": chapter.type,
+            "content": chapter.content,
+            "duration": chapter.duration,
+            "order": chapter.order,
+            "thumbnail": chapter.thumbnail
+        }
+        course[2] += 1
+        course[3] += chapter.duration or 0
+        self.chapters += 1
+
+        if self.normalized:
+            # Keeps upload order among chapters with equal ``order``
+            created_at = self.started + timedelta(milliseconds=self.chapters)
+            self.chapter_ops.append(InsertOne(chapter_document(course[0], self.module_id, doc, created_at)))
+        else:
+            self.pending.append(doc)
+            if len(self.pending) >= settings.course_import_batch_size:
+                self._push_pending()
+        await self._flush_full()
+
+    def _push_pending(self):
+        if self.pending:
+            self.course_ops.append(UpdateOne(
+                {"_id": self.courses[-1][0], "modules._id": self.module_id},
+                {"$push": {"modules.$.chapters": {"$each": self.pending}}}
+            ))
+            self.pending = []
+
+    async def _flush_full(self):
+        batch = settings.course_import_batch_size
+        if len(self.course_ops) >= batch or len(self.chapter_ops) >= batch:
+            await self.flush()
+
+    async def flush(self):
+        # Courses first, so chapters never point at a course not yet written
+        if self.course_ops:
+            ops, self.course_ops = self.course_ops, []
+            await self.db.courses.bulk_write(ops, ordered=True)
+        if self.chapter_ops:
+            ops, self.chapter_ops = self.chapter_ops, []
+            await self.db.chapters.bulk_write(ops, ordered=True)
+
+    async def finish(self):
+        self._push_pending()
+        for course_id, is_active, chapters, duration in self.courses:
+            self.course_ops.append(UpdateOne({"_id": course_id}, {
+                "$set": {"isActive": is_active, "totalChapters": chapters, "totalDuration": duration},
+                "$currentDate": TOUCH
+            }))
+            await self._flush_full()
+        await self.flush()
+
+    async def abort(self):
+        ids = [course[0] for course in self.courses]
+        await self.db.courses.delete_many({"_id": {"$in": ids}})
+        await self.db.chapters.delete_many({"courseId": {"$in": ids}})
+
+
+async def import_courses(chunks: AsyncIterator[bytes]) -> dict:
+    """
+    Create the courses in an NDJSON byte stream.
+
+    Returns:
+        dict: Ids of the created courses and the module/chapter counts
+
+    Raises:
+        InvalidImportError: If a record is malformed or misplaced; nothing
+            is left behind
+    """
+    job = _Import()
+    try:
+        async for number, line in iter_lines(chunks):
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise InvalidImportError(number, f"Invalid JSON: {e}")
+            if not isinstance(record, dict):
+                raise InvalidImportError(number, "Expected a JSON object")
+            try:
+                await job.add(record)
+            except ValidationError as e:
+                raise InvalidImportError(number, _describe(e))
+            except ValueError as e:
+                raise InvalidImportError(number, str(e))
+
+        if not job.courses:
+            raise InvalidImportError(None, "No course records")
+        await job.finish()
+    except Exception:
+        if job.courses:
+            await job.abort()
+        raise
+    finally:
+        if job.courses:
+            await bump_catalog_version()
+
+    return {
+        "courses": [str(course[0]) for course in job.courses],
+        "modules": job.modules,
+        "chapters": job.chapters
+    }
+
+
+def _record(kind: str, fields: dict) -> bytes:
+    return to_json({"kind": kind, **fields}) + b"\n"
+
+
+def _chapter_record(chapter: dict) -> bytes:
+    return _record("chapter", serializer_for(Chapter).shape(chapter))
+
+
+async def export_courses() -> AsyncIterator[bytes]:
+    """
+    Every course (inactive ones too) as NDJSON, in the import format.
+
+    Courses come one at a time from a cursor, and chapters stored in
+    ``chapters`` one module at a time, so memory does not grow with the
+    catalog.
+    """
+    db = get_database()
+    normalized = normalized_storage()
+    lines: List[bytes] = []
+
+    async for course in db.courses.find({}).sort("_id", 1):
+        lines.append(_record("course", {
+            "_id": str(course["_id"]),
+            "title": course["title"],
+            "description": course["description"],
+            "thumbnail": course.get("thumbnail"),
+            "isActive": course.get("isActive", True)
+        }))
+        separate = normalized or course.get("chapterStorage") == "collection"
+
+        for module in course.get("modules") or []:
+            lines.append(_record("module", serializer_for(Module).shape(module, MODULE_HEADER_FIELDS)))
+            lines.extend(_chapter_record(chapter) for chapter in module.get("chapters") or [])
+            if not separate:
+                continue
+            cursor = db.chapters.find(
+                {"courseId": course["_id"], "moduleId": module["_id"]},
+                {"courseId": 0, "moduleId": 0, "createdAt": 0}
+            ).sort([("order", 1), ("createdAt", 1)])
+            async for chapter in cursor:
+                lines.append(_chapter_record(chapter))
+                if len(lines) >= EXPORT_CHUNK_LINES:
+                    yield b"".join(lines)
+                    lines = []
+
+        if len(lines) >= EXPORT_CHUNK_LINES:
+            yield b"".join(lines)
+            lines = []
+
+    if lines:
+        yield b"".join(lines)
@@ -0,0 +1,407 @@
+"""
+Search over course, module and chapter titles and course descriptions.
+
+Searches are answered from an in-memory inverted index of the active
+courses: term -> {document: weight}, where a document is a course, a
+module or a chapter. Query terms match index terms exactly, as a prefix
+(so results come while typing) or with one typo, found through an index
+of every term with one character deleted. Results are ranked by how many
+query terms matched, then by score (field weight times match quality).
+A single-word query, the common case while typing, reads each matching
+term's postings best first and stops after the page, so a common word is
+as cheap as a rare one.
+
+The index follows the catalog version: when an admin edit bumps it, the
+next search re-reads the courses whose ``updatedAt`` moved (and drops
+deleted or deactivated ones) before answering. It is rebuilt from
+scratch every ``search_index_rebuild_seconds``, in the background. Until
+the first build has finished, searches go to the ``course_search`` Mongo
+text index, which matches whole words only and returns courses.
+"""
+import asyncio
+import bisect
+import heapq
+import logging
+import re
+import time
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from ..config import settings
+from ..database import get_database
+from ..utils.metrics import incr
+from .catalog import get_catalog_version
+from .courses import assembly_pipeline
+
+logger = logging.getLogger(__name__)
+
+# Weight of a term by the field it came from
+COURSE_TITLE_WEIGHT = 3.0
+MODULE_TITLE_WEIGHT = 2.0
+CHAPTER_TITLE_WEIGHT = 1.5
+DESCRIPTION_WEIGHT = 1.0
+
+# Quality of a match; prefix matches score more the more of the term is typed
+EXACT_QUALITY = 1.0
+PREFIX_QUALITY = 0.5  # plus up to 0.4 for the typed share of the term
+TYPO_QUALITY = 0.5
+
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_EXPANSIONS = 50
+MIN_TYPO_LENGTH = 4
+MAX_QUERY_TERMS = 8
+
+SEARCH_PROJECTION = {
+    "title": 1,
+    "description": 1,
+    "isActive": 1,
+    "updatedAt": 1,
+    "modules._id": 1,
+    "modules.title": 1,
+    "modules.chapters._id": 1,
+    "modules.chapters.title": 1
+}
+
+# Courses saved slightly out of order are picked up by re-reading this far
+# behind the newest ``updatedAt`` seen. Course writes take ``updatedAt``
+# from the database's clock, the same clock every value compared here
+# comes from, so app hosts' clock skew cannot hide an edit.
+_UPDATE_OVERLAP = timedelta(seconds=5)
+
+_TOKEN = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase words with accents removed."""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text.lower())
+    return _TOKEN.findall("".join(ch for ch in text if not unicodedata.combining(ch)))
+
+
+def _deletes(term: str) -> Set[str]:
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _one_edit(a: str, b: str) -> bool:
+    """True if ``a`` becomes ``b`` by one insertion, deletion, substitution or transposition."""
+    if a == b or abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    if a[i + 1:] == b[i + 1:]:
+        return True
+    return i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+
+
+class SearchIndex:
+    """Inverted index of courses, their modules and their chapters."""
+
+    def __init__(self):
+        # document -> (type, courseId, moduleId, chapterId, title, courseTitle)
+        self.docs: Dict[int, tuple] = {}
+        self.doc_terms: Dict[int, Tuple[str, ...]] = {}
+        self.course_docs: Dict[str, List[int]] = {}
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.terms: List[str] = []  # sorted, for prefix ranges
+        self.deletes: Dict[str, Set[str]] = {}  # term minus one character -> terms
+        self._ranked_cache: Dict[str, List[Tuple[float, int]]] = {}
+        self._next_doc = 0
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def _add_term(self, term: str):
+        bisect.insort(self.terms, term)
+        if len(term) >= MIN_TYPO_LENGTH:
+            for deleted in _deletes(term):
+                self.deletes.setdefault(deleted, set()).add(term)
+
+    def _remove_term(self, term: str):
+        del self.terms[bisect.bisect_left(self.terms, term)]
+        if len(term) >= MIN_TYPO_LENGTH:
+            for deleted in _deletes(term):
+                terms = self.deletes[deleted]
+                terms.discard(term)
+                if not terms:
+                    del self.deletes[deleted]
+
+    def _add_doc(self, meta: tuple, fields: Iterable[Tuple[Optional[str], float]]):
+        weights: Dict[str, float] = {}
+        for text, weight in fields:
+            for term in tokenize(text):
+                if weight > weights.get(term, 0.0):
+                    weights[term] = weight
+        if not weights:
+            return
+
+        doc = self._next_doc
+        self._next_doc += 1
+        self.docs[doc] = meta
+        self.doc_terms[doc] = tuple(weights)
+        self.course_docs.setdefault(meta[1], []).append(doc)
+        for term, weight in weights.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                self._add_term(term)
+            postings[doc] = weight
+            self._ranked_cache.pop(term, None)
+
+    def add_course(self, course: dict):
+        """Index a course with its modules and chapters, replacing what was indexed for it."""
+        course_id = str(course["_id"])
+        self.remove_course(course_id)
+        title = course.get("title") or ""
+        self._add_doc(
+            ("course", course_id, None, None, title, title),
+            [(title, COURSE_TITLE_WEIGHT), (course.get("description"), DESCRIPTION_WEIGHT)]
+        )
+        for module in course.get("modules") or []:
+            module_id = module.get("_id")
+            self._add_doc(
+                ("module", course_id, module_id, None, module.get("title") or "", title),
+                [(module.get("title"), MODULE_TITLE_WEIGHT)]
+            )
+            for chapter in module.get("chapters") or []:
+                self._add_doc(
+                    ("chapter", course_id, module_id, chapter.get("_id"), chapter.get("title") or "", title),
+                    [(chapter.get("title"), CHAPTER_TITLE_WEIGHT)]
+                )
+
+    def remove_course(self, course_id: str):
+        for doc in self.course_docs.pop(course_id, []):
+            del self.docs[doc]
+            for term in self.doc_terms.pop(doc):
+                postings = self.postings[term]
+                del postings[doc]
+                self._ranked_cache.pop(term, None)
+                if not postings:
+                    del self.postings[term]
+                    self._remove_term(term)
+
+    def course_ids(self) -> List[str]:
+        return list(self.course_docs)
+
+    def expand(self, term: str) -> Dict[str, float]:
+        """Index terms a query term matches, with the quality of each match."""
+        matches = {}
+        if term in self.postings:
+            matches[term] = EXACT_QUALITY
+
+        if len(term) >= MIN_PREFIX_LENGTH:
+            start = bisect.bisect_left(self.terms, term)
+            for candidate in self.terms[start:start + MAX_PREFIX_EXPANSIONS + 1]:
+                if not candidate.startswith(term):
+                    break
+                if candidate != term:
+                    matches[candidate] = PREFIX_QUALITY + 0.4 * len(term) / len(candidate)
+
+        if len(term) >= MIN_TYPO_LENGTH:
+            candidates = set(self.deletes.get(term, ()))
+            for deleted in _deletes(term):
+                if deleted in self.postings:
+                    candidates.add(deleted)
+                candidates.update(self.deletes.get(deleted, ()))
+            for candidate in candidates:
+                if candidate not in matches and _one_edit(term, candidate):
+                    matches[candidate] = TYPO_QUALITY
+        return matches
+
+    def _ranked(self, term: str) -> List[Tuple[float, int]]:
+        """A term's postings as (-weight, document), best first; cached until they change."""
+        ranked = self._ranked_cache.get(term)
+        if ranked is None:
+            ranked = self._ranked_cache[term] = sorted((-weight, doc) for doc, weight in self.postings[term].items())
+        return ranked
+
+    def _top_one_term(self, term: str, wanted: int) -> List[Tuple[int, float]]:
+        # Merges the candidates' best-first postings and stops at ``wanted``,
+        # so a common word costs no more than a rare one
+        def scaled(candidate, quality):
+            return ((negative * quality, doc) for negative, doc in self._ranked(candidate))
+
+        top, seen = [], set()
+        streams = [scaled(candidate, quality) for candidate, quality in self.expand(term).items()]
+        for negative, doc in heapq.merge(*streams):
+            if doc in seen:
+                continue
+            seen.add(doc)
+            top.append((doc, -negative))
+            if len(top) == wanted:
+                break
+        return top
+
+    def _top_all_terms(self, terms: List[str], wanted: int) -> List[Tuple[int, float]]:
+        # document -> [query terms matched, score]
+        totals: Dict[int, list] = {}
+        for term in terms:
+            best: Dict[int, float] = {}
+            for candidate, quality in self.expand(term).items():
+                for doc, weight in self.postings[candidate].items():
+                    score = quality * weight
+                    if score > best.get(doc, 0.0):
+                        best[doc] = score
+            for doc, score in best.items():
+                entry = totals.get(doc)
+                if entry is None:
+                    totals[doc] = [1, score]
+                else:
+                    entry[0] += 1
+                    entry[1] += score
+        top = heapq.nsmallest(wanted, ((-matched, -score, doc) for doc, (matched, score) in totals.items()))
+        return [(doc, -negative) for _, negative, doc in top]
+
+    def search(self, query: str, limit: int, offset: int = 0) -> Tuple[List[dict], bool]:
+        """
+        One page of ranked hits; ties go to the course, then module and
+        chapter order.
+
+        Returns:
+            tuple: The hits and whether there are more
+        """
+        terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+        wanted = offset + limit + 1
+        if not terms:
+            return [], False
+        if len(terms) == 1:
+            top = self._top_one_term(terms[0], wanted)
+        else:
+            top = self._top_all_terms(terms, wanted)
+
+        hits = []
+        for doc, score in top[offset:offset + limit]:
+            kind, course_id, module_id, chapter_id, title, course_title = self.docs[doc]
+            hits.append({
+                "type": kind,
+                "courseId": course_id,
+                "moduleId": module_id,
+                "chapterId": chapter_id,
+                "title": title,
+                "courseTitle": course_title,
+                "score": round(score, 3)
+            })
+        return hits, len(top) == wanted
+
+
+_index: Optional[SearchIndex] = None
+_indexed_version: Optional[int] = None
+_watermark: Optional[datetime] = None
+_built_at = 0.0
+_update_lock = asyncio.Lock()
+_build_task: Optional[asyncio.Task] = None
+
+
+def _read_courses(match: dict):
+    db = get_database()
+    return db.courses.aggregate(assembly_pipeline(match, SEARCH_PROJECTION, chapter_fields=("title",)))
+
+
+async def rebuild_search_index():
+    """Index every active course from scratch and swap the result in."""
+    global _index, _indexed_version, _watermark, _built_at
+    # Read first, so edits made during the build are applied afterwards
+    version = await get_catalog_version()
+    index = SearchIndex()
+    watermark = None
+    started = time.perf_counter()
+    async for course in _read_courses({"isActive": True}):
+        index.add_course(course)
+        if course.get("updatedAt") and (watermark is None or course["updatedAt"] > watermark):
+            watermark = course["updatedAt"]
+
+    async with _update_lock:
+        _index, _indexed_version, _watermark = index, version, watermark
+        _built_at = time.monotonic()
+    logger.info("Search index built: %d documents in %.2fs", len(index), time.perf_counter() - started)
+
+
+async def _apply_catalog_changes(version: int):
+    global _indexed_version, _watermark
+    db = get_database()
+    query = {"updatedAt": {"$gte": _watermark - _UPDATE_OVERLAP}} if _watermark else {}
+    async for course in _read_courses(query):
+        if course.get("isActive") is True:
+            _index.add_course(course)
+        else:
+            _index.remove_course(str(course["_id"]))
+        if course.get("updatedAt") and (_watermark is None or course["updatedAt"] > _watermark):
+            _watermark = course["updatedAt"]
+
+    live = {str(course_id) for course_id in await db.courses.distinct("_id", {"isActive": True})}
+    for course_id in _index.course_ids():
+        if course_id not in live:
+            _index.remove_course(course_id)
+    _indexed_version = version
+    incr("course_search.updated")
+
+
+def _start_rebuild() -> asyncio.Task:
+    global _build_task
+    if _build_task is None or _build_task.done():
+        _build_task = asyncio.create_task(_rebuild_logged())
+    return _build_task
+
+
+async def _rebuild_logged():
+    try:
+        await rebuild_search_index()
+    except Exception:
+        # Searches keep using the text index, or the index we have
+        logger.exception("Failed to build search index")
+
+
+def start_search_index() -> List[asyncio.Task]:
+    """Build the index in the background at startup."""
+    if not settings.search_index_enabled:
+        return []
+    return [_start_rebuild()]
+
+
+async def _text_search(query: str, limit: int, offset: int) -> Tuple[List[dict], bool]:
+    db = get_database()
+    courses = await db.courses.find(
+        {"$text": {"$search": query}, "isActive": True},
+        {"title": 1, "score": {"$meta": "textScore"}}
+    ).sort([("score", {"$meta": "textScore"})]).skip(offset).limit(limit + 1).to_list(limit + 1)
+    hits = [
+        {
+            "type": "course",
+            "courseId": str(course["_id"]),
+            "title": course["title"],
+            "courseTitle": course["title"],
+            "score": round(course["score"], 3)
+        }
+        for course in courses[:limit]
+    ]
+    return hits, len(courses) > limit
+
+
+async def search_catalog(query: str, limit: int, offset: int = 0) -> Tuple[List[dict], bool]:
+    """
+    Ranked search hits for a query.
+
+    Returns:
+        tuple: One page of hits and whether there are more
+    """
+    if settings.search_index_enabled:
+        if _index is not None:
+            version = await get_catalog_version()
+            if version != _indexed_version:
+                async with _update_lock:
+                    if version != _indexed_version:
+                        await _apply_catalog_changes(version)
+            if time.monotonic() - _built_at >= settings.search_index_rebuild_seconds:
+                _start_rebuild()
+            incr("course_search.index")
+            return _index.search(query, limit, offset)
+        _start_rebuild()
+
+    incr("course_search.fallback")
+    return await _text_search(query, limit, offset)
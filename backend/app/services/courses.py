@@ -0,0 +1,430 @@
+"""
+Admin edits to courses, each one atomic update that returns the result.
+
+Every function is a single ``find_one_and_update`` that matches only when
+the targeted module/chapter exists and returns the course as it is after
+the change (None if nothing matched), so an edit is one round trip.
+Chapter counters are kept by ``$inc`` when the change in them is known up
+front (adding a chapter); edits that remove chapters or change a duration
+recompute them in the same update pipeline, so concurrent edits cannot
+leave them out of step with ``modules``.
+
+With ``course_chapter_storage = "collection"`` chapters are documents in
+``chapters`` (indexed on courseId, moduleId, order) and the course keeps
+only module headers and the totals, so a chapter edit touches that chapter
+and an ``$inc`` on the course, whatever the course's size. Those edits
+return the course headers without chapters. Readers assemble the tree with
+``assembly_pipeline``, which handles both layouts; existing courses are
+moved across by ``python -m app.tools.normalize_chapters``. Until a course
+has been moved its chapters stay embedded and are edited in place, so a
+course never has chapters in both places; a course takes new chapters in
+the collection once it is marked ``chapterStorage: "collection"`` or has
+no embedded chapters.
+
+``updatedAt`` is always set by the database (``$currentDate`` or
+``$$NOW``), never by the app, so every course's timestamp comes from one
+clock and readers can use it as a watermark.
+
+Callers bump the catalog version after a successful edit.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from ..config import settings
+from ..database import get_database
+
+# Sets ``updatedAt`` from the database's clock
+TOUCH = {"updatedAt": True}
+
+# Recomputes the counters from ``modules``; last stage of structural pipelines
+TOTALS_STAGE = {"$set": {
+    "totalChapters": {"$sum": {"$map": {
+        "input": {"$ifNull": ["$modules", []]},
+        "as": "m",
+        "in": {"$size": {"$ifNull": ["$$m.chapters", []]}}
+    }}},
+    "totalDuration": {"$sum": {"$map": {
+        "input": {"$ifNull": ["$modules", []]},
+        "as": "m",
+        "in": {"$sum": {"$map": {
+            "input": {"$ifNull": ["$$m.chapters", []]},
+            "as": "c",
+            "in": {"$ifNull": ["$$c.duration", 0]}
+        }}}
+    }}}
+}}
+
+
+def normalized_storage() -> bool:
+    return settings.course_chapter_storage == "collection"
+
+
+def chapter_document(course_id: ObjectId, module_id: str, chapter: dict, created_at: datetime = None) -> dict:
+    """A chapter as stored in the ``chapters`` collection."""
+    return {**chapter, "courseId": course_id, "moduleId": module_id, "createdAt": created_at or datetime.utcnow()}
+
+
+def assembly_pipeline(match: dict, projection: dict = None, limit: int = None, chapter_fields: tuple = None) -> list:
+    """
+    Aggregation that returns matching courses with the full module tree.
+
+    Chapters stored in the ``chapters`` collection are joined into their
+    modules (in ``order``); embedded ones are kept as they are. With
+    ``chapter_fields`` only those fields of joined chapters are read.
+    """
+    pipeline = [{"$match": match}]
+    if limit:
+        pipeline.append({"$limit": limit})
+    if projection:
+        pipeline.append({"$project": projection})
+    pipeline += [
+        {"$lookup": {
+            "from": "chapters",
+            "localField": "_id",
+            "foreignField": "courseId",
+            "pipeline": [
+                {"$sort": {"moduleId": 1, "order": 1, "createdAt": 1}},
+                {"$project": {"moduleId": 1, **{name: 1 for name in chapter_fields}}}
+                if chapter_fields else {"$project": {"courseId": 0, "createdAt": 0}}
+            ],
+            "as": "_chapters"
+        }},
+        {"$set": {"modules": {"$map": {
+            "input": {"$ifNull": ["$modules", []]},
+            "as": "m",
+            "in": {"$mergeObjects": ["$$m", {"chapters": {"$concatArrays": [
+                {"$ifNull": ["$$m.chapters", []]},
+                {"$filter": {"input": "$_chapters", "as": "c", "cond": {"$eq": ["$$c.moduleId", "$$m._id"]}}}
+            ]}}]}
+        }}}},
+        {"$unset": "_chapters"}
+    ]
+    return pipeline
+
+
+def module_pipeline(course_id: ObjectId, module_id: str) -> list:
+    """Aggregation that returns ``{"module": ...}`` for one module, chapters joined."""
+    return [
+        {"$match": {"_id": course_id, "modules._id": module_id}},
+        {"$project": {"module": {"$first": {"$filter": {
+            "input": "$modules",
+            "as": "m",
+            "cond": {"$eq": ["$$m._id", module_id]}
+        }}}}},
+        {"$lookup": {
+            "from": "chapters",
+            "localField": "_id",
+            "foreignField": "courseId",
+            "pipeline": [
+                {"$match": {"moduleId": module_id}},
+                {"$sort": {"order": 1, "createdAt": 1}},
+                {"$project": {"courseId": 0, "createdAt": 0}}
+            ],
+            "as": "_chapters"
+        }},
+        {"$project": {"module": {"$mergeObjects": ["$module", {"chapters": {"$concatArrays": [
+            {"$ifNull": ["$module.chapters", []]},
+            "$_chapters"
+        ]}}]}}}
+    ]
+
+
+async def _apply(query: dict, update, array_filters: List[dict] = None) -> Optional[dict]:
+    db = get_database()
+    return await db.courses.find_one_and_update(
+        query,
+        update,
+        array_filters=array_filters,
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _map_modules(module_id: str, change: dict) -> dict:
+    """Pipeline expression: ``modules`` with ``change`` merged into one module."""
+    return {"$map": {
+        "input": "$modules",
+        "as": "m",
+        "in": {"$cond": [
+            {"$eq": ["$$m._id", module_id]},
+            {"$mergeObjects": ["$$m", change]},
+            "$$m"
+        ]}
+    }}
+
+
+def _positional_set(prefix: str, fields: dict) -> dict:
+    return {f"{prefix}.{name}": value for name, value in fields.items()}
+
+
+async def update_course(course_id: str, fields: dict) -> Optional[dict]:
+    return await _apply({"_id": ObjectId(course_id)}, {"$set": fields, "$currentDate": TOUCH})
+
+
+async def add_module(course_id: str, module: dict) -> Optional[dict]:
+    return await _apply(
+        {"_id": ObjectId(course_id)},
+        {"$push": {"modules": module}, "$currentDate": TOUCH}
+    )
+
+
+async def update_module(course_id: str, module_id: str, fields: dict) -> Optional[dict]:
+    return await _apply(
+        {"_id": ObjectId(course_id), "modules._id": module_id},
+        {"$set": _positional_set("modules.$[m]", fields), "$currentDate": TOUCH},
+        array_filters=[{"m._id": module_id}]
+    )
+
+
+async def delete_module(course_id: str, module_id: str) -> Optional[dict]:
+    if normalized_storage():
+        return await _delete_module_collection(ObjectId(course_id), module_id)
+    # Unmigrated courses only: the totals are recomputed from embedded chapters
+    return await _apply(
+        {"_id": ObjectId(course_id), "modules._id": module_id},
+        [
+            {"$set": {
+                "modules": {"$filter": {
+                    "input": "$modules",
+                    "as": "m",
+                    "cond": {"$ne": ["$$m._id", module_id]}
+                }},
+                "updatedAt": "$$NOW"
+            }},
+            TOTALS_STAGE
+        ]
+    )
+
+
+async def reorder_modules(course_id: str, module_ids: List[str]) -> Optional[dict]:
+    """Set each listed module's ``order`` to its position in ``module_ids``."""
+    return await _apply(
+        {"_id": ObjectId(course_id), "modules._id": {"$all": module_ids}},
+        {"$set": {f"modules.$[m{i}].order": i for i in range(len(module_ids))}, "$currentDate": TOUCH},
+        array_filters=[{f"m{i}._id": module_id} for i, module_id in enumerate(module_ids)]
+    )
+
+
+async def add_chapter(course_id: str, module_id: str, chapter: dict) -> Optional[dict]:
+    if normalized_storage() and await _uses_collection(ObjectId(course_id)):
+        return await _add_chapter_collection(ObjectId(course_id), module_id, chapter)
+    return await _apply(
+        {"_id": ObjectId(course_id), "modules._id": module_id},
+        {
+            "$push": {"modules.$[m].chapters": chapter},
+            "$inc": {"totalChapters": 1, "totalDuration": chapter.get("duration") or 0},
+            "$currentDate": TOUCH
+        },
+        array_filters=[{"m._id": module_id}]
+    )
+
+
+async def update_chapter(course_id: str, module_id: str, chapter_id: str, fields: dict) -> Optional[dict]:
+    if normalized_storage():
+        course = await _update_chapter_collection(ObjectId(course_id), module_id, chapter_id, fields)
+        # Otherwise the chapter may still be embedded in an unmigrated course
+        if course is not None:
+            return course
+
+    query = {"_id": ObjectId(course_id), "modules": {"$elemMatch": {"_id": module_id, "chapters._id": chapter_id}}}
+
+    if "duration" not in fields:
+        return await _apply(
+            query,
+            {"$set": _positional_set("modules.$[m].chapters.$[c]", fields), "$currentDate": TOUCH},
+            array_filters=[{"m._id": module_id}, {"c._id": chapter_id}]
+        )
+
+    # The old duration is only known inside the update: recompute the totals
+    chapters = {"$map": {
+        "input": "$$m.chapters",
+        "as": "c",
+        "in": {"$cond": [
+            {"$eq": ["$$c._id", chapter_id]},
+            {"$mergeObjects": ["$$c", {"$literal": fields}]},
+            "$$c"
+        ]}
+    }}
+    return await _apply(
+        query,
+        [{"$set": {"modules": _map_modules(module_id, {"chapters": chapters}), "updatedAt": "$$NOW"}}, TOTALS_STAGE]
+    )
+
+
+async def delete_chapter(course_id: str, module_id: str, chapter_id: str) -> Optional[dict]:
+    if normalized_storage():
+        course = await _delete_chapter_collection(ObjectId(course_id), module_id, chapter_id)
+        if course is not None:
+            return course
+
+    chapters = {"$filter": {
+        "input": "$$m.chapters",
+        "as": "c",
+        "cond": {"$ne": ["$$c._id", chapter_id]}
+    }}
+    return await _apply(
+        {"_id": ObjectId(course_id), "modules": {"$elemMatch": {"_id": module_id, "chapters._id": chapter_id}}},
+        [{"$set": {"modules": _map_modules(module_id, {"chapters": chapters}), "updatedAt": "$$NOW"}}, TOTALS_STAGE]
+    )
+
+
+async def reorder_chapters(course_id: str, module_id: str, chapter_ids: List[str]) -> Optional[dict]:
+    """Set each listed chapter's ``order`` to its position in ``chapter_ids``."""
+    if normalized_storage():
+        course = await _reorder_chapters_collection(ObjectId(course_id), module_id, chapter_ids)
+        if course is not None:
+            return course
+    return await _apply(
+        {"_id": ObjectId(course_id), "modules": {"$elemMatch": {"_id": module_id, "chapters._id": {"$all": chapter_ids}}}},
+        {"$set": {f"modules.$[m].chapters.$[c{i}].order": i for i in range(len(chapter_ids))}, "$currentDate": TOUCH},
+        array_filters=[{"m._id": module_id}] + [{f"c{i}._id": chapter_id} for i, chapter_id in enumerate(chapter_ids)]
+    )
+
+
+# Normalized layout: chapters in their own collection
+
+# Chapters read per pass when deleting a module's chapters
+_REMOVE_BATCH = 100
+
+async def _touch(course_id: ObjectId, inc: dict = None) -> Optional[dict]:
+    update = {"$currentDate": TOUCH}
+    if inc:
+        update["$inc"] = inc
+    return await _apply({"_id": course_id}, update)
+
+
+async def _uses_collection(course_id: ObjectId) -> bool:
+    """True if the course keeps its chapters in ``chapters``, or has none embedded."""
+    db = get_database()
+    return await db.courses.find_one(
+        {"_id": course_id, "$or": [{"chapterStorage": "collection"}, {"modules.chapters.0": {"$exists": False}}]},
+        {"_id": 1}
+    ) is not None
+
+
+async def _add_chapter_collection(course_id: ObjectId, module_id: str, chapter: dict) -> Optional[dict]:
+    db = get_database()
+    # Insert first so the totals never count a chapter that failed to write
+    document = chapter_document(course_id, module_id, chapter)
+    await db.chapters.insert_one(document)
+    course = await _apply(
+        {"_id": course_id, "modules._id": module_id},
+        {
+            "$inc": {"totalChapters": 1, "totalDuration": chapter.get("duration") or 0},
+            "$set": {"chapterStorage": "collection"},
+            "$currentDate": TOUCH
+        }
+    )
+    if course is None:
+        # The module does not exist (or was deleted meanwhile)
+        removed = await db.chapters.delete_one({"_id": document["_id"]})
+        if not removed.deleted_count:
+            # A module delete got to the chapter first and took it off the
+            # totals, which this add never counted
+            await _touch(course_id, {"totalChapters": 1, "totalDuration": chapter.get("duration") or 0})
+    return course
+
+
+async def _update_chapter_collection(course_id: ObjectId, module_id: str, chapter_id: str, fields: dict) -> Optional[dict]:
+    db = get_database()
+    before = await db.chapters.find_one_and_update(
+        {"_id": chapter_id, "courseId": course_id, "moduleId": module_id},
+        {"$set": fields},
+        projection={"duration": 1}
+    )
+    if before is None:
+        return None
+    delta = (fields.get("duration") or 0) - (before.get("duration") or 0) if "duration" in fields else 0
+    return await _touch(course_id, {"totalDuration": delta} if delta else None)
+
+
+async def _delete_chapter_collection(course_id: ObjectId, module_id: str, chapter_id: str) -> Optional[dict]:
+    db = get_database()
+    removed = await db.chapters.find_one_and_delete(
+        {"_id": chapter_id, "courseId": course_id, "moduleId": module_id},
+        projection={"duration": 1}
+    )
+    if removed is None:
+        return None
+    return await _touch(course_id, {"totalChapters": -1, "totalDuration": -(removed.get("duration") or 0)})
+
+
+async def _reorder_chapters_collection(course_id: ObjectId, module_id: str, chapter_ids: List[str]) -> Optional[dict]:
+    db = get_database()
+    scope = {"courseId": course_id, "moduleId": module_id}
+    if await db.chapters.count_documents({**scope, "_id": {"$in": chapter_ids}}) != len(chapter_ids):
+        return None
+    await db.chapters.bulk_write(
+        [UpdateOne({**scope, "_id": chapter_id}, {"$set": {"order": i}}) for i, chapter_id in enumerate(chapter_ids)],
+        ordered=False
+    )
+    return await _touch(course_id)
+
+
+async def _remove_chapters(course_id: ObjectId, module_id: str) -> Optional[dict]:
+    """
+    Delete a module's chapters from ``chapters``, taking each one off the
+    totals. Chapters are deleted one by one so that only those this call
+    removed are subtracted (a concurrent chapter delete takes off its own).
+    """
+    db = get_database()
+    scope = {"courseId": course_id, "moduleId": module_id}
+    course = None
+    while True:
+        batch = await db.chapters.find(scope, {"_id": 1}).limit(_REMOVE_BATCH).to_list(_REMOVE_BATCH)
+        if not batch:
+            return course
+        count = duration = 0
+        for chapter in batch:
+            removed = await db.chapters.find_one_and_delete({**scope, "_id": chapter["_id"]}, projection={"duration": 1})
+            if removed is not None:
+                count += 1
+                duration += removed.get("duration") or 0
+        if count:
+            course = await _touch(course_id, {"totalChapters": -count, "totalDuration": -duration})
+
+
+async def _delete_module_collection(course_id: ObjectId, module_id: str) -> Optional[dict]:
+    db = get_database()
+    if await db.courses.find_one({"_id": course_id, "modules._id": module_id}, {"_id": 1}) is None:
+        return None
+
+    # Chapters go before the header, so a crash part way leaves the module
+    # in place to delete again rather than orphaned chapters
+    await _remove_chapters(course_id, module_id)
+
+    # An unmigrated course's embedded chapters go with the header and come
+    # off the totals in the same update
+    embedded = {"$ifNull": ["$_removed.chapters", []]}
+    course = await _apply(
+        {"_id": course_id, "modules._id": module_id},
+        [
+            {"$set": {"_removed": {"$first": {"$filter": {
+                "input": "$modules",
+                "as": "m",
+                "cond": {"$eq": ["$$m._id", module_id]}
+            }}}}},
+            {"$set": {
+                "modules": {"$filter": {
+                    "input": "$modules",
+                    "as": "m",
+                    "cond": {"$ne": ["$$m._id", module_id]}
+                }},
+                "totalChapters": {"$subtract": [{"$ifNull": ["$totalChapters", 0]}, {"$size": embedded}]},
+                "totalDuration": {"$subtract": [
+                    {"$ifNull": ["$totalDuration", 0]},
+                    {"$sum": {"$map": {"input": embedded, "as": "c", "in": {"$ifNull": ["$$c.duration", 0]}}}}
+                ]},
+                "updatedAt": "$$NOW"
+            }},
+            {"$unset": "_removed"}
+        ]
+    )
+    if course is None:
+        return None
+
+    # Chapters added while the first pass ran; later adds find no module
+    # and undo themselves
+    return await _remove_chapters(course_id, module_id) or course
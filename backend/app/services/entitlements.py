@@ -0,0 +1,80 @@
+"""
+What a user may see, derived from their subscription at read time.
+
+Free users get the scan itself (date, image, category names) but not the
+scores or the written analysis. Nothing is stored per scan: subscribing,
+cancelling or expiring changes what every scan shows with one write to the
+user document.
+"""
+import calendar
+from datetime import datetime
+from typing import Optional
+
+# Fields a free user's scan read may load; everything else in ``analysis``
+# stays in the database
+LOCKED_SCAN_PROJECTION = {
+    "userId": 1,
+    "imageUrl": 1,
+    "image.sha256": 1,
+    "isFallback": 1,
+    "model": 1,
+    "createdAt": 1,
+    "analysis.categories.name": 1
+}
+
+
+def has_full_access(user: dict) -> bool:
+    """
+    True while the user's subscription is active.
+
+    A recurring (Stripe subscription) plan stays active until it is
+    cancelled; a one-off payment also ends at ``expiresAt``. ``user`` may
+    be the user document or a principal built from token claims.
+    """
+    subscription = user.get("subscription") or {}
+    if subscription.get("status") != "active":
+        return False
+
+    expires_at = subscription.get("expiresAt")
+    recurring = subscription.get("recurring") or subscription.get("stripeSubscriptionId")
+    if recurring or expires_at is None:
+        return True
+    return expires_at > datetime.utcnow()
+
+
+def subscription_claims(subscription: Optional[dict]) -> dict:
+    """What ``has_full_access`` needs from a subscription, as JWT claims."""
+    subscription = subscription or {}
+    expires_at = subscription.get("expiresAt")
+    return {
+        "status": subscription.get("status") or "free",
+        "exp": calendar.timegm(expires_at.utctimetuple()) if expires_at else None,
+        "rec": bool(subscription.get("stripeSubscriptionId"))
+    }
+
+
+def subscription_from_claims(claims: dict) -> dict:
+    """Inverse of ``subscription_claims``."""
+    return {
+        "status": claims.get("status"),
+        "expiresAt": datetime.utcfromtimestamp(claims["exp"]) if claims.get("exp") else None,
+        "recurring": bool(claims.get("rec"))
+    }
+
+
+def scan_projection(full_access: bool) -> Optional[dict]:
+    """Projection for reading scans, or None to load them whole."""
+    return None if full_access else LOCKED_SCAN_PROJECTION
+
+
+def redact_analysis(analysis: Optional[dict]) -> Optional[dict]:
+    """The part of an analysis a free user may see: category names."""
+    if analysis is None:
+        return None
+    return {
+        "categories": [
+            {"name": category["name"]}
+            for category in analysis.get("categories") or []
+            if "name" in category
+        ]
+    }
@@ -1,7 +1,19 @@
 import google.generativeai as genai
+import asyncio
+import hashlib
 import json
-import base64
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterator, Optional
 from ..config import settings
+from ..utils.json_stream import JsonStreamParser
+from ..utils.metrics import incr
+from .model_router import ModelRouter
+from .resilience import (
+    CircuitBreaker, CircuitOpenError, RetryBudget, call_with_retries, hedged,
+    is_transient
+)
 
 # Configure Gemini
 genai.configure(api_key=settings.gemini_api_key)
@@ -52,61 +64,345 @@ OUTPUT FORMAT (respond ONLY with valid JSON, no markdown):
 
 Analyze the face in the image now and respond with ONLY the JSON object."""
 
+# Changes whenever the prompt text changes; stored with cached analyses
+PROMPT_VERSION = hashlib.sha256(FACE_ANALYSIS_PROMPT.encode()).hexdigest()[:12]
 
-async def analyze_face(image_base64: str) -> dict:
+
+class AnalyzerBusyError(Exception):
+    """Raised when too many scans are already waiting for the model."""
+
+    def __init__(self, retry_after: int, message: str = "Face analyzer is at capacity"):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AnalyzerUnavailableError(AnalyzerBusyError):
+    """Raised without calling the model while its circuit breaker is open."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(retry_after, "Face analysis is temporarily unavailable")
+
+
+# One GenerativeModel per model name per process, created on first use
+_models: Dict[str, genai.GenerativeModel] = {}
+
+# Bounded admission: at most gemini_max_concurrency calls in flight and
+# gemini_max_queue more waiting for a slot; anything beyond is rejected.
+_slots = asyncio.Semaphore(settings.gemini_max_concurrency)
+_pending = 0
+_in_flight = 0
+
+_router = ModelRouter(
+    settings.gemini_model,
+    settings.gemini_fallback_model,
+    latency_slo=settings.gemini_latency_slo_seconds,
+    queue_threshold=settings.gemini_route_queue_threshold,
+    error_rate_threshold=settings.gemini_route_error_rate,
+    min_dwell_seconds=settings.gemini_route_min_dwell_seconds,
+    window_seconds=settings.gemini_route_window_seconds
+)
+_breakers: Dict[str, CircuitBreaker] = {}
+_retry_budget = RetryBudget(settings.gemini_retry_budget_ratio)
+
+
+def get_model(name: str = None) -> genai.GenerativeModel:
+    """Return the shared GenerativeModel for ``name`` (default: primary)."""
+    name = name or settings.gemini_model
+    if name not in _models:
+        _models[name] = genai.GenerativeModel(name)
+    return _models[name]
+
+
+def _get_breaker(name: str) -> CircuitBreaker:
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(
+            f"gemini:{name}",
+            failure_threshold=settings.gemini_breaker_failure_threshold,
+            reset_seconds=settings.gemini_breaker_reset_seconds
+        )
+    return _breakers[name]
+
+
+def get_analyzer_stats() -> dict:
+    """Current admission, routing and circuit state of the analyzer."""
+    breakers = {name: _get_breaker(name).snapshot() for name in _router.stats}
+    states = {breaker["state"] for breaker in breakers.values()}
+    return {
+        "inFlight": _in_flight,
+        "queued": _pending - _in_flight,
+        "maxConcurrency": settings.gemini_max_concurrency,
+        "maxQueue": settings.gemini_max_queue,
+        # Worst state across models: open only if no model can take traffic
+        "circuit": {
+            "state": "open" if states == {"open"} else ("closed" if states == {"closed"} else "half_open"),
+            "models": breakers
+        },
+        "routing": _router.snapshot()
+    }
+
+
+def parse_analysis_text(response_text: str) -> dict:
+    """Parse the model's JSON answer, tolerating a markdown code fence."""
+    response_text = response_text.strip()
+    
+    # Remove markdown code blocks if present
+    if response_text.startswith("```"):
+        lines = response_text.split("\n")
+        response_text = "\n".join(lines[1:-1])
+    
+    return json.loads(response_text)
+
+
+async def _generate(image: bytes, mime_type: str, model_name: str) -> dict:
+    response = await get_model(model_name).generate_content_async([
+        FACE_ANALYSIS_PROMPT,
+        {
+            "mime_type": mime_type,
+            "data": image
+        }
+    ])
+    return parse_analysis_text(response.text)
+
+
+async def _timed_generate(image: bytes, mime_type: str, model_name: str, deadline: float) -> dict:
+    started = time.monotonic()
+    try:
+        analysis = await asyncio.wait_for(
+            _generate(image, mime_type, model_name),
+            timeout=max(deadline - started, 0)
+        )
+    except asyncio.TimeoutError:
+        _router.record(model_name, time.monotonic() - started, ok=False)
+        raise
+    except Exception:
+        _router.record(model_name, None, ok=False)
+        raise
+    _router.record(model_name, time.monotonic() - started, ok=True)
+    return analysis
+
+
+def _hedge_delay(model_name: str) -> Optional[float]:
+    """Hedge after the model's observed p95, once there is enough data for one."""
+    stats = _router.stats.get(model_name)
+    if not settings.gemini_hedge_enabled or stats is None or len(stats) < 20:
+        return None
+    return max(stats.p95(), settings.gemini_hedge_min_delay)
+
+
+def _pick_model() -> str:
+    """Routed model, skipping one whose circuit is open if the other is usable."""
+    model_name = _router.choose(queue_depth=_pending - _in_flight)
+    if _get_breaker(model_name).is_open:
+        alternative = _router.alternative(model_name)
+        if alternative and not _get_breaker(alternative).is_open:
+            return alternative
+        raise AnalyzerUnavailableError(math.ceil(_get_breaker(model_name).retry_after()))
+    return model_name
+
+
+def _fallback_result(error: str, model_name: str) -> dict:
+    incr("analyzer.fallback")
+    return {
+        "success": False,
+        "fallback": True,
+        "error": error,
+        "analysis": get_default_analysis(),
+        "model": model_name
+    }
+
+
+@asynccontextmanager
+async def _admission():
+    """Hold one of the model call slots, or fail fast if the queue is full."""
+    global _pending, _in_flight
+    
+    if _pending >= settings.gemini_max_concurrency + settings.gemini_max_queue:
+        raise AnalyzerBusyError(settings.gemini_retry_after_seconds)
+    
+    _pending += 1
+    try:
+        async with _slots:
+            _in_flight += 1
+            try:
+                yield
+            finally:
+                _in_flight -= 1
+    finally:
+        _pending -= 1
+
+
+async def analyze_face(image: bytes, mime_type: str = "image/jpeg") -> dict:
     """
     Analyze a face image using Gemini Flash API.
     
+    The model call runs on the event loop through the async client, with at
+    most ``gemini_max_concurrency`` calls in flight, and gets
+    ``gemini_timeout_seconds`` in all. Each call goes to the model picked by
+    the latency-aware router. Transient failures are retried with jittered
+    backoff (within a retry budget and the time left), optionally hedged
+    after the observed p95 when a call slot is free, and tracked by a
+    per-model circuit breaker.
+    
     Args:
-        image_base64: Base64 encoded image string
+        image: Image bytes, normally the output of ``normalize_image``
+        mime_type: MIME type of ``image``
         
     Returns:
-        dict: Analysis results with scores and recommendations
-    """
-    try:
-        # Initialize the model
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        dict: Analysis results with scores and recommendations, plus the
+        ``model`` that was asked. When the model could not produce one,
+        ``success`` is False, ``fallback`` is True and ``analysis`` holds
+        the generic default.
         
-        # Prepare the image
-        image_data = base64.b64decode(image_base64)
-        
-        # Create the content with image
-        response = model.generate_content([
-            FACE_ANALYSIS_PROMPT,
-            {
-                "mime_type": "image/jpeg",
-                "data": image_base64
-            }
-        ])
-        
-        # Parse the response
-        response_text = response.text.strip()
-        
-        # Remove markdown code blocks if present
-        if response_text.startswith("```"):
-            lines = response_text.split("\n")
-            response_text = "\n".join(lines[1:-1])
-        
-        # Parse JSON
-        analysis = json.loads(response_text)
+    Raises:
+        AnalyzerBusyError: If the wait queue is already full
+        AnalyzerUnavailableError: If every model's circuit breaker is open
+    """
+    # Fail in microseconds while every model is known to be down
+    model_name = _pick_model()
+    
+    async with _admission():
+        deadline = time.monotonic() + settings.gemini_timeout_seconds
+        try:
+            analysis = await call_with_retries(
+                lambda: hedged(
+                    lambda: _timed_generate(image, mime_type, model_name, deadline),
+                    _hedge_delay(model_name),
+                    _slots
+                ),
+                attempts=settings.gemini_retry_attempts,
+                base_delay=settings.gemini_retry_base_delay,
+                max_delay=settings.gemini_retry_max_delay,
+                budget=_retry_budget,
+                breaker=_get_breaker(model_name),
+                name="gemini",
+                deadline=deadline
+            )
+        except CircuitOpenError as e:
+            raise AnalyzerUnavailableError(math.ceil(e.retry_after))
+        except asyncio.TimeoutError:
+            return _fallback_result(
+                f"Analysis timed out after {settings.gemini_timeout_seconds}s", model_name
+            )
+        except json.JSONDecodeError as e:
+            return _fallback_result(f"Failed to parse AI response: {str(e)}", model_name)
+        except Exception as e:
+            return _fallback_result(str(e), model_name)
+    
+    incr(f"analyzer.model.{model_name}")
+    return {
+        "success": True,
+        "analysis": analysis,
+        "model": model_name
+    }
+
+
+def partial_event(path: tuple, value) -> Optional[dict]:
+    """Map a value completed by the stream parser to a client event, if any."""
+    if path in (("summary",), ("overallScore",), ("topPriorities",)):
+        return {"event": path[0], "data": value}
+    if len(path) == 2 and path[0] == "categories":
+        return {"event": "category", "index": path[1], "data": value}
+    return None
+
+
+def analysis_events(analysis: dict) -> Iterator[dict]:
+    """The partial events for an analysis that is already complete."""
+    for key in ("overallScore", "summary"):
+        if key in analysis:
+            yield partial_event((key,), analysis[key])
+    for index, category in enumerate(analysis.get("categories") or []):
+        yield partial_event(("categories", index), category)
+    if "topPriorities" in analysis:
+        yield partial_event(("topPriorities",), analysis["topPriorities"])
+
+
+async def _stream_chunks(response, deadline: float) -> AsyncIterator[str]:
+    """Chunk texts of a streamed response, bounded by an overall deadline."""
+    chunks = response.__aiter__()
+    while True:
+        try:
+            chunk = await asyncio.wait_for(chunks.__anext__(), timeout=deadline - time.monotonic())
+        except StopAsyncIteration:
+            return
+        yield chunk.text
+
+
+async def stream_analyze_face(image: bytes, mime_type: str = "image/jpeg") -> AsyncIterator[dict]:
+    """
+    Analyze a face image, yielding parts of the analysis as the model writes them.
+    
+    Yields ``{"event": "started", "model": ...}`` once the call is admitted,
+    then ``overallScore``, ``summary``, one ``category`` per entry of
+    ``categories`` and ``topPriorities`` as each is complete, and finally
+    ``{"event": "result", "result": ...}`` with the same dict
+    ``analyze_face`` returns. A stream cannot be retried or hedged once
+    content has been sent, so failures go straight to the fallback result.
+    
+    Raises:
+        AnalyzerBusyError: If the wait queue is already full (before any event)
+        AnalyzerUnavailableError: If every model's circuit breaker is open
+    """
+    model_name = _pick_model()
+    breaker = _get_breaker(model_name)
+    
+    async with _admission():
+        try:
+            breaker.before_call()
+        except CircuitOpenError as e:
+            raise AnalyzerUnavailableError(math.ceil(e.retry_after))
+        started = time.monotonic()
+        deadline = started + settings.gemini_timeout_seconds
+        parser = JsonStreamParser()
+        try:
+            # Inside the try: a client gone at this first event must still
+            # give back a half-open probe slot
+            yield {"event": "started", "model": model_name}
+            response = await asyncio.wait_for(
+                get_model(model_name).generate_content_async([
+                    FACE_ANALYSIS_PROMPT,
+                    {
+                        "mime_type": mime_type,
+                        "data": image
+                    }
+                ], stream=True),
+                timeout=settings.gemini_timeout_seconds
+            )
+            async for text in _stream_chunks(response, deadline):
+                for path, value in parser.feed(text):
+                    event = partial_event(path, value)
+                    if event is not None:
+                        yield event
+            if not parser.done:
+                raise json.JSONDecodeError("Response ended before the JSON object closed", "", 0)
+        except (asyncio.CancelledError, GeneratorExit):
+            breaker.release_probe()
+            raise
+        except Exception as e:
+            if is_transient(e):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            if isinstance(e, asyncio.TimeoutError):
+                _router.record(model_name, time.monotonic() - started, ok=False)
+                error = f"Analysis timed out after {settings.gemini_timeout_seconds}s"
+            else:
+                _router.record(model_name, None, ok=False)
+                error = f"Failed to parse AI response: {str(e)}" if isinstance(e, json.JSONDecodeError) else str(e)
+            yield {"event": "result", "result": _fallback_result(error, model_name)}
+            return
         
-        return {
+        breaker.record_success()
+        _router.record(model_name, time.monotonic() - started, ok=True)
+    
+    incr(f"analyzer.model.{model_name}")
+    yield {
+        "event": "result",
+        "result": {
             "success": True,
-            "analysis": analysis
-        }
-        
-    except json.JSONDecodeError as e:
-        return {
-            "success": False,
-            "error": f"Failed to parse AI response: {str(e)}",
-            "analysis": get_default_analysis()
-        }
-    except Exception as e:
-        return {
-            "success": False,
-            "error": str(e),
-            "analysis": get_default_analysis()
+            "analysis": parser.result,
+            "model": model_name
         }
+    }
 
 
 def get_default_analysis() -> dict:
@@ -0,0 +1,111 @@
+"""
+Image normalization before model submission.
+
+Client uploads arrive in whatever format and size the phone produced.
+``normalize_image`` decodes them, applies the EXIF orientation, downscales
+to ``image_max_edge``, drops all metadata and re-encodes as JPEG so the
+model always receives a small, upright, uniform image.
+"""
+import asyncio
+import base64
+import binascii
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+from ..config import settings
+
+# Refuse absurd dimensions before decoding (decompression bombs)
+Image.MAX_IMAGE_PIXELS = settings.image_max_pixels
+
+# Pillow releases the GIL while decoding/resizing, so threads scale well
+_executor = ThreadPoolExecutor(
+    max_workers=settings.image_pool_workers,
+    thread_name_prefix="image"
+)
+
+
+class InvalidImageError(ValueError):
+    """Raised when the uploaded bytes are not a decodable image."""
+
+
+def decode_base64_image(image_base64: str) -> bytes:
+    """Decode a base64 upload, accepting an optional ``data:`` URL prefix."""
+    if image_base64.startswith("data:"):
+        image_base64 = image_base64.split(",", 1)[-1]
+    try:
+        return base64.b64decode(image_base64)
+    except (binascii.Error, ValueError) as e:
+        raise InvalidImageError(f"Invalid base64 image data: {e}")
+
+
+def normalize_image(data: bytes, max_edge: int = None, quality: int = None) -> dict:
+    """
+    Decode, orient, downscale and re-encode an image as a metadata-free JPEG.
+
+    Args:
+        data: Raw image bytes in any format Pillow can read
+        max_edge: Longest output edge in pixels (defaults to settings)
+        quality: JPEG quality (defaults to settings)
+
+    Returns:
+        dict: ``data`` (JPEG bytes), ``mimeType``, ``width``, ``height``,
+        ``sourceFormat``, ``originalBytes``, ``normalizedBytes`` and
+        ``bytesSaved``
+    """
+    max_edge = max_edge or settings.image_max_edge
+    quality = quality or settings.image_jpeg_quality
+
+    try:
+        img = Image.open(io.BytesIO(data))
+        source_format = img.format
+        # Let the JPEG decoder skip detail we are about to throw away
+        if source_format == "JPEG":
+            img.draft("RGB", (max_edge, max_edge))
+        img = ImageOps.exif_transpose(img)
+    except Exception:
+        raise InvalidImageError("Unsupported or corrupt image data")
+
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        # Flatten transparency onto white rather than black
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.convert("RGBA").getchannel("A"))
+        img = background
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+
+    if max(img.size) > max_edge:
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    out = io.BytesIO()
+    # No exif/icc passed through: metadata (GPS, device) is stripped
+    img.save(out, format="JPEG", quality=quality, optimize=True)
+    normalized = out.getvalue()
+
+    return {
+        "data": normalized,
+        "mimeType": "image/jpeg",
+        "width": img.width,
+        "height": img.height,
+        "sourceFormat": source_format,
+        "originalBytes": len(data),
+        "normalizedBytes": len(normalized),
+        "bytesSaved": len(data) - len(normalized)
+    }
+
+
+async def run_in_image_pool(func, *args):
+    """Run CPU-bound image work in the image worker pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, func, *args)
+
+
+async def normalize_image_async(data: bytes, max_edge: int = None, quality: int = None) -> dict:
+    """Run ``normalize_image`` in the image worker pool."""
+    return await run_in_image_pool(normalize_image, data, max_edge, quality)
+
+
+def image_info(normalized: dict) -> dict:
+    """The part of a normalization result worth storing on a scan."""
+    return {key: value for key, value in normalized.items() if key != "data"}
@@ -0,0 +1,117 @@
+"""
+Cheap local quality checks run before an image is sent to the model.
+
+Dark, blurry or badly framed photos cost a Gemini call and still come back
+as a useless analysis. ``assess_image_quality`` decodes a small grayscale
+copy of the normalized image and scores:
+
+- sharpness: variance of the Laplacian (low = blurry)
+- exposure: mean brightness and the share of crushed / blown-out pixels
+- framing: offset of the detail (edge energy) centroid from the centre
+
+Only clearly unusable images fail; the scores are kept on the scan either
+way so thresholds can be tuned against real outcomes.
+"""
+import io
+import time
+
+import numpy as np
+from PIL import Image
+
+from ..config import settings
+from ..utils.metrics import incr
+from .image_processing import InvalidImageError, run_in_image_pool
+
+REASONS = {
+    "blurry": "The photo is blurry. Hold the camera steady and make sure your face is in focus.",
+    "too_dark": "The photo is too dark. Face a window or turn on a light.",
+    "overexposed": "The photo is overexposed. Avoid direct sunlight or a bright light behind you.",
+    "off_center": "Your face is not centred. Hold the camera at eye level with your face in the middle.",
+}
+
+
+def _grayscale(data: bytes, edge: int) -> np.ndarray:
+    img = Image.open(io.BytesIO(data))
+    # JPEG can decode straight to a reduced-size grayscale image
+    if img.format == "JPEG":
+        img.draft("L", (edge, edge))
+    img = img.convert("L")
+    if max(img.size) > edge:
+        img.thumbnail((edge, edge), Image.BILINEAR)
+    return np.asarray(img, dtype=np.float32)
+
+
+def assess_image_quality(data: bytes) -> dict:
+    """
+    Score an image's sharpness, exposure and framing.
+
+    Args:
+        data: Image bytes, normally the output of ``normalize_image``
+
+    Returns:
+        dict: ``passed``, ``reasons`` (keys of ``REASONS``), ``scores`` and
+        ``elapsedMs``
+    """
+    started = time.perf_counter()
+    try:
+        gray = _grayscale(data, settings.image_quality_edge)
+    except Exception:
+        raise InvalidImageError("Unsupported or corrupt image data")
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+        raise InvalidImageError("Image is too small")
+
+    laplacian = (
+        gray[1:-1, :-2] + gray[1:-1, 2:] + gray[:-2, 1:-1] + gray[2:, 1:-1]
+        - 4 * gray[1:-1, 1:-1]
+    )
+    sharpness = float(laplacian.var())
+
+    histogram = np.bincount(gray.astype(np.uint8).ravel(), minlength=256)
+    pixels = gray.size
+    brightness = float(gray.mean())
+    dark_clipped = float(histogram[:16].sum() / pixels)
+    bright_clipped = float(histogram[240:].sum() / pixels)
+
+    # Centroid of edge energy, as a fraction of the frame from its centre
+    energy = np.abs(laplacian)
+    total = float(energy.sum())
+    if total > 0:
+        rows, cols = energy.shape
+        offset_y = float((energy.sum(axis=1) @ np.arange(rows)) / total / rows - 0.5)
+        offset_x = float((energy.sum(axis=0) @ np.arange(cols)) / total / cols - 0.5)
+    else:
+        offset_x = offset_y = 0.0
+
+    reasons = []
+    if brightness < settings.image_min_brightness or dark_clipped > settings.image_max_clipped:
+        reasons.append("too_dark")
+    if brightness > settings.image_max_brightness or bright_clipped > settings.image_max_clipped:
+        reasons.append("overexposed")
+    # Bad exposure flattens detail too; lighting is the fix to suggest then
+    if sharpness < settings.image_min_sharpness and not reasons:
+        reasons.append("blurry")
+    if max(abs(offset_x), abs(offset_y)) > settings.image_max_center_offset:
+        reasons.append("off_center")
+
+    return {
+        "passed": not reasons,
+        "reasons": reasons,
+        "scores": {
+            "sharpness": round(sharpness, 1),
+            "brightness": round(brightness, 1),
+            "darkClipped": round(dark_clipped, 3),
+            "brightClipped": round(bright_clipped, 3),
+            "centerOffsetX": round(offset_x, 3),
+            "centerOffsetY": round(offset_y, 3)
+        },
+        "elapsedMs": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+async def assess_image_quality_async(data: bytes) -> dict:
+    """Run ``assess_image_quality`` in the image worker pool."""
+    result = await run_in_image_pool(assess_image_quality, data)
+    incr("image_quality.passed" if result["passed"] else "image_quality.rejected")
+    for reason in result["reasons"]:
+        incr(f"image_quality.reason.{reason}")
+    return result
@@ -0,0 +1,181 @@
+"""
+Latency-aware choice between the primary and a fallback Gemini model.
+
+Each model keeps the latencies and outcomes of its recent calls. Traffic
+shifts to the fallback when the primary's p95 passes the latency SLO, its
+error rate passes the threshold, or the analyzer queue gets too deep. It
+shifts back only once all of them are comfortably below their thresholds
+(``recover_ratio``) and at least ``min_dwell_seconds`` have passed since the
+last switch, so routing does not flap. While degraded a small share of
+scans still probes the primary, plus one scan every
+``probe_interval_seconds`` however little traffic there is, and recovery
+is judged on those probes alone, kept over ``probe_window_seconds``. So
+the primary gets its ``min_samples`` probes at any traffic level.
+"""
+import logging
+import random
+import time
+from collections import deque
+from typing import Optional
+
+from ..utils.metrics import incr
+
+logger = logging.getLogger(__name__)
+
+
+class ModelStats:
+    """Latencies and outcomes of the calls made in the last ``window_seconds``."""
+
+    def __init__(self, window_seconds: float = 60.0, max_samples: int = 500):
+        self.window_seconds = window_seconds
+        self._samples = deque(maxlen=max_samples)  # (monotonic time, seconds, ok)
+
+    def _prune(self):
+        horizon = time.monotonic() - self.window_seconds
+        while self._samples and self._samples[0][0] < horizon:
+            self._samples.popleft()
+
+    def record(self, seconds: Optional[float], ok: bool):
+        # Timeouts pass their elapsed time so they count as slow calls
+        self._samples.append((time.monotonic(), seconds, ok))
+
+    def __len__(self):
+        self._prune()
+        return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        self._prune()
+        latencies = sorted(seconds for _, seconds, _ in self._samples if seconds is not None)
+        if not latencies:
+            return None
+        return latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+
+    def p95(self) -> Optional[float]:
+        return self.quantile(0.95)
+
+    def error_rate(self) -> float:
+        self._prune()
+        if not self._samples:
+            return 0.0
+        return sum(1 for _, _, ok in self._samples if not ok) / len(self._samples)
+
+    def snapshot(self) -> dict:
+        return {
+            "p50Seconds": self.quantile(0.5),
+            "p95Seconds": self.p95(),
+            "errorRate": round(self.error_rate(), 3),
+            "samples": len(self)
+        }
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        primary: str,
+        fallback: Optional[str] = None,
+        latency_slo: float = 8.0,
+        queue_threshold: int = 12,
+        error_rate_threshold: float = 0.2,
+        recover_ratio: float = 0.7,
+        min_dwell_seconds: float = 30.0,
+        probe_ratio: float = 0.05,
+        min_samples: int = 10,
+        window_seconds: float = 60.0,
+        probe_interval_seconds: Optional[float] = None,
+        probe_window_seconds: Optional[float] = None
+    ):
+        self.primary = primary
+        self.fallback = fallback or None
+        self.latency_slo = latency_slo
+        self.queue_threshold = queue_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.recover_ratio = recover_ratio
+        self.min_dwell_seconds = min_dwell_seconds
+        self.probe_ratio = probe_ratio
+        self.min_samples = min_samples
+        self.window_seconds = window_seconds
+        # Defaults: min_samples timed probes fit in one stats window, and
+        # probes are kept long enough for twice that many
+        self.probe_interval_seconds = probe_interval_seconds or window_seconds / min_samples
+        self.probe_window_seconds = probe_window_seconds or max(
+            window_seconds, 2 * min_samples * self.probe_interval_seconds
+        )
+
+        self.stats = {primary: ModelStats(window_seconds)}
+        if self.fallback:
+            self.stats[self.fallback] = ModelStats(window_seconds)
+        self.degraded = False
+        self.switched_at = 0.0
+        self.probed_at = 0.0
+        self.reason = None
+
+    def _breach(self, queue_depth: int, factor: float) -> Optional[str]:
+        """Why the primary is over its thresholds scaled by ``factor``, if it is."""
+        stats = self.stats[self.primary]
+        p95 = stats.p95()
+        if len(stats) >= self.min_samples:
+            if p95 is not None and p95 > self.latency_slo * factor:
+                return f"p95 {p95:.2f}s over SLO"
+            if stats.error_rate() > self.error_rate_threshold * factor:
+                return f"error rate {stats.error_rate():.0%}"
+        if queue_depth >= self.queue_threshold * factor:
+            return f"queue depth {queue_depth}"
+        return None
+
+    def _update_state(self, queue_depth: int):
+        now = time.monotonic()
+        if now - self.switched_at < self.min_dwell_seconds:
+            return
+
+        if not self.degraded:
+            reason = self._breach(queue_depth, 1.0)
+            if reason:
+                self.degraded, self.switched_at, self.reason = True, now, reason
+                # Judge recovery on probes only, not on samples from the slowdown
+                self.stats[self.primary] = ModelStats(self.probe_window_seconds)
+                incr("model_router.degraded")
+                logger.warning("Routing scans to %s: %s", self.fallback, reason)
+        elif (
+            len(self.stats[self.primary]) >= self.min_samples
+            and self._breach(queue_depth, self.recover_ratio) is None
+        ):
+            self.degraded, self.switched_at, self.reason = False, now, None
+            self.stats[self.primary].window_seconds = self.window_seconds
+            incr("model_router.recovered")
+            logger.info("Routing scans back to %s", self.primary)
+
+    def choose(self, queue_depth: int = 0) -> str:
+        """Model to use for the next call."""
+        if not self.fallback:
+            return self.primary
+
+        self._update_state(queue_depth)
+        if not self.degraded:
+            return self.primary
+
+        now = time.monotonic()
+        if now - self.probed_at >= self.probe_interval_seconds or random.random() < self.probe_ratio:
+            self.probed_at = now
+            return self.primary
+        return self.fallback
+
+    def alternative(self, model: str) -> Optional[str]:
+        """The other configured model, if any."""
+        if not self.fallback:
+            return None
+        return self.fallback if model == self.primary else self.primary
+
+    def record(self, model: str, seconds: Optional[float], ok: bool):
+        self.stats.setdefault(model, ModelStats(self.window_seconds)).record(seconds, ok)
+
+    def p95(self, model: str) -> Optional[float]:
+        stats = self.stats.get(model)
+        return stats.p95() if stats else None
+
+    def snapshot(self) -> dict:
+        return {
+            "active": self.fallback if self.degraded else self.primary,
+            "degraded": self.degraded,
+            "reason": self.reason,
+            "models": {name: stats.snapshot() for name, stats in self.stats.items()}
+        }
@@ -0,0 +1,86 @@
+"""
+Long-lived refresh tokens for claims-mode auth.
+
+Only a SHA-256 digest of each token is stored (in ``refresh_tokens``, as
+``_id``), so a database leak does not hand out sessions. Every refresh
+consumes the presented token and issues its successor in the same family;
+presenting a token that was already used means it was copied, and the
+whole family is revoked. Expired tokens are removed by a TTL index.
+"""
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta
+from typing import Tuple
+
+from ..config import settings
+from ..database import get_database
+from ..utils.metrics import incr
+
+
+class InvalidRefreshTokenError(Exception):
+    """Raised for an unknown, expired, or already used refresh token."""
+
+
+def _digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def create_refresh_token(user_id: str, family: str = None) -> str:
+    """Issue a refresh token, starting a new family unless one is given."""
+    db = get_database()
+    token = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    await db.refresh_tokens.insert_one({
+        "_id": _digest(token),
+        "userId": user_id,
+        "family": family or uuid.uuid4().hex,
+        "createdAt": now,
+        "expiresAt": now + timedelta(days=settings.refresh_token_expire_days),
+        "usedAt": None
+    })
+    return token
+
+
+async def rotate_refresh_token(token: str) -> Tuple[str, str]:
+    """
+    Consume a refresh token and issue its successor.
+
+    Returns:
+        tuple: The user id and the new refresh token
+
+    Raises:
+        InvalidRefreshTokenError: If the token cannot be used
+    """
+    db = get_database()
+    now = datetime.utcnow()
+    digest = _digest(token)
+
+    # Atomic, so two concurrent refreshes with one token cannot both win
+    record = await db.refresh_tokens.find_one_and_update(
+        {"_id": digest, "usedAt": None, "expiresAt": {"$gt": now}},
+        {"$set": {"usedAt": now}}
+    )
+    if record is None:
+        used = await db.refresh_tokens.find_one({"_id": digest, "usedAt": {"$ne": None}}, {"family": 1})
+        if used is not None:
+            incr("auth.refresh.reused")
+            await db.refresh_tokens.delete_many({"family": used["family"]})
+        raise InvalidRefreshTokenError("Invalid or expired refresh token")
+
+    incr("auth.refresh.rotated")
+    return record["userId"], await create_refresh_token(record["userId"], record["family"])
+
+
+async def revoke_refresh_tokens(user_id: str):
+    """Drop every refresh token a user holds."""
+    db = get_database()
+    await db.refresh_tokens.delete_many({"userId": user_id})
+
+
+async def revoke_refresh_token_family(token: str):
+    """Drop a refresh token and every token rotated from the same sign-in."""
+    db = get_database()
+    record = await db.refresh_tokens.find_one({"_id": _digest(token)}, {"family": 1})
+    if record is not None:
+        await db.refresh_tokens.delete_many({"family": record["family"]})
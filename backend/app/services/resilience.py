@@ -0,0 +1,275 @@
+"""
+Resilience primitives for calls to external services.
+
+- ``is_transient``: which errors are worth retrying
+- ``RetryBudget``: caps retries to a fraction of regular traffic so retries
+  cannot multiply load on a struggling upstream
+- ``CircuitBreaker``: after consecutive failures, rejects calls immediately
+  until a cool-down has passed, then lets a single probe through
+- ``LatencyWindow``: rolling latency samples for percentile estimates
+- ``call_with_retries`` / ``hedged``: exponential backoff with full jitter,
+  and an optional second request fired when the first is slow
+"""
+import asyncio
+import bisect
+import logging
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from google.api_core import exceptions as google_exceptions
+
+from ..utils.metrics import incr
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT_ERRORS = (
+    asyncio.TimeoutError,
+    ConnectionError,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.BadGateway,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.Aborted,
+    google_exceptions.Unknown,
+)
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    True for errors a retry may fix (throttling, timeouts, 5xx). A reply
+    that does not parse is not one: the same request gets the same reply.
+    """
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open")
+        self.retry_after = retry_after
+
+
+class RetryBudget:
+    """
+    Token budget for retries.
+
+    Every first attempt deposits ``ratio`` tokens and every retry spends one,
+    so retries stay below ``ratio`` of traffic over time.
+    """
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self):
+        """Raise ``CircuitOpenError`` unless a call may go through now."""
+        if self.state == self.CLOSED:
+            return
+
+        remaining = self.opened_at + self.reset_seconds - time.monotonic()
+        if self.state == self.OPEN and remaining <= 0:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return
+
+        incr(f"circuit.{self.name}.rejected")
+        raise CircuitOpenError(self.name, max(remaining, 1.0))
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls would be rejected without probing."""
+        return self.state == self.OPEN and time.monotonic() < self.opened_at + self.reset_seconds
+
+    def retry_after(self) -> float:
+        return max(self.opened_at + self.reset_seconds - time.monotonic(), 1.0)
+
+    def release_probe(self):
+        """Forget a half-open probe that was cancelled before it finished."""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self._probe_in_flight = False
+        if self.state != self.CLOSED:
+            logger.info("Circuit '%s' closed", self.name)
+        self.state = self.CLOSED
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning("Circuit '%s' opened after %d failures", self.name, self.failures)
+                incr(f"circuit.{self.name}.opened")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "consecutiveFailures": self.failures}
+
+
+class LatencyWindow:
+    """The last ``size`` latency samples (seconds), kept sorted for quantiles."""
+
+    def __init__(self, size: int = 200):
+        self.size = size
+        self._samples = deque()
+        self._sorted = []
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+        bisect.insort(self._sorted, seconds)
+        if len(self._samples) > self.size:
+            old = self._samples.popleft()
+            del self._sorted[bisect.bisect_left(self._sorted, old)]
+
+    def __len__(self):
+        return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._sorted:
+            return None
+        index = min(int(q * len(self._sorted)), len(self._sorted) - 1)
+        return self._sorted[index]
+
+
+async def hedged(
+    call: Callable[[], Awaitable],
+    delay: Optional[float],
+    slots: Optional[asyncio.Semaphore] = None
+):
+    """
+    Run ``call``; if it has not finished after ``delay`` seconds, start a
+    second one and return whichever completes first. ``delay=None`` disables
+    hedging.
+
+    With ``slots``, the second call needs a slot of its own, held until it
+    finishes; if none is free right away (or callers are waiting for one),
+    there is no second call. Calls still running when this returns, raises
+    or is cancelled are cancelled.
+    """
+    if delay is None:
+        return await call()
+
+    tasks = [asyncio.ensure_future(call())]
+    try:
+        first = tasks[0]
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        if slots is not None:
+            if slots.locked():
+                incr("hedge.skipped")
+                return await first
+            # Does not wait: the semaphore is not locked
+            await slots.acquire()
+
+        incr("hedge.fired")
+        second = asyncio.ensure_future(call())
+        tasks.append(second)
+        if slots is not None:
+            second.add_done_callback(lambda _: slots.release())
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        incr("hedge.won")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def call_with_retries(
+    call: Callable[[], Awaitable],
+    attempts: int,
+    base_delay: float,
+    max_delay: float,
+    budget: Optional[RetryBudget] = None,
+    breaker: Optional[CircuitBreaker] = None,
+    name: str = "call",
+    deadline: Optional[float] = None
+):
+    """
+    Call ``call`` up to ``attempts`` times, retrying transient errors with
+    exponential backoff and full jitter. No retry starts after ``deadline``
+    (a ``time.monotonic()`` value).
+
+    Raises:
+        CircuitOpenError: If ``breaker`` is open
+        Exception: The last error once retries are exhausted or not allowed
+    """
+    if budget is not None:
+        budget.deposit()
+
+    for attempt in range(attempts):
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            if breaker is not None:
+                breaker.release_probe()
+            raise
+        except Exception as e:
+            if breaker is not None:
+                # Client errors still prove the upstream is answering
+                if is_transient(e):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+            backoff = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            retry = (
+                is_transient(e)
+                and attempt + 1 < attempts
+                and (deadline is None or time.monotonic() + backoff < deadline)
+                and (budget is None or budget.try_spend())
+            )
+            if not retry:
+                raise
+            incr(f"retry.{name}")
+            await asyncio.sleep(backoff)
+            continue
+
+        if breaker is not None:
+            breaker.record_success()
+        return result
@@ -0,0 +1,173 @@
+"""
+Access token revocation.
+
+Revoked token ids (``jti``) live in ``revoked_tokens`` until the token
+would have expired anyway (TTL index on ``expiresAt``). Each process
+mirrors them into a Bloom filter, so the check on every request is a few
+hashes in memory; only filter positives are confirmed against Mongo.
+
+The filter is kept current by polling for entries newer than the last one
+seen (change streams would need a replica set); a revocation made by
+another process takes effect here within ``revocation_poll_seconds``. It
+is rebuilt from the live entries every ``revocation_rebuild_seconds`` or
+when full, which also drops expired ones. The first check in a process
+that has no filter yet loads it once for every waiting request, rather
+than each of them going to Mongo.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+from ..config import settings
+from ..database import get_database
+from ..utils.bloom import BloomFilter
+from ..utils.metrics import incr
+
+logger = logging.getLogger(__name__)
+
+# Entries committed slightly out of order are picked up by re-reading this
+# far behind the newest one seen
+_POLL_OVERLAP = timedelta(seconds=5)
+
+_filter: Optional[BloomFilter] = None
+_watermark: Optional[datetime] = None
+_rebuilt_at = 0.0
+# Ids already in the filter that the next poll's overlap may read again,
+# so re-reads do not count towards the filter's fill
+_recent: Dict[str, datetime] = {}
+_load_lock = asyncio.Lock()
+
+
+def _new_filter() -> BloomFilter:
+    return BloomFilter(settings.revocation_filter_capacity, settings.revocation_filter_error_rate)
+
+
+def _add(jti: str, revoked_at: datetime):
+    if jti in _recent:
+        return
+    _filter.add(jti)
+    _recent[jti] = revoked_at
+
+
+def _forget_before(cutoff: datetime):
+    for jti in [jti for jti, at in _recent.items() if at < cutoff]:
+        del _recent[jti]
+
+
+async def _ensure_filter():
+    if _filter is None:
+        async with _load_lock:
+            if _filter is None:
+                await refresh_revocations(full=True)
+
+
+async def revoke_token(jti: str, user_id: str, expires_at: datetime):
+    """Revoke one access token until ``expires_at``."""
+    db = get_database()
+    # revokedAt comes from the database's clock, the one every process's
+    # poll watermark is read from; a repeat revocation keeps the first one
+    entry = await db.revoked_tokens.find_one_and_update(
+        {"_id": jti},
+        [{"$set": {
+            "userId": {"$ifNull": ["$userId", user_id]},
+            "expiresAt": {"$ifNull": ["$expiresAt", expires_at]},
+            "revokedAt": {"$ifNull": ["$revokedAt", "$$NOW"]}
+        }}],
+        projection={"revokedAt": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    if _filter is not None:
+        _add(jti, entry["revokedAt"])
+    incr("revocation.revoked")
+
+
+async def is_revoked(jti: str) -> bool:
+    """True if the token was revoked; a database read only on a filter hit."""
+    await _ensure_filter()
+    if jti not in _filter:
+        return False
+
+    db = get_database()
+    revoked = await db.revoked_tokens.find_one({"_id": jti}, {"_id": 1}) is not None
+    incr("revocation.filter_positive")
+    if not revoked:
+        incr("revocation.false_positive")
+    return revoked
+
+
+async def refresh_revocations(full: bool = False):
+    """Add revocations made since the last refresh, or rebuild the filter."""
+    global _filter, _watermark, _rebuilt_at
+    db = get_database()
+
+    rebuild = (
+        full
+        or _filter is None
+        or _filter.count >= _filter.capacity
+        or time.monotonic() - _rebuilt_at >= settings.revocation_rebuild_seconds
+    )
+    if not rebuild:
+        query = {"revokedAt": {"$gte": _watermark - _POLL_OVERLAP}} if _watermark else {}
+        async for entry in db.revoked_tokens.find(query, {"revokedAt": 1}):
+            _add(entry["_id"], entry["revokedAt"])
+            _watermark = max(_watermark or entry["revokedAt"], entry["revokedAt"])
+        if _watermark:
+            _forget_before(_watermark - _POLL_OVERLAP)
+        return
+
+    target = _new_filter()
+    newest = None
+    recent = {}
+    async for entry in db.revoked_tokens.find({"expiresAt": {"$gt": datetime.utcnow()}}, {"revokedAt": 1}):
+        target.add(entry["_id"])
+        revoked_at = entry["revokedAt"]
+        newest = max(newest or revoked_at, revoked_at)
+        if revoked_at >= newest - _POLL_OVERLAP:
+            recent[entry["_id"]] = revoked_at
+    _filter = target
+    _recent.clear()
+    _recent.update(recent)
+    _rebuilt_at = time.monotonic()
+    # Like the poll, the watermark is the newest revokedAt read, so it is on
+    # the database's clock; anything revoked while the filter was loading
+    # is read by the next poll
+    _watermark = newest
+    if newest:
+        _forget_before(newest - _POLL_OVERLAP)
+
+
+async def run_revocation_poller(stop: asyncio.Event):
+    """Refresh the filter every ``revocation_poll_seconds`` until ``stop`` is set."""
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=settings.revocation_poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+        if stop.is_set():
+            break
+        try:
+            await refresh_revocations()
+        except Exception:
+            # Keep checking against the filter we have
+            logger.exception("Failed to refresh token revocations")
+
+
+def start_revocation_poller(stop: asyncio.Event) -> List[asyncio.Task]:
+    return [asyncio.create_task(run_revocation_poller(stop))]
+
+
+def get_revocation_stats() -> dict:
+    if _filter is None:
+        return {"loaded": False}
+    return {
+        "loaded": True,
+        "entries": _filter.count,
+        "capacity": _filter.capacity,
+        "expectedFalsePositiveRate": round(_filter.expected_error_rate(), 6),
+        "watermark": _watermark
+    }
@@ -0,0 +1,233 @@
+"""
+Background scan jobs.
+
+``POST /api/scans/jobs`` stores a ``scan_jobs`` document and returns right
+away; workers claim queued jobs with a lease via ``find_one_and_update`` so
+any number of API processes or ``python -m app.worker`` replicas can share
+the queue. While a job runs its worker renews the lease every third of
+``scan_job_lease_seconds``, so only a job whose worker stopped renewing
+(crashed) is picked up again, and the unique ``scans.jobId`` index keeps a
+retried job from producing a second scan. A job given back because the
+analyzer is full waits out ``notBefore`` in the queue.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from bson import Binary, ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from ..config import settings
+from ..database import get_database
+from .gemini import AnalyzerBusyError
+from .analysis_cache import analyze_face_cached
+from .image_processing import image_info
+from .scans import save_scan
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def make_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+async def enqueue_scan_job(user_id: str, image: dict, image_url: str = None) -> dict:
+    """Persist a new queued scan job for an already normalized image."""
+    db = get_database()
+    now = datetime.utcnow()
+
+    job = {
+        "userId": user_id,
+        "status": QUEUED,
+        "image": image_info(image),
+        "imageData": Binary(image["data"]),
+        "imageUrl": image_url,
+        "attempts": 0,
+        "leaseOwner": None,
+        "leaseExpiresAt": None,
+        "notBefore": None,
+        "scanId": None,
+        "error": None,
+        "createdAt": now,
+        "updatedAt": now
+    }
+
+    result = await db.scan_jobs.insert_one(job)
+    job["_id"] = result.inserted_id
+    return job
+
+
+async def get_scan_job(job_id: str, user_id: str) -> Optional[dict]:
+    """Fetch a job owned by the given user, without the image payload."""
+    db = get_database()
+    try:
+        return await db.scan_jobs.find_one(
+            {"_id": ObjectId(job_id), "userId": user_id},
+            {"imageData": 0}
+        )
+    except Exception:
+        return None
+
+
+async def claim_next_job(worker_id: str) -> Optional[dict]:
+    """Atomically lease the oldest queued (or abandoned) job."""
+    db = get_database()
+    now = datetime.utcnow()
+
+    return await db.scan_jobs.find_one_and_update(
+        {
+            "$or": [
+                {"status": QUEUED, "notBefore": {"$not": {"$gt": now}}},
+                {"status": RUNNING, "leaseExpiresAt": {"$lt": now}}
+            ]
+        },
+        {
+            "$set": {
+                "status": RUNNING,
+                "leaseOwner": worker_id,
+                "leaseExpiresAt": now + timedelta(seconds=settings.scan_job_lease_seconds),
+                "updatedAt": now
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("createdAt", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def _renew_lease(job: dict, worker_id: str):
+    """Extend the job's lease for as long as its worker is still on it."""
+    db = get_database()
+    interval = settings.scan_job_lease_seconds / 3
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            result = await db.scan_jobs.update_one(
+                {"_id": job["_id"], "leaseOwner": worker_id},
+                {"$set": {"leaseExpiresAt": datetime.utcnow() + timedelta(seconds=settings.scan_job_lease_seconds)}}
+            )
+        except Exception:
+            logger.warning("Scan worker %s failed to renew the lease on job %s", worker_id, job["_id"], exc_info=True)
+            continue
+        if not result.matched_count:
+            return
+
+
+async def _finish_job(job: dict, worker_id: str, update: dict):
+    """Settle a job as done or failed."""
+    db = get_database()
+    now = datetime.utcnow()
+    update.update({
+        "leaseOwner": None,
+        "leaseExpiresAt": None,
+        "finishedAt": now,
+        "updatedAt": now
+    })
+
+    # Only the current lease holder may finish the job; the image is no
+    # longer needed once the job is settled
+    await db.scan_jobs.update_one(
+        {"_id": job["_id"], "leaseOwner": worker_id},
+        {"$set": update, "$unset": {"imageData": ""}}
+    )
+
+
+async def process_job(job: dict, worker_id: str):
+    """Run the analysis for a claimed job and write the scan."""
+    db = get_database()
+    job_id = str(job["_id"])
+
+    if job["attempts"] > settings.scan_job_max_attempts:
+        await _finish_job(job, worker_id, {"status": FAILED, "error": "Too many attempts"})
+        return
+
+    user = await db.users.find_one({"_id": ObjectId(job["userId"])})
+    if user is None:
+        await _finish_job(job, worker_id, {"status": FAILED, "error": "User not found"})
+        return
+    user["_id"] = str(user["_id"])
+
+    try:
+        result = await analyze_face_cached(bytes(job["imageData"]), job["image"]["mimeType"])
+    except AnalyzerBusyError as e:
+        # Give the job back without burning an attempt; this worker moves on
+        # to other jobs while it waits
+        await db.scan_jobs.update_one(
+            {"_id": job["_id"], "leaseOwner": worker_id},
+            {
+                "$set": {
+                    "status": QUEUED,
+                    "leaseOwner": None,
+                    "leaseExpiresAt": None,
+                    "notBefore": datetime.utcnow() + timedelta(seconds=e.retry_after)
+                },
+                "$inc": {"attempts": -1}
+            }
+        )
+        return
+
+    try:
+        scan = await save_scan(
+            user,
+            result["analysis"],
+            job.get("imageUrl"),
+            job_id=job_id,
+            image=job["image"],
+            is_fallback=result.get("fallback", False),
+            model=result.get("model")
+        )
+        scan_id = str(scan["_id"])
+    except DuplicateKeyError:
+        # A previous lease holder already wrote the scan
+        existing = await db.scans.find_one({"jobId": job_id}, {"_id": 1})
+        scan_id = str(existing["_id"])
+
+    await _finish_job(job, worker_id, {
+        "status": DONE,
+        "scanId": scan_id,
+        "error": None if result["success"] else result.get("error")
+    })
+
+
+async def run_worker(worker_id: str, stop: asyncio.Event):
+    """Claim and process jobs until ``stop`` is set."""
+    while not stop.is_set():
+        try:
+            job = await claim_next_job(worker_id)
+        except Exception:
+            logger.exception("Scan worker %s failed to claim a job", worker_id)
+            job = None
+
+        if job is None:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=settings.scan_job_poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        heartbeat = asyncio.create_task(_renew_lease(job, worker_id))
+        try:
+            await process_job(job, worker_id)
+        except Exception:
+            # Leave the job leased; it is retried once the lease expires
+            logger.exception("Scan worker %s failed job %s", worker_id, job["_id"])
+        finally:
+            heartbeat.cancel()
+
+
+def start_workers(count: int, stop: asyncio.Event) -> List[asyncio.Task]:
+    """Spawn ``count`` worker coroutines on the running loop."""
+    return [
+        asyncio.create_task(run_worker(make_worker_id(), stop))
+        for _ in range(count)
+    ]
@@ -0,0 +1,147 @@
+"""
+Per-user score statistics, maintained as scans are saved.
+
+Each user has one ``user_scan_stats`` document (``_id`` is the user id)
+holding the scan count, first and latest overall score, the all-time and
+rolling averages, per-category min/max/EMA and a daily time series. Every
+saved scan folds into it with a single pipeline update, so the progress
+screen reads one small document however many scans the user has.
+
+Fallback analyses are not real scores and are left out. The stats can be
+recomputed from history with ``python -m app.tools.rebuild_scan_stats``.
+"""
+import logging
+import re
+from datetime import datetime
+
+from pymongo.errors import DuplicateKeyError
+
+from ..config import settings
+from ..database import get_database
+from ..models.scan import ScanStats
+
+logger = logging.getLogger(__name__)
+
+
+def category_key(name: str) -> str:
+    """Field-safe key for a category name ("Skin Quality" -> "skin_quality")."""
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_") or "unnamed"
+
+
+def series_day(at: datetime) -> str:
+    return at.strftime("%Y-%m-%d")
+
+
+def _missing(path: str) -> dict:
+    return {"$eq": [{"$ifNull": [path, None]}, None]}
+
+
+def _category_update(key: str, name: str, score: float) -> dict:
+    prefix = f"$categories.{key}"
+    alpha = settings.scan_stats_ema_alpha
+    return {
+        "name": {"$literal": name},
+        "count": {"$add": [{"$ifNull": [f"{prefix}.count", 0]}, 1]},
+        "min": {"$min": [{"$ifNull": [f"{prefix}.min", score]}, score]},
+        "max": {"$max": [{"$ifNull": [f"{prefix}.max", score]}, score]},
+        "ema": {"$cond": [
+            _missing(f"{prefix}.ema"),
+            score,
+            {"$add": [alpha * score, {"$multiply": [1 - alpha, f"{prefix}.ema"]}]}
+        ]},
+        "latest": score
+    }
+
+
+def _series_update(day: str, score: float) -> dict:
+    """Append today's point or fold the score into it, keeping the newest N days."""
+    size = {"$size": "$$series"}
+    without_last = {"$cond": [{"$gt": [size, 1]}, {"$slice": ["$$series", {"$subtract": [size, 1]}]}, []]}
+    folded = {
+        "day": day,
+        "count": {"$add": ["$$last.count", 1]},
+        "average": {"$divide": [
+            {"$add": [{"$multiply": ["$$last.average", "$$last.count"]}, score]},
+            {"$add": ["$$last.count", 1]}
+        ]}
+    }
+    return {"$let": {
+        "vars": {"series": {"$ifNull": ["$series", []]}},
+        "in": {"$let": {
+            "vars": {"last": {"$arrayElemAt": ["$$series", -1]}},
+            "in": {"$slice": [
+                {"$cond": [
+                    {"$eq": ["$$last.day", day]},
+                    {"$concatArrays": [without_last, [folded]]},
+                    {"$concatArrays": ["$$series", [{"day": day, "count": 1, "average": score}]]}
+                ]},
+                -settings.scan_stats_series_points
+            ]}
+        }}
+    }}
+
+
+def stats_update_pipeline(scan: dict) -> list:
+    """The update that folds one saved scan into its user's stats document."""
+    analysis = scan["analysis"]
+    score = float(analysis["overallScore"])
+    at = scan["createdAt"]
+    point = {"score": score, "at": at, "scanId": {"$literal": str(scan["_id"])}}
+
+    fields = {
+        "count": {"$add": [{"$ifNull": ["$count", 0]}, 1]},
+        "sum": {"$add": [{"$ifNull": ["$sum", 0]}, score]},
+        "first": {"$cond": [{"$or": [_missing("$first"), {"$lt": [at, "$first.at"]}]}, point, "$first"]},
+        "latest": {"$cond": [{"$or": [_missing("$latest"), {"$gte": [at, "$latest.at"]}]}, point, "$latest"]},
+        "recent": {"$slice": [
+            {"$concatArrays": [{"$ifNull": ["$recent", []]}, [score]]},
+            -settings.scan_stats_recent_window
+        ]},
+        "series": _series_update(series_day(at), score),
+        "updatedAt": datetime.utcnow()
+    }
+    for category in analysis.get("categories") or []:
+        key = category_key(category["name"])
+        fields[f"categories.{key}"] = _category_update(key, category["name"], float(category["score"]))
+
+    return [
+        {"$set": fields},
+        {"$set": {
+            "average": {"$divide": ["$sum", "$count"]},
+            "rollingAverage": {"$avg": "$recent"}
+        }}
+    ]
+
+
+async def record_scan_stats(scan: dict):
+    """Fold a newly saved scan into its user's stats (fallbacks are skipped)."""
+    if scan.get("isFallback") or not scan.get("analysis"):
+        return
+    db = get_database()
+    pipeline = stats_update_pipeline(scan)
+    try:
+        await db.user_scan_stats.update_one({"_id": scan["userId"]}, pipeline, upsert=True)
+    except DuplicateKeyError:
+        # Two first scans raced to insert the document; it exists now
+        await db.user_scan_stats.update_one({"_id": scan["userId"]}, pipeline, upsert=True)
+
+
+async def get_scan_stats(user_id: str, full_access: bool = False) -> ScanStats:
+    """The user's stats; without ``full_access`` scores are locked, only counts show."""
+    db = get_database()
+    projection = None if full_access else {"count": 1, "updatedAt": 1}
+    stats = await db.user_scan_stats.find_one({"_id": user_id}, projection)
+    if stats is None:
+        return ScanStats(isBlurred=not full_access)
+
+    return ScanStats(
+        count=stats["count"],
+        first=stats.get("first"),
+        latest=stats.get("latest"),
+        average=stats.get("average"),
+        rollingAverage=stats.get("rollingAverage"),
+        categories=stats.get("categories") or {},
+        series=stats.get("series") or [],
+        isBlurred=not full_access,
+        updatedAt=stats.get("updatedAt")
+    )
@@ -0,0 +1,178 @@
+from ..database import get_database
+from ..models.scan import ScanResponse
+from ..utils.pagination import decode_cursor, encode_cursor
+from ..utils.auth import invalidate_principal
+from .entitlements import redact_analysis, scan_projection
+from .gemini import PROMPT_VERSION
+from .scan_stats import record_scan_stats
+from bson import ObjectId
+from datetime import datetime
+from typing import List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Newest first; _id breaks ties between scans created in the same millisecond
+SCAN_HISTORY_SORT = [("createdAt", -1), ("_id", -1)]
+
+SUMMARY_PROJECTION = {
+    "createdAt": 1,
+    "analysis.overallScore": 1,
+    "analysis.categories.name": 1,
+    "analysis.categories.score": 1,
+    "isFallback": 1
+}
+
+# Scores are locked for free users, so their summaries need no analysis
+LOCKED_SUMMARY_PROJECTION = {
+    "createdAt": 1,
+    "isFallback": 1
+}
+
+
+async def save_scan(
+    user: dict,
+    analysis: dict,
+    image_url: str = None,
+    job_id: str = None,
+    image: dict = None,
+    is_fallback: bool = False,
+    model: str = None
+) -> dict:
+    """
+    Persist a finished scan and mark the user's first scan as done.
+
+    Args:
+        user: The user document (``_id`` as a string)
+        analysis: Analysis dict as returned by the analyzer
+        image_url: Optional client-supplied image URL
+        job_id: Scan job that produced this scan, if any
+        image: Normalization stats of the analysed image
+        is_fallback: The analysis is the generic default, not a model result
+        model: Gemini model that produced the analysis
+
+    Returns:
+        dict: The inserted scan document
+    """
+    db = get_database()
+    user_id = user["_id"]
+
+    scan_doc = {
+        "userId": user_id,
+        "imageUrl": image_url,
+        "analysis": analysis,
+        "promptVersion": PROMPT_VERSION,
+        "isFallback": is_fallback,
+        "model": model,
+        "createdAt": datetime.utcnow()
+    }
+    if job_id:
+        scan_doc["jobId"] = job_id
+    if image:
+        scan_doc["image"] = image
+
+    result = await db.scans.insert_one(scan_doc)
+    scan_doc["_id"] = result.inserted_id
+
+    # Stats can be rebuilt from history, so a failure here must not fail the scan
+    try:
+        await record_scan_stats(scan_doc)
+    except Exception:
+        logger.exception("Failed to update scan stats for scan %s", scan_doc["_id"])
+
+    # Update user's hasCompletedFirstScan flag
+    await db.users.update_one(
+        {"_id": ObjectId(user_id)},
+        {
+            "$set": {
+                "hasCompletedFirstScan": True,
+                "updatedAt": datetime.utcnow()
+            }
+        }
+    )
+    invalidate_principal(user_id)
+
+    return scan_doc
+
+
+def scan_image_path(scan: dict) -> Optional[str]:
+    """API path of the stored scan image, if one was kept."""
+    if (scan.get("image") or {}).get("sha256"):
+        return f"/api/scans/{scan['_id']}/image"
+    return None
+
+
+def scan_view(scan: dict, full_access: bool = False) -> dict:
+    """The fields of a scan's API response, redacted for free users."""
+    analysis = scan.get("analysis")
+    return {
+        "id": str(scan["_id"]),
+        "userId": scan["userId"],
+        "imageUrl": scan.get("imageUrl"),
+        "imagePath": scan_image_path(scan),
+        "analysis": analysis if full_access else redact_analysis(analysis),
+        "isFallback": scan.get("isFallback", False),
+        "model": scan.get("model"),
+        "isBlurred": not full_access,
+        "createdAt": scan.get("createdAt")
+    }
+
+
+def scan_summary_view(scan: dict, full_access: bool = False) -> dict:
+    """The fields of the summary view of a (possibly projected) scan document."""
+    analysis = (scan.get("analysis") or {}) if full_access else {}
+    return {
+        "id": str(scan["_id"]),
+        "overallScore": analysis.get("overallScore"),
+        "categories": analysis.get("categories") or [],
+        "isFallback": scan.get("isFallback", False),
+        "isBlurred": not full_access,
+        "createdAt": scan.get("createdAt")
+    }
+
+
+def scan_to_response(scan: dict, full_access: bool = False) -> ScanResponse:
+    """Build the API response for a scan document, redacted for free users."""
+    return ScanResponse(**scan_view(scan, full_access))
+
+
+async def list_scans(
+    user_id: str,
+    limit: int,
+    cursor: str = None,
+    summary: bool = False,
+    full_access: bool = False
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of a user's scans, newest first.
+
+    Reads a single range of the ``(userId, createdAt, _id)`` index starting
+    after ``cursor``. Without ``full_access`` the locked parts of each
+    analysis are not loaded.
+
+    Returns:
+        tuple: (scan documents, cursor for the next page or None)
+
+    Raises:
+        ValueError: If ``cursor`` is malformed
+    """
+    db = get_database()
+    query = {"userId": user_id}
+    if cursor:
+        created_at, scan_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"createdAt": {"$lt": created_at}},
+            {"createdAt": created_at, "_id": {"$lt": scan_id}}
+        ]
+
+    if summary:
+        projection = SUMMARY_PROJECTION if full_access else LOCKED_SUMMARY_PROJECTION
+    else:
+        projection = scan_projection(full_access)
+    scans = await db.scans.find(query, projection).sort(SCAN_HISTORY_SORT).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(scans) > limit:
+        scans = scans[:limit]
+        next_cursor = encode_cursor(scans[-1]["createdAt"], scans[-1]["_id"])
+    return scans, next_cursor
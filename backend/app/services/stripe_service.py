@@ -1,6 +1,7 @@
 import stripe
 from ..config import settings
 from ..database import get_database
+from ..utils.auth import invalidate_principal
 from datetime import datetime, timedelta
 from bson import ObjectId
 
@@ -71,6 +72,7 @@ async def handle_successful_payment(user_id: str, subscription_id: str = None):
     # Calculate expiration (1 month from now for subscription)
     expires_at = datetime.utcnow() + timedelta(days=30)
     
+    # Scans are unlocked at read time from this, see services/entitlements.py
     await db.users.update_one(
         {"_id": ObjectId(user_id)},
         {
@@ -82,12 +84,7 @@ async def handle_successful_payment(user_id: str, subscription_id: str = None):
             }
         }
     )
-    
-    # Unblur all scans for this user
-    await db.scans.update_many(
-        {"userId": user_id},
-        {"$set": {"isBlurred": False}}
-    )
+    invalidate_principal(user_id)
 
 
 async def handle_webhook_event(payload: bytes, sig_header: str) -> dict:
@@ -122,15 +119,18 @@ async def handle_webhook_event(payload: bytes, sig_header: str) -> dict:
         customer_id = subscription.customer
         
         db = get_database()
-        await db.users.update_one(
+        user = await db.users.find_one_and_update(
             {"subscription.stripeCustomerId": customer_id},
             {
                 "$set": {
                     "subscription.status": "cancelled",
                     "updatedAt": datetime.utcnow()
                 }
-            }
+            },
+            projection={"_id": 1}
         )
+        if user:
+            invalidate_principal(user["_id"])
     
     return {"status": "success", "event_type": event.type}
 
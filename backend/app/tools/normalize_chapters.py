@@ -0,0 +1,140 @@
+"""
+Move embedded chapters into the ``chapters`` collection.
+
+Each course with chapters under ``modules[].chapters`` gets them written to
+``chapters`` with ``bulk_write`` (upserts by chapter id, so a re-run after
+an interruption is safe), then its modules are emptied down to headers and
+the totals recomputed, provided the course has not been edited meanwhile
+(otherwise it is read and moved again). Readers assemble both layouts, so
+the API keeps serving while this runs; set
+``COURSE_CHAPTER_STORAGE=collection`` once it has finished so new edits go
+to the collection too.
+
+Examples:
+    python -m app.tools.normalize_chapters --dry-run
+    python -m app.tools.normalize_chapters --course <id>
+"""
+import argparse
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+from ..database import connect_to_mongo, close_mongo_connection, get_database
+from ..services.catalog import bump_catalog_version
+from ..services.courses import TOUCH, chapter_document
+
+BATCH_SIZE = 500
+MAX_ATTEMPTS = 5
+
+
+def _chapter_ops(course: dict) -> Tuple[List[ReplaceOne], List[str], int]:
+    """Upserts of a course's embedded chapters, their ids and total duration."""
+    base = course.get("createdAt") or datetime.utcnow()
+    ops, ids = [], []
+    duration = 0
+    for module in course.get("modules") or []:
+        for chapter in module.get("chapters") or []:
+            chapter = {**chapter, "_id": chapter.get("_id") or str(uuid.uuid4())}
+            # Keeps the embedded order among chapters with equal ``order``
+            # (BSON dates have millisecond precision)
+            created_at = base + timedelta(milliseconds=len(ops))
+            ops.append(ReplaceOne(
+                {"_id": chapter["_id"]},
+                chapter_document(course["_id"], module["_id"], chapter, created_at),
+                upsert=True
+            ))
+            ids.append(chapter["_id"])
+            duration += chapter.get("duration") or 0
+    return ops, ids, duration
+
+
+async def normalize_course(course: dict, dry_run: bool = False) -> int:
+    """
+    Move one course's embedded chapters; returns how many were moved.
+
+    The modules are only emptied if the course is unchanged since it was
+    read (same ``updatedAt``); after a concurrent edit it is read and moved
+    again, and chapters it no longer has are deleted from ``chapters``.
+    """
+    db = get_database()
+    written = set()
+
+    for _ in range(MAX_ATTEMPTS):
+        ops, ids, duration = _chapter_ops(course)
+        if dry_run:
+            return len(ops)
+
+        stale = written - set(ids)
+        if stale:
+            await db.chapters.delete_many({"_id": {"$in": list(stale)}})
+        if not ops:
+            return 0
+
+        for start in range(0, len(ops), BATCH_SIZE):
+            await db.chapters.bulk_write(ops[start:start + BATCH_SIZE], ordered=True)
+        written.update(ids)
+
+        result = await db.courses.update_one(
+            {"_id": course["_id"], "updatedAt": course.get("updatedAt")},
+            {
+                "$set": {
+                    "modules.$[].chapters": [],
+                    "chapterStorage": "collection",
+                    "totalChapters": len(ops),
+                    "totalDuration": duration
+                },
+                "$currentDate": TOUCH
+            }
+        )
+        if result.matched_count:
+            return len(ops)
+
+        course = await db.courses.find_one({"_id": course["_id"]})
+        if course is None:
+            await db.chapters.delete_many({"_id": {"$in": list(written)}})
+            return 0
+
+    raise RuntimeError(f"Course {course['_id']} kept changing; run the tool again for it")
+
+
+async def normalize(course_id: str = None, dry_run: bool = False) -> dict:
+    db = get_database()
+    query = {"modules.chapters.0": {"$exists": True}}
+    if course_id:
+        query["_id"] = ObjectId(course_id)
+
+    courses = chapters = 0
+    async for course in db.courses.find(query):
+        moved = await normalize_course(course, dry_run)
+        courses += 1
+        chapters += moved
+        print(f"{course['_id']}: {moved} chapters")
+
+    if courses and not dry_run:
+        await bump_catalog_version()
+    return {"courses": courses, "chapters": chapters}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Move embedded course chapters into the chapters collection.")
+    parser.add_argument("--course", help="only move this course id")
+    parser.add_argument("--dry-run", action="store_true", help="count but do not write")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    await connect_to_mongo()
+    try:
+        result = await normalize(args.course, args.dry_run)
+        print(f"Moved {result['chapters']} chapters from {result['courses']} courses")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
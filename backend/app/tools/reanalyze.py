@@ -0,0 +1,317 @@
+"""
+Bulk re-analysis of stored scans.
+
+Refreshes ``analysis`` on existing scans after a prompt or model change.
+Scans are streamed from a cursor in ``_id`` order and fanned out to
+``--concurrency`` workers behind a token-bucket rate limiter; results are
+written back with ``bulk_write`` in batches. After every batch the run's
+checkpoint (the highest ``_id`` below which every scan is settled) is saved
+in ``reanalyze_runs``, so re-running the same command resumes where a
+killed run stopped. Dry runs read an existing checkpoint but never write
+one, so they cannot mark the real run finished.
+
+Re-analysis changes scores that ``user_scan_stats`` has already folded in,
+and that fold cannot be undone incrementally; instead the stats of every
+user touched by a batch are recomputed from history once the batch is
+written.
+
+``--fake`` swaps Gemini for a random analyzer, for load testing. It implies
+``--dry-run``, since its results would overwrite real analyses; pass
+``--fake-write`` as well to write them anyway (scratch databases only).
+
+Examples:
+    python -m app.tools.reanalyze --stale --rate 5 --concurrency 8
+    python -m app.tools.reanalyze --user <id> --since 2024-01-01
+    python -m app.tools.reanalyze --fake --fake-latency 0.5 --rate 200 --concurrency 64
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import deque
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from ..database import connect_to_mongo, close_mongo_connection, get_database
+from ..services.blob_store import load_scan_image
+from ..services.gemini import (
+    analyze_face, get_default_analysis, AnalyzerBusyError, PROMPT_VERSION
+)
+from .rebuild_scan_stats import rebuild as rebuild_scan_stats
+from ..utils.rate_limit import TokenBucket
+
+
+def build_filter(args) -> dict:
+    """Mongo filter for the scans selected on the command line."""
+    query = {"image.sha256": {"$exists": True}}
+
+    created = {}
+    if args.since:
+        created["$gte"] = datetime.fromisoformat(args.since)
+    if args.until:
+        created["$lt"] = datetime.fromisoformat(args.until)
+    if created:
+        query["createdAt"] = created
+
+    if args.user:
+        query["userId"] = args.user
+    if args.fallbacks:
+        query["isFallback"] = True
+    if args.prompt_version:
+        query["promptVersion"] = args.prompt_version
+    elif args.stale:
+        query["promptVersion"] = {"$ne": PROMPT_VERSION}
+
+    return query
+
+
+def default_run_id(query: dict, fake: bool) -> str:
+    """Same filter, same run: lets a re-run pick up the old checkpoint."""
+    key = json.dumps({"q": query, "v": PROMPT_VERSION, "fake": fake}, default=str, sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+async def fake_analyze(image: bytes, mime_type: str = "image/jpeg", latency: float = 0.2) -> dict:
+    """Stand-in analyzer with model-like latency for throughput testing."""
+    await asyncio.sleep(random.uniform(0.5, 1.5) * latency)
+    analysis = get_default_analysis()
+    for category in analysis["categories"]:
+        category["score"] = round(random.uniform(4, 9), 1)
+    analysis["overallScore"] = round(
+        sum(c["score"] for c in analysis["categories"]) / len(analysis["categories"]), 1
+    )
+    return {"success": True, "analysis": analysis, "model": "fake"}
+
+
+class _Watermark:
+    """Tracks the highest dispatched ``_id`` below which everything is written."""
+
+    def __init__(self):
+        self._order = deque()
+        self._settled = set()
+        self.value = None
+
+    def dispatched(self, scan_id):
+        self._order.append(scan_id)
+
+    def settle(self, scan_ids):
+        self._settled.update(scan_ids)
+        while self._order and self._order[0] in self._settled:
+            self.value = self._order.popleft()
+            self._settled.discard(self.value)
+
+
+class Reanalyzer:
+    def __init__(self, args, analyzer):
+        self.args = args
+        self.analyzer = analyzer
+        self.bucket = TokenBucket(args.rate, burst=args.concurrency)
+        self.queue = asyncio.Queue(maxsize=args.concurrency * 2)
+        self.watermark = _Watermark()
+        self.ops = []
+        self.op_ids = []
+        self.op_users = set()
+        self.flush_lock = asyncio.Lock()
+        self.stats = {"processed": 0, "updated": 0, "failed": 0, "missingImage": 0}
+        self.started = time.monotonic()
+        self.resumed_from = 0
+
+    async def _load_checkpoint(self, query: dict) -> dict:
+        db = get_database()
+        run = await db.reanalyze_runs.find_one({"_id": self.args.run_id})
+        if run is None:
+            run = {
+                "_id": self.args.run_id,
+                "filter": json.dumps(query, default=str),
+                "promptVersion": PROMPT_VERSION,
+                "lastId": None,
+                "stats": dict(self.stats),
+                "startedAt": datetime.utcnow(),
+                "updatedAt": datetime.utcnow(),
+                "finishedAt": None
+            }
+            if not self.args.dry_run:
+                await db.reanalyze_runs.insert_one(run)
+        return run
+
+    async def _save_checkpoint(self, finished: bool = False):
+        if self.args.dry_run:
+            return
+        db = get_database()
+        update = {
+            "lastId": self.watermark.value,
+            "stats": self.stats,
+            "updatedAt": datetime.utcnow()
+        }
+        if finished:
+            update["finishedAt"] = datetime.utcnow()
+        await db.reanalyze_runs.update_one({"_id": self.args.run_id}, {"$set": update})
+
+    async def _flush(self):
+        async with self.flush_lock:
+            if not self.op_ids:
+                return
+            ops, ids, users = self.ops, self.op_ids, self.op_users
+            self.ops, self.op_ids, self.op_users = [], [], set()
+
+            if ops and not self.args.dry_run:
+                db = get_database()
+                await db.scans.bulk_write(ops, ordered=False)
+                for user_id in users:
+                    await rebuild_scan_stats(user_id)
+
+            self.watermark.settle(ids)
+            await self._save_checkpoint()
+
+            elapsed = time.monotonic() - self.started
+            print(
+                f"processed={self.stats['processed']} updated={self.stats['updated']} "
+                f"failed={self.stats['failed']} missing={self.stats['missingImage']} "
+                f"rate={(self.stats['processed'] - self.resumed_from) / elapsed:.1f}/s checkpoint={self.watermark.value}"
+            )
+
+    async def _record(self, scan_id, op=None, user_id=None):
+        self.op_ids.append(scan_id)
+        if op is not None:
+            self.ops.append(op)
+        if user_id is not None:
+            self.op_users.add(user_id)
+        if len(self.op_ids) >= self.args.batch_size:
+            await self._flush()
+
+    async def _analyze(self, image: bytes) -> dict:
+        while True:
+            await self.bucket.acquire()
+            try:
+                return await self.analyzer(image, "image/jpeg")
+            except AnalyzerBusyError as e:
+                await asyncio.sleep(e.retry_after)
+
+    async def _process(self, scan: dict):
+        try:
+            image = await load_scan_image(scan["image"]["sha256"])
+            result = None if image is None else await self._analyze(image)
+        except Exception as e:
+            # One bad scan must not take its worker down: with every worker
+            # gone the producer would block on the queue forever
+            print(f"Failed to re-analyse scan {scan['_id']}: {e}")
+            image, result = b"", {"success": False}
+
+        if image is None:
+            self.stats["missingImage"] += 1
+            await self._record(scan["_id"])
+            return
+
+        self.stats["processed"] += 1
+        if not result["success"]:
+            # Keep the old analysis rather than overwrite it with a fallback
+            self.stats["failed"] += 1
+            await self._record(scan["_id"])
+            return
+
+        self.stats["updated"] += 1
+        await self._record(scan["_id"], UpdateOne(
+            {"_id": scan["_id"]},
+            {"$set": {
+                "analysis": result["analysis"],
+                "promptVersion": PROMPT_VERSION,
+                "isFallback": False,
+                "model": result.get("model"),
+                "reanalyzedAt": datetime.utcnow()
+            }}
+        ), scan.get("userId"))
+
+    async def _worker(self):
+        while True:
+            scan = await self.queue.get()
+            if scan is None:
+                return
+            await self._process(scan)
+
+    async def run(self):
+        db = get_database()
+        query = build_filter(self.args)
+        run = await self._load_checkpoint(query)
+        if run.get("finishedAt"):
+            print(f"Run {self.args.run_id} already finished; use --run-id to start a new one")
+            return
+        self.stats.update(run.get("stats") or {})
+        self.resumed_from = self.stats["processed"]
+        self.watermark.value = run.get("lastId")
+
+        if self.watermark.value is not None:
+            print(f"Resuming run {self.args.run_id} after {self.watermark.value}")
+            query = {**query, "_id": {"$gt": self.watermark.value}}
+        else:
+            print(f"Starting run {self.args.run_id}")
+
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.args.concurrency)]
+
+        cursor = db.scans.find(query, {"image.sha256": 1, "userId": 1}).sort("_id", 1).batch_size(self.args.batch_size)
+        if self.args.limit:
+            cursor = cursor.limit(self.args.limit)
+        dispatched = 0
+        async for scan in cursor:
+            self.watermark.dispatched(scan["_id"])
+            await self.queue.put(scan)
+            dispatched += 1
+
+        for _ in workers:
+            await self.queue.put(None)
+        await asyncio.gather(*workers)
+        await self._flush()
+
+        # A run cut short by --limit stays open so the next invocation resumes
+        finished = not self.args.limit or dispatched < self.args.limit
+        await self._save_checkpoint(finished=finished)
+        print(f"{'Done' if finished else 'Paused'}: {self.stats}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Re-run face analysis on stored scans.")
+    parser.add_argument("--since", help="only scans created at or after this ISO date")
+    parser.add_argument("--until", help="only scans created before this ISO date")
+    parser.add_argument("--user", help="only scans of this user id")
+    parser.add_argument("--prompt-version", help="only scans analysed with this prompt version")
+    parser.add_argument("--stale", action="store_true", help="only scans not on the current prompt version")
+    parser.add_argument("--fallbacks", action="store_true", help="only scans stored with a fallback analysis")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent analyzer calls")
+    parser.add_argument("--rate", type=float, default=2.0, help="analyzer calls per second")
+    parser.add_argument("--batch-size", type=int, default=50, help="scans per bulk write/checkpoint")
+    parser.add_argument("--limit", type=int, default=0, help="stop after this many scans")
+    parser.add_argument("--run-id", help="checkpoint name (default: derived from the filter)")
+    parser.add_argument("--dry-run", action="store_true", help="analyze but do not write results")
+    parser.add_argument("--fake", action="store_true", help="use a fake analyzer instead of Gemini")
+    parser.add_argument("--fake-latency", type=float, default=0.2, help="mean fake analyzer latency (s)")
+    parser.add_argument("--fake-write", action="store_true", help="write fake results (scratch databases only)")
+    args = parser.parse_args(argv)
+
+    if args.fake_write and not args.fake:
+        parser.error("--fake-write needs --fake")
+    if args.fake and not args.fake_write:
+        args.dry_run = True
+
+    if args.run_id is None:
+        args.run_id = default_run_id(build_filter(args), args.fake)
+    return args
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    if args.fake:
+        analyzer = lambda image, mime_type: fake_analyze(image, mime_type, args.fake_latency)
+    else:
+        analyzer = analyze_face
+
+    await connect_to_mongo()
+    try:
+        await Reanalyzer(args, analyzer).run()
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,197 @@
+"""
+Recompute ``user_scan_stats`` from scan history.
+
+Use after a bulk re-analysis, a change to the stats settings, or to
+backfill users who scanned before the stats existed. Overall, per-category
+and daily figures are each computed by an aggregation pipeline over
+``scans``; the results are assembled per user and written with
+``bulk_write``. Users whose scans are all fallbacks lose their stats
+document.
+
+Examples:
+    python -m app.tools.rebuild_scan_stats
+    python -m app.tools.rebuild_scan_stats --user <id>
+"""
+import argparse
+import asyncio
+from datetime import datetime
+
+from pymongo import DeleteOne, ReplaceOne
+
+from ..config import settings
+from ..database import connect_to_mongo, close_mongo_connection, get_database
+from ..services.scan_stats import category_key
+
+HISTORY_ORDER = {"$sort": {"userId": 1, "createdAt": 1, "_id": 1}}
+
+
+def _match(user_id: str = None) -> dict:
+    query = {"isFallback": {"$ne": True}, "analysis.overallScore": {"$type": "number"}}
+    if user_id:
+        query["userId"] = user_id
+    return {"$match": query}
+
+
+def _point(score_path: str) -> dict:
+    return {"score": score_path, "at": "$createdAt", "scanId": {"$toString": "$_id"}}
+
+
+def overall_pipeline(user_id: str = None) -> list:
+    return [
+        _match(user_id),
+        HISTORY_ORDER,
+        {"$group": {
+            "_id": "$userId",
+            "count": {"$sum": 1},
+            "sum": {"$sum": "$analysis.overallScore"},
+            "first": {"$first": _point("$analysis.overallScore")},
+            "latest": {"$last": _point("$analysis.overallScore")},
+            "scores": {"$push": "$analysis.overallScore"}
+        }},
+        {"$project": {
+            "count": 1,
+            "sum": 1,
+            "first": 1,
+            "latest": 1,
+            "recent": {"$slice": ["$scores", -settings.scan_stats_recent_window]}
+        }}
+    ]
+
+
+def category_pipeline(user_id: str = None) -> list:
+    alpha = settings.scan_stats_ema_alpha
+    score = "$analysis.categories.score"
+    return [
+        _match(user_id),
+        HISTORY_ORDER,
+        {"$unwind": "$analysis.categories"},
+        {"$group": {
+            "_id": {"userId": "$userId", "name": "$analysis.categories.name"},
+            "count": {"$sum": 1},
+            "min": {"$min": score},
+            "max": {"$max": score},
+            "latest": {"$last": score},
+            "scores": {"$push": score}
+        }},
+        {"$project": {
+            "count": 1,
+            "min": 1,
+            "max": 1,
+            "latest": 1,
+            # Same recurrence as the incremental update, oldest scan first
+            "ema": {"$reduce": {
+                "input": "$scores",
+                "initialValue": None,
+                "in": {"$cond": [
+                    {"$eq": ["$$value", None]},
+                    "$$this",
+                    {"$add": [{"$multiply": [alpha, "$$this"]}, {"$multiply": [1 - alpha, "$$value"]}]}
+                ]}
+            }}
+        }}
+    ]
+
+
+def series_pipeline(user_id: str = None) -> list:
+    return [
+        _match(user_id),
+        {"$group": {
+            "_id": {
+                "userId": "$userId",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$createdAt"}}
+            },
+            "average": {"$avg": "$analysis.overallScore"},
+            "count": {"$sum": 1}
+        }},
+        {"$sort": {"_id.userId": 1, "_id.day": 1}},
+        {"$group": {
+            "_id": "$_id.userId",
+            "series": {"$push": {"day": "$_id.day", "average": "$average", "count": "$count"}}
+        }},
+        {"$project": {"series": {"$slice": ["$series", -settings.scan_stats_series_points]}}}
+    ]
+
+
+def _merge_category(existing: dict, row: dict) -> dict:
+    """Two names that map to the same key: keep the busier one's EMA/latest."""
+    base = dict(existing if existing["count"] >= row["count"] else row)
+    base["count"] = existing["count"] + row["count"]
+    base["min"] = min(existing["min"], row["min"])
+    base["max"] = max(existing["max"], row["max"])
+    return base
+
+
+async def rebuild(user_id: str = None, dry_run: bool = False) -> dict:
+    db = get_database()
+    now = datetime.utcnow()
+
+    docs = {}
+    async for row in db.scans.aggregate(overall_pipeline(user_id), allowDiskUse=True):
+        docs[row["_id"]] = {
+            "_id": row["_id"],
+            "count": row["count"],
+            "sum": row["sum"],
+            "first": row["first"],
+            "latest": row["latest"],
+            "recent": row["recent"],
+            "average": row["sum"] / row["count"],
+            "rollingAverage": sum(row["recent"]) / len(row["recent"]),
+            "categories": {},
+            "series": [],
+            "updatedAt": now
+        }
+
+    async for row in db.scans.aggregate(category_pipeline(user_id), allowDiskUse=True):
+        doc = docs.get(row["_id"]["userId"])
+        if doc is None or row["_id"].get("name") is None:
+            continue
+        name = row["_id"]["name"]
+        category = {
+            "name": name,
+            "count": row["count"],
+            "min": row["min"],
+            "max": row["max"],
+            "ema": row["ema"],
+            "latest": row["latest"]
+        }
+        key = category_key(name)
+        if key in doc["categories"]:
+            category = _merge_category(doc["categories"][key], category)
+        doc["categories"][key] = category
+
+    async for row in db.scans.aggregate(series_pipeline(user_id), allowDiskUse=True):
+        if row["_id"] in docs:
+            docs[row["_id"]]["series"] = row["series"]
+
+    ops = [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs.values()]
+    stale = {"_id": {"$nin": list(docs)}}
+    if user_id:
+        stale["_id"]["$eq"] = user_id
+    ops += [DeleteOne({"_id": doc["_id"]}) async for doc in db.user_scan_stats.find(stale, {"_id": 1})]
+
+    if ops and not dry_run:
+        for start in range(0, len(ops), 500):
+            await db.user_scan_stats.bulk_write(ops[start:start + 500], ordered=False)
+
+    return {"users": len(docs), "removed": len(ops) - len(docs)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute per-user scan stats from history.")
+    parser.add_argument("--user", help="only rebuild this user id")
+    parser.add_argument("--dry-run", action="store_true", help="compute but do not write")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    await connect_to_mongo()
+    try:
+        result = await rebuild(args.user, args.dry_run)
+        print(f"Rebuilt stats for {result['users']} users, removed {result['removed']}")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
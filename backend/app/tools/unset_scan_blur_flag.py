@@ -0,0 +1,64 @@
+"""
+Remove the stored ``isBlurred`` flag from scans.
+
+Whether a scan is locked is now derived from the user's subscription when
+the scan is read (see ``services/entitlements.py``), so the per-scan flag
+is dead weight and, for cancelled subscriptions, wrong. Scans are updated
+in ``_id`` batches so no single write touches the whole collection.
+
+Example:
+    python -m app.tools.unset_scan_blur_flag --batch-size 1000
+"""
+import argparse
+import asyncio
+
+from ..database import connect_to_mongo, close_mongo_connection, get_database
+
+
+async def unset_blur_flag(batch_size: int = 1000, dry_run: bool = False) -> int:
+    db = get_database()
+    query = {"isBlurred": {"$exists": True}}
+    if dry_run:
+        return await db.scans.count_documents(query)
+
+    updated = 0
+    last_id = None
+    while True:
+        batch_query = dict(query)
+        if last_id is not None:
+            batch_query["_id"] = {"$gt": last_id}
+        ids = [
+            scan["_id"]
+            async for scan in db.scans.find(batch_query, {"_id": 1}).sort("_id", 1).limit(batch_size)
+        ]
+        if not ids:
+            return updated
+
+        result = await db.scans.update_many(
+            {"_id": {"$in": ids}},
+            {"$unset": {"isBlurred": ""}}
+        )
+        updated += result.modified_count
+        last_id = ids[-1]
+        print(f"updated={updated} last={last_id}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Unset the legacy isBlurred flag on scans.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="scans per update")
+    parser.add_argument("--dry-run", action="store_true", help="only count the scans to update")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    await connect_to_mongo()
+    try:
+        count = await unset_blur_flag(args.batch_size, args.dry_run)
+        print(f"{'Would update' if args.dry_run else 'Updated'} {count} scans")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
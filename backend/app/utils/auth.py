@@ -1,5 +1,7 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -7,11 +9,52 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from ..config import settings
 from ..database import get_database
 from ..models.user import TokenData, UserResponse
+from ..services.entitlements import subscription_claims, subscription_from_claims
+from ..services.revocation import is_revoked
+from .metrics import incr
+from .ttl_cache import TTLCache
 from bson import ObjectId
+import copy
+import uuid
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pinning min/max to the configured cost makes needs_update() flag any hash
+# made with another cost, so changing bcrypt_rounds migrates users at login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+    bcrypt__max_rounds=settings.bcrypt_rounds
+)
 security = HTTPBearer()
 
+# The user fields request handlers read, including the few onboarding
+# answers ``/users/me`` returns; anything else (password hash) is loaded
+# by the handler that needs it
+PRINCIPAL_PROJECTION = {
+    "email": 1,
+    "name": 1,
+    "isAdmin": 1,
+    "subscription": 1,
+    "isOnboarded": 1,
+    "onboarding": 1,
+    "hasCompletedFirstScan": 1,
+    "createdAt": 1
+}
+
+# Authenticated users by id. Writes through this process invalidate their
+# entry; changes made by another process show up within the TTL.
+_principals = TTLCache(
+    settings.principal_cache_max_entries,
+    settings.principal_cache_ttl_seconds,
+    name="principal_cache"
+)
+
+
+def invalidate_principal(user_id):
+    """Drop a user's cached principal after changing their document."""
+    _principals.invalidate(str(user_id))
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -21,8 +64,67 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+# bcrypt releases the GIL, so hashing in threads keeps the event loop free.
+# Admission is bounded like the model calls: password_pool_workers hashes
+# run, password_max_queue more wait, anything beyond is rejected.
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.password_pool_workers,
+    thread_name_prefix="password"
+)
+_password_pending = 0
+
+
+class PasswordHasherBusyError(Exception):
+    """Raised when too many password hashes are already waiting."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Too many sign-in attempts, try again shortly")
+        self.retry_after = retry_after
+
+
+async def _run_in_password_pool(func, *args):
+    global _password_pending
+    
+    if _password_pending >= settings.password_pool_workers + settings.password_max_queue:
+        incr("auth.password.rejected")
+        raise PasswordHasherBusyError(settings.password_retry_after_seconds)
+    
+    _password_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_password_executor, func, *args)
+    finally:
+        _password_pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    """
+    Hash a password in the password worker pool.
+    
+    Raises:
+        PasswordHasherBusyError: If the pool's queue is full
+    """
+    return await _run_in_password_pool(get_password_hash, password)
+
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password in the password worker pool.
+    
+    Returns:
+        tuple: Whether it matched, and a replacement hash when the stored
+        one was made with a different cost (None otherwise)
+        
+    Raises:
+        PasswordHasherBusyError: If the pool's queue is full
+    """
+    return await _run_in_password_pool(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
+    # Token id, so a single token can be revoked
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
@@ -32,30 +134,77 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+def create_claims_token(user: dict) -> str:
+    """
+    Short-lived access token carrying the user's admin flag and subscription.
+    
+    Requests authorized from these claims skip the user lookup; they are
+    re-minted from the database by ``POST /auth/refresh``.
+    """
+    return create_access_token(
+        data={
+            "sub": str(user["_id"]),
+            "adm": bool(user.get("isAdmin", False)),
+            "ent": subscription_claims(user.get("subscription"))
+        },
+        expires_delta=timedelta(minutes=settings.claims_token_expire_minutes)
+    )
+
+
 def decode_token(token: str) -> Optional[TokenData]:
     try:
         payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
         user_id: str = payload.get("sub")
         if user_id is None:
             return None
-        return TokenData(user_id=user_id)
+        token_data = TokenData(
+            user_id=user_id,
+            jti=payload.get("jti"),
+            expiresAt=datetime.utcfromtimestamp(payload["exp"]) if payload.get("exp") else None
+        )
+        if "ent" in payload:
+            token_data.isAdmin = bool(payload.get("adm"))
+            token_data.subscription = subscription_from_claims(payload["ent"])
+        return token_data
     except JWTError:
         return None
 
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
-    token = credentials.credentials
+def _credentials_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+async def verify_token(token: str) -> TokenData:
+    """
+    Decode a bearer token and check it has not been revoked.
+    
+    Raises:
+        HTTPException: 401 if the token is invalid, expired or revoked
+    """
     token_data = decode_token(token)
     
-    if token_data is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    if token_data is None or (token_data.jti and await is_revoked(token_data.jti)):
+        raise _credentials_error()
+    
+    return token_data
+
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    token_data = await verify_token(credentials.credentials)
+    return await _load_user(token_data)
+
+
+async def _load_user(token_data: TokenData) -> dict:
+    cached = _principals.get(token_data.user_id)
+    if cached is not None:
+        return copy.deepcopy(cached)
     
     db = get_database()
-    user = await db.users.find_one({"_id": ObjectId(token_data.user_id)})
+    user = await db.users.find_one({"_id": ObjectId(token_data.user_id)}, PRINCIPAL_PROJECTION)
     
     if user is None:
         raise HTTPException(
@@ -65,6 +214,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         )
     
     user["_id"] = str(user["_id"])
+    _principals.put(token_data.user_id, copy.deepcopy(user))
     return user
 
 
@@ -72,7 +222,26 @@ async def get_current_active_user(current_user: dict = Depends(get_current_user)
     return current_user
 
 
-async def get_admin_user(current_user: dict = Depends(get_current_user)) -> dict:
+async def get_current_principal(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """
+    Who is calling and what they may do: ``_id``, ``isAdmin`` and ``subscription``.
+    
+    Built from the token's claims without touching the database when it
+    carries them; otherwise the full user as from ``get_current_user``.
+    """
+    token_data = await verify_token(credentials.credentials)
+    
+    if token_data.subscription is None:
+        return await _load_user(token_data)
+    
+    return {
+        "_id": token_data.user_id,
+        "isAdmin": token_data.isAdmin,
+        "subscription": token_data.subscription
+    }
+
+
+async def get_admin_user(current_user: dict = Depends(get_current_principal)) -> dict:
     if not current_user.get("isAdmin", False):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
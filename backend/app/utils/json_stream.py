@@ -0,0 +1,132 @@
+"""
+Incremental JSON parser for model output that arrives in chunks.
+
+Feed text as it streams in; every value that completes at a depth of at
+most ``max_depth`` is reported with its path, e.g. ``("summary",)`` or
+``("categories", 0)``. Anything before the first ``{`` (such as a markdown
+code fence) and after the root object closes is ignored.
+"""
+import json
+from typing import Any, List, Optional, Tuple
+
+Path = Tuple[Any, ...]
+
+
+class _Frame:
+    __slots__ = ("kind", "start", "key", "index", "expecting_key")
+
+    def __init__(self, kind: str, start: int):
+        self.kind = kind
+        self.start = start
+        self.key = None
+        self.index = 0
+        self.expecting_key = kind == "object"
+
+
+class JsonStreamParser:
+    def __init__(self, max_depth: int = 2):
+        self.max_depth = max_depth
+        self.result: Optional[Any] = None
+        self._text = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._scalar_start: Optional[int] = None
+        self._done = False
+
+    @property
+    def done(self) -> bool:
+        """True once the root object has been closed."""
+        return self._done
+
+    def _path(self) -> Path:
+        return tuple(
+            frame.key if frame.kind == "object" else frame.index
+            for frame in self._stack
+        )
+
+    def _value_done(self, start: int, end: int, events: list):
+        if len(self._stack) <= self.max_depth:
+            value = json.loads(self._text[start:end])
+            if not self._stack:
+                self.result = value
+                self._done = True
+            events.append((self._path(), value))
+
+    def _end_scalar(self, end: int, events: list):
+        if self._scalar_start is not None:
+            start, self._scalar_start = self._scalar_start, None
+            self._value_done(start, end, events)
+
+    def feed(self, chunk: str) -> List[Tuple[Path, Any]]:
+        """
+        Consume the next chunk of text.
+
+        Returns:
+            list: ``(path, value)`` for each value completed by this chunk;
+            the root object itself is reported with the path ``()``
+
+        Raises:
+            json.JSONDecodeError: If the text is not valid JSON
+        """
+        events = []
+        if self._done:
+            return events
+
+        self._text += chunk
+        text = self._text
+        i = self._pos
+        while i < len(text) and not self._done:
+            char = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        self._stack[-1].key = json.loads(text[self._string_start:i + 1])
+                    else:
+                        self._value_done(self._string_start, i + 1, events)
+                i += 1
+                continue
+
+            if not self._stack:
+                # Skip fences or prose until the root object opens
+                if char == "{":
+                    self._stack.append(_Frame("object", i))
+                i += 1
+                continue
+
+            frame = self._stack[-1]
+            if char in "{[":
+                self._stack.append(_Frame("object" if char == "{" else "array", i))
+            elif char in "}]":
+                self._end_scalar(i, events)
+                self._stack.pop()
+                self._value_done(frame.start, i + 1, events)
+            elif char == '"':
+                self._in_string = True
+                self._string_start = i
+                self._string_is_key = frame.kind == "object" and frame.expecting_key
+            elif char == ":":
+                frame.expecting_key = False
+            elif char == ",":
+                self._end_scalar(i, events)
+                if frame.kind == "object":
+                    frame.expecting_key = True
+                else:
+                    frame.index += 1
+            elif char in " \t\r\n":
+                self._end_scalar(i, events)
+            elif self._scalar_start is None:
+                self._scalar_start = i
+            i += 1
+
+        self._pos = i
+        return events
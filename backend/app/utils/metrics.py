@@ -0,0 +1,36 @@
+"""
+Minimal in-process counters.
+
+Values are per process and reset on restart; ``GET /metrics`` exposes a
+snapshot for dashboards and load tests.
+"""
+from collections import defaultdict
+from typing import Dict
+
+_counters: Dict[str, float] = defaultdict(int)
+
+
+def incr(name: str, value: float = 1):
+    """Add ``value`` to the counter ``name``."""
+    _counters[name] += value
+
+
+def get_counter(name: str) -> float:
+    return _counters.get(name, 0)
+
+
+def get_metrics() -> dict:
+    """
+    Snapshot of all counters, sorted by name.
+
+    For every ``<prefix>.miss`` counter a ``<prefix>.hitRatio`` is added,
+    counting all ``<prefix>.hit*`` counters as hits.
+    """
+    snapshot = {name: _counters[name] for name in sorted(_counters)}
+    for name in list(snapshot):
+        if name.endswith(".miss"):
+            prefix = name[:-len(".miss")]
+            hits = sum(value for key, value in snapshot.items() if key.startswith(f"{prefix}.hit"))
+            total = hits + snapshot[name]
+            snapshot[f"{prefix}.hitRatio"] = round(hits / total, 4) if total else None
+    return snapshot
@@ -0,0 +1,137 @@
+"""
+JSON responses written straight from Mongo documents.
+
+Routers used to copy each document into its response model, which FastAPI
+then validated and serialized a second time for ``response_model``. The
+documents are ones we wrote, so instead each response model is compiled
+once into a plan: which keys to emit, where to read them, their defaults,
+and the plans of nested models. A document is shaped by the plan (unknown
+keys dropped, ``_id`` read for ``id``, defaults filled in) and encoded in
+one ``pydantic_core.to_json`` call, with ObjectIds written as strings.
+
+Routes return a ``DocumentResponse``, which FastAPI sends as is; their
+``response_model`` is kept for the OpenAPI schema.
+"""
+from functools import lru_cache
+from types import UnionType
+from typing import Any, Callable, Iterable, List, Optional, Type, Union, get_args, get_origin
+
+from fastapi import Response
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+_MISSING = object()
+
+Shape = Callable[[Any], Any]
+
+
+def _is_model(annotation) -> bool:
+    return isinstance(annotation, type) and issubclass(annotation, BaseModel)
+
+
+def _union_shape(models: List[Type[BaseModel]]) -> Shape:
+    """Shape by the first model whose required fields are all present, as validation would pick."""
+    serializers = [serializer_for(model) for model in models]
+
+    def shape(value):
+        if not isinstance(value, dict):
+            return value
+        for serializer in serializers:
+            if all(source in value for source in serializer.required):
+                return serializer.shape(value)
+        return serializers[0].shape(value)
+    return shape
+
+
+def _shape_for(annotation) -> Optional[Shape]:
+    """How to shape a value of this type, or None to emit it unchanged."""
+    if _is_model(annotation):
+        return serializer_for(annotation).shape
+    # Numbers as validation would coerce them: a score stored as 7 is 7.0
+    if annotation is float or annotation is int:
+        return annotation
+
+    origin = get_origin(annotation)
+    args = get_args(annotation)
+    if origin in (Union, UnionType):
+        members = [arg for arg in args if arg is not type(None)]
+        if len(members) == 1:
+            return _shape_for(members[0])
+        models = [member for member in members if _is_model(member)]
+        return _union_shape(models) if models else None
+    if origin is list and args:
+        inner = _shape_for(args[0])
+        if inner is None:
+            return None
+        return lambda value: [inner(item) if item is not None else None for item in value]
+    if origin is dict and len(args) == 2:
+        inner = _shape_for(args[1])
+        if inner is None:
+            return None
+        return lambda value: {key: inner(item) if item is not None else None for key, item in value.items()}
+    return None
+
+
+class DocumentSerializer:
+    """Writes documents as the JSON of ``model`` (by alias), without validating them."""
+
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        # (name, output key, document key, default, shape)
+        self.fields = []
+        self.required = []
+        for name, field in model.model_fields.items():
+            key = field.alias or name
+            source = "_id" if name == "id" and not field.alias else key
+            default = None if field.is_required() else field.get_default(call_default_factory=True)
+            self.fields.append((name, key, source, default, _shape_for(field.annotation)))
+            if field.is_required():
+                self.required.append(source)
+
+    def shape(self, doc: dict, fields: Optional[Iterable[str]] = None) -> dict:
+        """The response-shaped dict; only ``id`` and ``fields`` if given."""
+        if fields is not None:
+            fields = {"id", *fields}
+        shaped = {}
+        for name, key, source, default, shape in self.fields:
+            if fields is not None and name not in fields:
+                continue
+            value = doc.get(source, _MISSING)
+            if value is _MISSING and name == "id":
+                value = doc.get("id", _MISSING)
+            if value is _MISSING:
+                value = default
+            elif value is not None and shape is not None:
+                value = shape(value)
+            shaped[key] = value
+        return shaped
+
+    def dump(self, doc: dict, fields: Optional[Iterable[str]] = None) -> bytes:
+        return to_json(self.shape(doc, fields), fallback=str)
+
+    def dump_many(self, docs: Iterable[dict], fields: Optional[Iterable[str]] = None) -> bytes:
+        return to_json([self.shape(doc, fields) for doc in docs], fallback=str)
+
+
+@lru_cache(maxsize=None)
+def serializer_for(model: Type[BaseModel]) -> DocumentSerializer:
+    return DocumentSerializer(model)
+
+
+class DocumentResponse(Response):
+    """
+    A document, or a list of them, sent as the JSON of a response model.
+
+    Example:
+        return DocumentResponse(course, CourseResponse)
+    """
+    media_type = "application/json"
+
+    def __init__(self, content: Any, model: Type[BaseModel], **kwargs):
+        self.serializer = serializer_for(model)
+        super().__init__(content, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, list):
+            return self.serializer.dump_many(content)
+        return self.serializer.dump(content)
@@ -0,0 +1,54 @@
+"""
+Bounded in-process cache with per-entry expiry.
+
+Least recently used entries are evicted beyond ``max_entries``; an entry is
+never served more than ``ttl_seconds`` after it was stored, which bounds
+how stale a value can get when another process changed it. Hits and misses
+are counted as ``<name>.hit`` / ``<name>.miss`` metrics.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from .metrics import incr
+
+
+class TTLCache:
+    def __init__(self, max_entries: int, ttl_seconds: float, name: str = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def _count(self, outcome: str):
+        if self.name:
+            incr(f"{self.name}.{outcome}")
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._entries.get(key)
+        if item is not None and item[0] < time.monotonic():
+            del self._entries[key]
+            item = None
+        if item is None:
+            self._count("miss")
+            return None
+        self._entries.move_to_end(key)
+        self._count("hit")
+        return item[1]
+
+    def put(self, key: Hashable, value: Any):
+        if self.ttl_seconds <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,153 @@
+"""
+Streaming ``multipart/form-data`` reader for image uploads.
+
+The request body is fed to ``python-multipart`` chunk by chunk as it
+arrives, so only the raw image bytes are ever held in memory: no base64
+text, no JSON string, no pydantic copy. Bodies whose parts add up to more
+than ``max_bytes`` are rejected as soon as the limit is crossed; malformed
+or truncated bodies are rejected with 400.
+"""
+from typing import Dict
+
+from fastapi import HTTPException, Request, status
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+
+MAX_FIELD_BYTES = 8 * 1024  # plain text fields such as imageUrl
+MAX_FIELDS = 16
+
+
+def is_multipart(request: Request) -> bool:
+    return request.headers.get("content-type", "").startswith("multipart/form-data")
+
+
+def _bad_request(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Upload exceeds {max_bytes // (1024 * 1024)} MB limit"
+    )
+
+
+async def read_body(request: Request, limit: int, max_bytes: int) -> bytes:
+    """
+    Read a non-multipart body, rejecting it with 413 as soon as it passes
+    ``limit`` bytes (``max_bytes`` is the upload size quoted in the error).
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        raise _too_large(max_bytes)
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise _too_large(max_bytes)
+    return bytes(body)
+
+
+async def read_multipart_upload(request: Request, file_field: str, max_bytes: int) -> dict:
+    """
+    Stream a multipart body, keeping one file field and small text fields.
+
+    Args:
+        request: The incoming request
+        file_field: Name of the form field that carries the file
+        max_bytes: Maximum accepted size of the file and text fields together
+
+    Returns:
+        dict: ``file`` (bytearray or None), ``contentType`` of the file part and
+        ``fields`` (other form fields as strings)
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + 64 * 1024:
+        raise _too_large(max_bytes)
+
+    _, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if not boundary:
+        raise _bad_request("Missing multipart boundary")
+
+    file_data = bytearray()
+    fields: Dict[str, bytearray] = {}
+    state = {"name": None, "headerField": b"", "headerValue": b"", "headers": {}, "bytes": 0, "ended": False}
+    result = {"file": None, "contentType": None}
+
+    def on_part_begin():
+        state["name"] = None
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["headerField"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["headerValue"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["headerField"].lower()] = state["headerValue"]
+        state["headerField"] = b""
+        state["headerValue"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        name = disposition.get(b"name", b"").decode("latin-1")
+        state["name"] = name
+        if name == file_field:
+            if result["file"] is not None:
+                raise _bad_request(f"Only one '{file_field}' part is allowed")
+            content_type = state["headers"].get(b"content-type")
+            result["contentType"] = content_type.decode("latin-1") if content_type else None
+        else:
+            if name not in fields and len(fields) >= MAX_FIELDS:
+                raise _bad_request("Too many form fields")
+            fields[name] = bytearray()
+
+    def on_part_data(data, start, end):
+        state["bytes"] += end - start
+        if state["bytes"] > max_bytes:
+            raise _too_large(max_bytes)
+        if state["name"] == file_field:
+            file_data.extend(data[start:end])
+        else:
+            field = fields[state["name"]]
+            if len(field) + (end - start) > MAX_FIELD_BYTES:
+                raise _bad_request(f"Form field '{state['name']}' is too long")
+            field.extend(data[start:end])
+
+    def on_part_end():
+        if state["name"] == file_field:
+            result["file"] = file_data
+
+    def on_end():
+        state["ended"] = True
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_end": on_end
+    })
+
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                parser.write(chunk)
+        parser.finalize()
+    except MultipartParseError:
+        raise _bad_request("Malformed multipart body")
+    # finalize() does not check that the closing boundary arrived
+    if not state["ended"]:
+        raise _bad_request("Malformed multipart body")
+
+    return {
+        "file": result["file"],
+        "contentType": result["contentType"],
+        "fields": {name: value.decode("utf-8", "replace") for name, value in fields.items()}
+    }
@@ -0,0 +1,39 @@
+"""
+Standalone scan job worker.
+
+Run with ``python -m app.worker`` (set ``SCAN_JOB_WORKERS=0`` on the API
+processes if all jobs should be handled here). Stops cleanly on SIGINT or
+SIGTERM; a job interrupted mid-flight is retried after its lease expires.
+"""
+import asyncio
+import signal
+
+from .config import settings
+from .database import connect_to_mongo, close_mongo_connection
+from .services.scan_jobs import start_workers
+
+
+async def main(concurrency: int = None):
+    concurrency = concurrency or max(settings.scan_job_workers, 1)
+    await connect_to_mongo()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: fall back to KeyboardInterrupt
+            pass
+
+    print(f"Scan worker started with {concurrency} coroutines")
+    tasks = start_workers(concurrency, stop)
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        await close_mongo_connection()
+        print("Scan worker stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
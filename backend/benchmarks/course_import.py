@@ -0,0 +1,140 @@
+"""
+Building a 5,000-chapter course: one admin call per record vs NDJSON import.
+
+Needs a MongoDB at MONGODB_URL; everything happens in a scratch
+``lookmax_benchmark`` database that is dropped at the end. For each
+chapter storage layout it times what the per-record endpoints do (the
+atomic edit returning the course, the response serialization and the
+catalog bump) for the first BASELINE_CHAPTERS chapters, then imports the
+whole course with ``import_courses`` from an NDJSON stream.
+
+The per-record cost grows with the course in the embedded layout, so the
+projection to the full course is a lower bound there.
+
+Run from the backend directory:
+
+    python -m benchmarks.course_import
+"""
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app import database
+from app.config import settings
+from app.models.course import CourseResponse
+from app.services import courses as course_edits
+from app.services.catalog import bump_catalog_version
+from app.services.course_bulk import import_courses
+from app.utils.serialization import serializer_for
+
+DB_NAME = "lookmax_benchmark"
+MODULES = 50
+CHAPTERS_PER_MODULE = 100
+CONTENT_BYTES = 500
+BASELINE_CHAPTERS = 500
+CHUNK_BYTES = 64 * 1024
+
+
+def records():
+    yield {"kind": "course", "title": "Benchmark course", "description": "Imported", "isActive": True}
+    for m in range(MODULES):
+        yield {"kind": "module", "title": f"Module {m}", "order": m}
+        for c in range(CHAPTERS_PER_MODULE):
+            yield {
+                "kind": "chapter",
+                "title": f"Chapter {m}.{c}",
+                "type": "text",
+                "content": "x" * CONTENT_BYTES,
+                "duration": 60,
+                "order": c
+            }
+
+
+async def upload():
+    """The NDJSON body in request-sized chunks, as ``request.stream()`` gives it."""
+    buffer = b""
+    for record in records():
+        buffer += json.dumps(record).encode() + b"\n"
+        if len(buffer) >= CHUNK_BYTES:
+            yield buffer
+            buffer = b""
+    if buffer:
+        yield buffer
+
+
+async def per_record(limit: int) -> float:
+    db = database.get_database()
+    result = await db.courses.insert_one({
+        "title": "Benchmark course",
+        "description": "One call per record",
+        "modules": [],
+        "isActive": True,
+        "totalDuration": 0,
+        "totalChapters": 0,
+        "createdAt": datetime.utcnow(),
+        "updatedAt": datetime.utcnow()
+    })
+    course_id = str(result.inserted_id)
+
+    started = time.perf_counter()
+    chapters = 0
+    for record in records():
+        if record["kind"] == "module":
+            module_id = str(uuid.uuid4())
+            course = await course_edits.add_module(course_id, {
+                "_id": module_id, "title": record["title"], "description": None,
+                "order": record["order"], "thumbnail": None, "chapters": []
+            })
+        elif record["kind"] == "chapter":
+            if chapters == limit:
+                break
+            chapters += 1
+            course = await course_edits.add_chapter(course_id, module_id, {
+                "_id": str(uuid.uuid4()), "title": record["title"], "type": record["type"],
+                "content": record["content"], "duration": record["duration"],
+                "order": record["order"], "thumbnail": None
+            })
+        else:
+            continue
+        serializer_for(CourseResponse).dump(course)
+        await bump_catalog_version()
+    return time.perf_counter() - started
+
+
+async def run(storage: str):
+    settings.course_chapter_storage = storage
+    total = MODULES * CHAPTERS_PER_MODULE
+
+    baseline = await per_record(BASELINE_CHAPTERS)
+    per_chapter = baseline / BASELINE_CHAPTERS
+
+    started = time.perf_counter()
+    result = await import_courses(upload())
+    imported = time.perf_counter() - started
+    assert result["chapters"] == total
+
+    print(
+        f"{storage:10} per-record: {per_chapter * 1000:6.2f} ms/chapter over {BASELINE_CHAPTERS}"
+        f" (>= {per_chapter * total:6.1f} s for {total})"
+        f" | import: {imported:5.2f} s ({total / imported:,.0f} chapters/s)"
+    )
+
+
+async def main():
+    database.client = AsyncIOMotorClient(settings.mongodb_url)
+    database.db = database.client[DB_NAME]
+    await database.db.chapters.create_index([("courseId", 1), ("moduleId", 1), ("order", 1), ("createdAt", 1)])
+    try:
+        for storage in ("embedded", "collection"):
+            await run(storage)
+    finally:
+        await database.client.drop_database(DB_NAME)
+        database.client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
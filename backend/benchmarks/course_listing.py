@@ -0,0 +1,98 @@
+"""
+Payload size and server-side cost of the course list, full vs summary.
+
+Builds a synthetic catalog (courses of modules of text chapters with
+inline content), then times what the API does per uncached request:
+decode the documents Mongo sends (BSON, with or without ``modules``
+projected away) and serialize the response body.
+
+Run from the backend directory:
+
+    python -m benchmarks.course_listing
+"""
+import statistics
+import time
+from datetime import datetime
+
+import bson
+from bson import ObjectId
+
+from app.services.catalog import _course_json, SUMMARY_FIELDS
+
+CATALOG_SIZES = [10, 50, 100]
+MODULES = 8
+CHAPTERS = 12
+CONTENT_BYTES = 2000
+RUNS = 15
+
+
+def synthetic_course(index: int) -> dict:
+    return {
+        "_id": ObjectId(),
+        "title": f"Course {index}",
+        "description": "A course about looking after yourself. " * 4,
+        "thumbnail": f"https://cdn.example.com/courses/{index}.jpg",
+        "modules": [
+            {
+                "_id": f"m{index}-{m}",
+                "title": f"Module {m}",
+                "description": "Module description",
+                "order": m,
+                "chapters": [
+                    {
+                        "_id": f"c{index}-{m}-{c}",
+                        "title": f"Chapter {c}",
+                        "type": "text",
+                        "content": "x" * CONTENT_BYTES,
+                        "duration": 300,
+                        "order": c
+                    }
+                    for c in range(CHAPTERS)
+                ]
+            }
+            for m in range(MODULES)
+        ],
+        "isActive": True,
+        "totalDuration": MODULES * CHAPTERS * 300,
+        "totalChapters": MODULES * CHAPTERS,
+        "createdAt": datetime.utcnow()
+    }
+
+
+def project(course: dict, fields) -> dict:
+    if fields is None:
+        return course
+    return {name: value for name, value in course.items() if name == "_id" or name in fields}
+
+
+def serve(wire, fields) -> bytes:
+    courses = [bson.decode(raw) for raw in wire]
+    return b"[" + b",".join(_course_json(course, fields) for course in courses) + b"]"
+
+
+def timed_ms(func, *args) -> float:
+    samples = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    print(f"{'courses':>8} {'view':>8} {'bson KB':>9} {'body KB':>9} {'server ms':>10}")
+    for size in CATALOG_SIZES:
+        catalog = [synthetic_course(i) for i in range(size)]
+        results = {}
+        for view, fields in (("full", None), ("summary", SUMMARY_FIELDS)):
+            wire = [bson.encode(project(course, fields)) for course in catalog]
+            body = serve(wire, fields)
+            results[view] = (sum(map(len, wire)), len(body), timed_ms(serve, wire, fields))
+            wire_bytes, body_bytes, ms = results[view]
+            print(f"{size:>8} {view:>8} {wire_bytes / 1024:>9.1f} {body_bytes / 1024:>9.1f} {ms:>10.2f}")
+        full, summary = results["full"], results["summary"]
+        print(f"{'':>8} {'ratio':>8} {full[0] / summary[0]:>8.0f}x {full[1] / summary[1]:>8.0f}x {full[2] / summary[2]:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Search latency of the in-memory course index at catalog scale.
+
+Builds a synthetic catalog (COURSES x MODULES x CHAPTERS, titles drawn
+from a skewed vocabulary so some words are common), then times
+``SearchIndex.search`` for exact, prefix, typo and multi-word queries,
+plus what an admin edit costs (re-indexing one course).
+
+Run from the backend directory:
+
+    python -m benchmarks.course_search
+"""
+import random
+import statistics
+import string
+import time
+
+from bson import ObjectId
+
+from app.services.course_search import SearchIndex
+
+COURSES = 100
+MODULES = 10
+CHAPTERS = 30
+VOCABULARY = 5000
+RUNS = 200
+
+random.seed(7)
+WORDS = sorted({
+    "".join(random.choice(string.ascii_lowercase) for _ in range(random.randint(4, 10)))
+    for _ in range(VOCABULARY)
+})
+# Zipf-like: a few words appear in many titles
+WEIGHTS = [1 / (rank + 1) for rank in range(len(WORDS))]
+
+
+def phrase(words: int) -> str:
+    return " ".join(random.choices(WORDS, WEIGHTS, k=words)).capitalize()
+
+
+def synthetic_course() -> dict:
+    return {
+        "_id": ObjectId(),
+        "title": phrase(3),
+        "description": phrase(12),
+        "modules": [
+            {
+                "_id": f"m{m}",
+                "title": phrase(3),
+                "chapters": [{"_id": f"c{m}-{c}", "title": phrase(4)} for c in range(CHAPTERS)]
+            }
+            for m in range(MODULES)
+        ]
+    }
+
+
+def typo(word: str) -> str:
+    i = len(word) // 2
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def timed_us(fn) -> tuple:
+    samples = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    courses = [synthetic_course() for _ in range(COURSES)]
+    index = SearchIndex()
+    started = time.perf_counter()
+    for course in courses:
+        index.add_course(course)
+    build = time.perf_counter() - started
+    print(
+        f"{COURSES * MODULES * CHAPTERS:,} chapters, {len(index):,} documents, {len(index.terms):,} terms;"
+        f" built in {build:.2f} s"
+    )
+
+    common, mid, rare = WORDS[0], WORDS[len(WORDS) // 10], WORDS[-1]
+    queries = [
+        ("exact, common word", common),
+        ("exact, rare word", rare),
+        ("prefix (3 letters)", mid[:3]),
+        ("typo (transposed)", typo(mid)),
+        ("two words", f"{mid} {rare}"),
+        ("no match", "zzzzqqq")
+    ]
+    print(f"{'query':24} {'median us':>10} {'p99 us':>8} {'hits':>6}")
+    for name, query in queries:
+        hits, _ = index.search(query, 20)
+        median, p99 = timed_us(lambda: index.search(query, 20))
+        print(f"{name:24} {median:10.0f} {p99:8.0f} {len(hits):6}")
+
+    course = courses[0]
+    median, p99 = timed_us(lambda: index.add_course(course))
+    print(f"{'re-index one course':24} {median:10.0f} {p99:8.0f}")
+
+
+if __name__ == "__main__":
+    main()
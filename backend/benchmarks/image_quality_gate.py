@@ -0,0 +1,97 @@
+"""
+Latency of the image quality gate per megapixel, plus its verdicts on
+synthetic sharp / blurry / dark / overexposed / off-centre portraits.
+
+In the scan path the gate runs on the normalized image (longest edge
+``image_max_edge``), so its cost is flat; the raw-upload column shows how
+it would scale if run on the original photo.
+
+Run from the backend directory:
+
+    python -m benchmarks.image_quality_gate
+"""
+import io
+import random
+import statistics
+import time
+
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+
+from app.services.image_processing import normalize_image
+from app.services.image_quality import assess_image_quality
+
+MEGAPIXELS = [0.5, 1, 2, 4, 8, 12]
+RUNS = 15
+
+
+def synthetic_portrait(width: int, height: int, center=(0.5, 0.45)) -> Image.Image:
+    """Smooth background with a textured, feature-rich oval where a face would be."""
+    img = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    img = ImageEnhance.Brightness(img).enhance(0.6)
+    draw = ImageDraw.Draw(img)
+    cx, cy = int(width * center[0]), int(height * center[1])
+    rx, ry = width // 5, height // 4
+    draw.ellipse((cx - rx, cy - ry, cx + rx, cy + ry), fill=(205, 160, 130))
+    rng = random.Random(1)
+    for _ in range(400):
+        x = rng.randint(cx - rx // 2, cx + rx // 2)
+        y = rng.randint(cy - ry // 2, cy + ry // 2)
+        r = rng.randint(1, max(2, width // 300))
+        shade = rng.randint(60, 140)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=(shade, shade - 20, shade - 30))
+    # Eyes, brows and mouth
+    for dx in (-rx // 2, rx // 2):
+        draw.ellipse((cx + dx - rx // 6, cy - ry // 4, cx + dx + rx // 6, cy - ry // 8), fill=(30, 30, 30))
+        draw.line((cx + dx - rx // 4, cy - ry // 3, cx + dx + rx // 4, cy - ry // 3), fill=(40, 30, 20), width=max(2, width // 200))
+    draw.line((cx - rx // 3, cy + ry // 2, cx + rx // 3, cy + ry // 2), fill=(120, 40, 40), width=max(2, width // 150))
+    return img
+
+
+def jpeg(img: Image.Image) -> bytes:
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+def timed_ms(func, *args) -> float:
+    samples = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    print(f"{'MP':>5} {'raw gate':>10} {'ms/MP':>7} {'normalize':>10} {'gate':>8} {'gate ms/MP':>11}")
+    for mp in MEGAPIXELS:
+        width = int((mp * 1_000_000 * 4 / 3) ** 0.5)
+        height = int(width * 3 / 4)
+        raw = jpeg(synthetic_portrait(width, height))
+        normalized = normalize_image(raw)["data"]
+
+        raw_gate = timed_ms(assess_image_quality, raw)
+        normalize = timed_ms(normalize_image, raw)
+        gate = timed_ms(assess_image_quality, normalized)
+        print(
+            f"{mp:>5} {raw_gate:>8.2f}ms {raw_gate / mp:>7.2f} {normalize:>8.2f}ms "
+            f"{gate:>6.2f}ms {gate / mp:>11.3f}"
+        )
+
+    base = synthetic_portrait(1600, 1200)
+    cases = {
+        "sharp": base,
+        "blurry": base.filter(ImageFilter.GaussianBlur(12)),
+        "dark": ImageEnhance.Brightness(base).enhance(0.12),
+        "overexposed": ImageEnhance.Brightness(base).enhance(3.5),
+        "off-centre": synthetic_portrait(1600, 1200, center=(0.88, 0.2)),
+    }
+    print()
+    for name, img in cases.items():
+        result = assess_image_quality(normalize_image(jpeg(img))["data"])
+        verdict = "pass" if result["passed"] else "reject: " + ", ".join(result["reasons"])
+        print(f"{name:>12}  {verdict:<32} {result['scores']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Traffic share and latency of adaptive model routing through a slowdown.
+
+Replaces the Gemini call with stand-in analyzers whose latency follows a
+per-phase profile (primary healthy, primary slow, primary recovered) and
+drives ``analyze_face`` with a steady arrival rate. Times are scaled down
+(SLO, dwell time, stats window and latencies in fractions of a second) so a run takes
+about half a minute. Prints, per window, the share of scans served by the
+fallback model and the p50/p95 scan latency, with and without routing.
+
+Run from the backend directory:
+
+    python -m benchmarks.model_routing
+"""
+import asyncio
+import random
+import time
+
+from app.config import settings
+from app.services import gemini
+from app.services.model_router import ModelRouter
+
+PRIMARY = "primary"
+FALLBACK = "fallback"
+ARRIVALS_PER_SECOND = 40
+WINDOW_SECONDS = 2.0
+LATENCY_SLO = 0.8
+
+# (duration seconds, mean latency of primary, mean latency of fallback)
+PHASES = [
+    (8.0, 0.3, 0.2),   # healthy
+    (10.0, 1.5, 0.2),  # primary slows down 5x
+    (14.0, 0.3, 0.2),  # primary recovers
+]
+
+_phase = {"index": 0}
+
+
+async def fake_generate(image: bytes, mime_type: str, model_name: str) -> dict:
+    _, primary, fallback = PHASES[_phase["index"]]
+    mean = primary if model_name == PRIMARY else fallback
+    await asyncio.sleep(random.lognormvariate(0, 0.35) * mean)
+    return gemini.get_default_analysis()
+
+
+def _quantile(samples, q):
+    if not samples:
+        return float("nan")
+    samples = sorted(samples)
+    return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+async def run(routing: bool):
+    gemini._router = ModelRouter(
+        PRIMARY,
+        FALLBACK if routing else None,
+        latency_slo=LATENCY_SLO,
+        queue_threshold=10_000,  # isolate the latency trigger
+        min_dwell_seconds=3.0,
+        min_samples=10,
+        probe_ratio=0.1,
+        window_seconds=3.0
+    )
+    gemini._breakers.clear()
+
+    results = []  # (finished_at, model, seconds)
+
+    async def one_scan():
+        started = time.monotonic()
+        result = await gemini.analyze_face(b"", "image/jpeg")
+        results.append((time.monotonic(), result["model"], time.monotonic() - started))
+
+    start = time.monotonic()
+    tasks = []
+    for index, (duration, _, _) in enumerate(PHASES):
+        _phase["index"] = index
+        phase_end = time.monotonic() + duration
+        while time.monotonic() < phase_end:
+            tasks.append(asyncio.create_task(one_scan()))
+            await asyncio.sleep(1 / ARRIVALS_PER_SECOND)
+    await asyncio.gather(*tasks)
+
+    print(f"\nrouting={'on' if routing else 'off'}")
+    print(f"{'window':>10} {'scans':>6} {'fallback':>9} {'p50':>7} {'p95':>7}")
+    total = sum(duration for duration, _, _ in PHASES)
+    window = 0.0
+    while window < total:
+        rows = [r for r in results if window <= r[0] - start < window + WINDOW_SECONDS]
+        if rows:
+            share = sum(1 for r in rows if r[1] == FALLBACK) / len(rows)
+            latencies = [r[2] for r in rows]
+            print(
+                f"{window:>5.0f}-{window + WINDOW_SECONDS:<4.0f} {len(rows):>6} {share:>8.0%} "
+                f"{_quantile(latencies, 0.5):>6.2f}s {_quantile(latencies, 0.95):>6.2f}s"
+            )
+        window += WINDOW_SECONDS
+
+    latencies = [r[2] for r in results]
+    print(f"overall p95 {_quantile(latencies, 0.95):.2f}s over {len(results)} scans")
+
+
+async def main():
+    gemini._generate = fake_generate
+    # Enough capacity that admission never rejects; retries and hedging off
+    gemini._slots = asyncio.Semaphore(10_000)
+    settings.gemini_max_concurrency = 10_000
+    settings.gemini_max_queue = 10_000
+    settings.gemini_retry_attempts = 1
+    settings.gemini_hedge_enabled = False
+
+    await run(routing=False)
+    await run(routing=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
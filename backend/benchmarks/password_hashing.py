@@ -0,0 +1,88 @@
+"""
+Login throughput and event-loop responsiveness while bcrypt runs.
+
+Drives a burst of concurrent logins for a few seconds, each verifying a
+password either inline on the event loop (how the auth routes used to do
+it) or through the bounded password pool, while a probe stands in for a
+non-auth request every 10 ms and records how long it waited for the loop.
+Logins rejected by admission control are counted separately.
+
+Run from the backend directory:
+
+    python -m benchmarks.password_hashing
+"""
+import asyncio
+import statistics
+import time
+
+from app.config import settings
+from app.utils import auth
+
+CONCURRENT_LOGINS = 32
+DURATION_SECONDS = 5.0
+PROBE_INTERVAL = 0.01
+
+
+def quantile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def inline_login(password: str, hashed: str):
+    auth.verify_password(password, hashed)
+
+
+async def pooled_login(password: str, hashed: str):
+    await auth.verify_and_update_password(password, hashed)
+
+
+async def run(login) -> dict:
+    hashed = auth.get_password_hash("correct horse")
+    deadline = time.perf_counter() + DURATION_SECONDS
+    done, rejected, probes = [], [0], []
+
+    async def client():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                await login("correct horse", hashed)
+                done.append(time.perf_counter() - started)
+            except auth.PasswordHasherBusyError:
+                rejected[0] += 1
+                await asyncio.sleep(0.05)
+
+    async def probe():
+        while time.perf_counter() < deadline:
+            scheduled = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL)
+            probes.append(time.perf_counter() - scheduled - PROBE_INTERVAL)
+
+    started = time.perf_counter()
+    await asyncio.gather(probe(), *(client() for _ in range(CONCURRENT_LOGINS)))
+    elapsed = time.perf_counter() - started
+    return {
+        "logins/s": len(done) / elapsed,
+        "rejected": rejected[0],
+        "login p50": statistics.median(done) if done else 0.0,
+        "probe p50": statistics.median(probes) if probes else 0.0,
+        "probe p99": quantile(probes, 0.99) if probes else 0.0,
+        "probes": len(probes)
+    }
+
+
+def main():
+    print(
+        f"bcrypt cost {settings.bcrypt_rounds}, {CONCURRENT_LOGINS} concurrent logins, "
+        f"{settings.password_pool_workers} pool workers, queue {settings.password_max_queue}"
+    )
+    print(f"{'mode':>8} {'logins/s':>9} {'429s':>6} {'login p50':>10} {'probe p50':>10} {'probe p99':>10} {'probes':>7}")
+    for name, login in (("inline", inline_login), ("pool", pooled_login)):
+        r = asyncio.run(run(login))
+        print(
+            f"{name:>8} {r['logins/s']:>9.1f} {r['rejected']:>6} {r['login p50'] * 1000:>8.0f}ms "
+            f"{r['probe p50'] * 1000:>8.1f}ms {r['probe p99'] * 1000:>8.1f}ms {r['probes']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
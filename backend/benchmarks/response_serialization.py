@@ -0,0 +1,164 @@
+"""
+Per-request CPU to turn Mongo documents into a response body.
+
+Compares, for the largest course we allow and a full 100-scan history
+page:
+
+- model: what the routes did before, building the response model from
+  the document and letting FastAPI validate and serialize it again for
+  ``response_model`` (``serialize_response`` + ``JSONResponse``);
+- document: ``DocumentResponse``, shaping the document by the model's
+  compiled plan and encoding it in one ``to_json`` call.
+
+Run from the backend directory:
+
+    python -m benchmarks.response_serialization
+"""
+import asyncio
+import statistics
+import time
+from datetime import datetime
+from typing import List, Union
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.models.course import CourseResponse
+from app.models.scan import ScanResponse, ScanSummary
+from app.services.scans import scan_to_response, scan_view
+from app.utils.serialization import DocumentResponse
+
+MODULES = 50
+CHAPTERS_PER_MODULE = 100
+CONTENT_BYTES = 500
+SCANS = 100
+RUNS = 20
+
+
+def large_course() -> dict:
+    return {
+        "_id": ObjectId(),
+        "title": "Large course",
+        "description": "A course about looking after yourself. " * 4,
+        "thumbnail": "https://cdn.example.com/courses/large.jpg",
+        "modules": [
+            {
+                "_id": f"m{m}",
+                "title": f"Module {m}",
+                "description": "Module description",
+                "order": m,
+                "chapters": [
+                    {
+                        "_id": f"c{m}-{c}",
+                        "title": f"Chapter {c}",
+                        "type": "text",
+                        "content": "x" * CONTENT_BYTES,
+                        "duration": 300,
+                        "order": c
+                    }
+                    for c in range(CHAPTERS_PER_MODULE)
+                ]
+            }
+            for m in range(MODULES)
+        ],
+        "isActive": True,
+        "totalDuration": MODULES * CHAPTERS_PER_MODULE * 300,
+        "totalChapters": MODULES * CHAPTERS_PER_MODULE,
+        "createdAt": datetime.utcnow(),
+        "updatedAt": datetime.utcnow()
+    }
+
+
+def scan_page() -> List[dict]:
+    analysis = {
+        "overallScore": 7.4,
+        "summary": "Balanced features with good skin clarity. " * 5,
+        "categories": [
+            {
+                "name": name,
+                "score": 7.0,
+                "observation": "Even tone with minor texture around the cheeks. " * 2,
+                "recommendations": ["Use a gentle exfoliant twice a week", "Apply SPF 30 daily"]
+            }
+            for name in ("skin", "jawline", "eyes", "hair", "symmetry", "grooming")
+        ],
+        "topPriorities": ["Hydration", "Sleep", "Sun protection"]
+    }
+    return [
+        {
+            "_id": ObjectId(),
+            "userId": "65f000000000000000000000",
+            "imageUrl": None,
+            "analysis": analysis,
+            "isFallback": False,
+            "model": "gemini-2.0-flash",
+            "createdAt": datetime.utcnow(),
+            "image": {"sha256": "ab" * 32}
+        }
+        for _ in range(SCANS)
+    ]
+
+
+def course_model_body(course: dict) -> CourseResponse:
+    # What the course routes built by hand before
+    return CourseResponse(
+        id=str(course["_id"]),
+        title=course["title"],
+        description=course["description"],
+        thumbnail=course.get("thumbnail"),
+        modules=course.get("modules", []),
+        isActive=course.get("isActive", True),
+        totalDuration=course.get("totalDuration", 0),
+        totalChapters=course.get("totalChapters", 0),
+        createdAt=course.get("createdAt")
+    )
+
+
+async def cpu_ms(render) -> float:
+    samples = []
+    for _ in range(RUNS):
+        started = time.process_time()
+        await render()
+        samples.append((time.process_time() - started) * 1000)
+    return statistics.median(samples)
+
+
+async def main():
+    course = large_course()
+    scans = scan_page()
+    course_field = create_response_field("response", CourseResponse)
+    scans_field = create_response_field("response", Union[List[ScanResponse], List[ScanSummary]])
+
+    async def course_via_model():
+        content = await serialize_response(field=course_field, response_content=course_model_body(course))
+        return JSONResponse(content).body
+
+    async def course_via_document():
+        return DocumentResponse(course, CourseResponse).body
+
+    async def scans_via_model():
+        content = await serialize_response(
+            field=scans_field,
+            response_content=[scan_to_response(scan, True) for scan in scans]
+        )
+        return JSONResponse(content).body
+
+    async def scans_via_document():
+        return DocumentResponse([scan_view(scan, True) for scan in scans], ScanResponse).body
+
+    cases = [
+        (f"course ({MODULES * CHAPTERS_PER_MODULE} chapters)", course_via_model, course_via_document),
+        (f"scan list ({SCANS})", scans_via_model, scans_via_document)
+    ]
+    print(f"{'payload':28} {'model ms':>10} {'document ms':>12} {'speedup':>8} {'KB':>8}")
+    for name, via_model, via_document in cases:
+        model_ms = await cpu_ms(via_model)
+        document_ms = await cpu_ms(via_document)
+        size = len(await via_document()) / 1024
+        print(f"{name:28} {model_ms:10.2f} {document_ms:12.2f} {model_ms / document_ms:7.1f}x {size:8.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
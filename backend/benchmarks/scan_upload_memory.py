@@ -0,0 +1,112 @@
+"""
+Peak server memory for concurrent scan uploads: base64 JSON vs multipart.
+
+Starts a uvicorn server per mode (so each gets a fresh process), sends
+CONCURRENCY uploads of UPLOAD_MB each at the same time, and reports the
+server's peak RSS (VmHWM, Linux only). The server routes use the same
+parsing code as ``POST /api/scans/analyze`` and hold each request open for
+a moment, like a model call would, so all uploads are live at once.
+
+Run from the backend directory:
+
+    python -m benchmarks.scan_upload_memory
+"""
+import asyncio
+import base64
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+
+from app.models.scan import ScanCreate
+from app.services.image_processing import decode_base64_image
+from app.utils.uploads import read_multipart_upload
+
+CONCURRENCY = 50
+UPLOAD_MB = 8
+HOLD_SECONDS = 2.0
+PORT = 8765
+
+bench_app = FastAPI()
+
+
+@bench_app.post("/json")
+async def json_upload(scan_data: ScanCreate):
+    # The original path: JSON string -> pydantic model -> decoded bytes
+    raw = decode_base64_image(scan_data.imageBase64)
+    await asyncio.sleep(HOLD_SECONDS)
+    return {"bytes": len(raw)}
+
+
+@bench_app.post("/multipart")
+async def multipart_upload(request: Request):
+    upload = await read_multipart_upload(request, "image", 64 * 1024 * 1024)
+    await asyncio.sleep(HOLD_SECONDS)
+    return {"bytes": len(upload["file"])}
+
+
+@bench_app.get("/peak")
+async def peak_rss():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM"):
+                return {"peakKb": int(line.split()[1])}
+    return {"peakKb": None}
+
+
+async def _wait_ready(client: httpx.AsyncClient):
+    for _ in range(100):
+        try:
+            await client.get("/peak")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("benchmark server did not start")
+
+
+async def run_mode(mode: str, payload: bytes) -> dict:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.scan_upload_memory:bench_app",
+         "--port", str(PORT), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=120) as client:
+            await _wait_ready(client)
+            baseline = (await client.get("/peak")).json()["peakKb"]
+
+            if mode == "json":
+                body = b'{"imageBase64": "' + base64.b64encode(payload) + b'"}'
+                send = lambda: client.post("/json", content=body, headers={"content-type": "application/json"})
+            else:
+                send = lambda: client.post("/multipart", files={"image": ("scan.jpg", payload, "image/jpeg")})
+
+            started = time.perf_counter()
+            responses = await asyncio.gather(*(send() for _ in range(CONCURRENCY)))
+            elapsed = time.perf_counter() - started
+            assert all(r.status_code == 200 for r in responses), [r.status_code for r in responses]
+
+            peak = (await client.get("/peak")).json()["peakKb"]
+            return {"mode": mode, "baselineMb": baseline / 1024, "peakMb": peak / 1024, "seconds": elapsed}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def main():
+    payload = os.urandom(UPLOAD_MB * 1024 * 1024)
+    print(f"{CONCURRENCY} concurrent uploads of {UPLOAD_MB} MB")
+    for mode in ("json", "multipart"):
+        result = await run_mode(mode, payload)
+        print(
+            f"{result['mode']:>10}: peak RSS {result['peakMb']:8.1f} MB "
+            f"(idle {result['baselineMb']:.1f} MB, +{result['peakMb'] - result['baselineMb']:.1f} MB) "
+            f"in {result['seconds']:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -146,6 +146,8 @@ async def seed_database():
             "updatedAt": datetime.utcnow()
         }
         await db.courses.insert_one(sample_course)
+        # Running API processes cache the catalog per version
+        await db.meta.update_one({"_id": "catalog"}, {"$inc": {"version": 1}}, upsert=True)
         print("Created sample course: The Ultimate GlowUp Guide")
     else:
         print("Sample course already exists")
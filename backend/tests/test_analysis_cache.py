@@ -0,0 +1,68 @@
+import asyncio
+
+from app.services import analysis_cache
+
+
+def _patch(monkeypatch, results):
+    calls = []
+
+    async def analyze_face(image, mime_type="image/jpeg"):
+        calls.append(image)
+        await asyncio.sleep(0.01)
+        return results[len(calls) - 1]
+
+    async def lookup(key):
+        return None
+
+    async def store(key, analysis, model=None):
+        pass
+
+    monkeypatch.setattr(analysis_cache, "analyze_face", analyze_face)
+    monkeypatch.setattr(analysis_cache, "_lookup", lookup)
+    monkeypatch.setattr(analysis_cache, "_store", store)
+    monkeypatch.setattr(analysis_cache.settings, "analysis_cache_enabled", True)
+    return calls
+
+
+async def _twice():
+    return await asyncio.gather(
+        analysis_cache.analyze_face_cached(b"image"),
+        analysis_cache.analyze_face_cached(b"image")
+    )
+
+
+def test_waiter_shares_a_success_without_cached(monkeypatch):
+    calls = _patch(monkeypatch, [{"success": True, "analysis": {}, "model": "m"}])
+    leader, waiter = asyncio.run(_twice())
+
+    assert len(calls) == 1
+    assert leader["cached"] is False and waiter["cached"] is False
+    assert waiter["success"]
+
+
+def test_waiter_retries_after_a_fallback(monkeypatch):
+    calls = _patch(monkeypatch, [
+        {"success": False, "fallback": True, "analysis": {}, "model": "m"},
+        {"success": True, "analysis": {}, "model": "m"}
+    ])
+    leader, waiter = asyncio.run(_twice())
+
+    assert len(calls) == 2
+    assert leader["fallback"] and waiter["success"]
+    assert waiter["cached"] is False
+
+
+def test_waiters_share_one_retry_after_a_fallback(monkeypatch):
+    calls = _patch(monkeypatch, [
+        {"success": False, "fallback": True, "analysis": {}, "model": "m"},
+        {"success": True, "analysis": {}, "model": "m"}
+    ])
+
+    async def three():
+        return await asyncio.gather(*(analysis_cache.analyze_face_cached(b"image") for _ in range(3)))
+
+    leader, *waiters = asyncio.run(three())
+
+    assert len(calls) == 2
+    assert leader["fallback"]
+    assert all(waiter["success"] for waiter in waiters)
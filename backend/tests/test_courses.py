@@ -0,0 +1,80 @@
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+from app import database
+from app.main import app
+from app.services import catalog
+from app.utils.auth import get_current_active_user
+
+COURSE_ID = ObjectId()
+MODULE = {
+    "_id": "m1",
+    "title": "Skin basics",
+    "description": None,
+    "order": 0,
+    "thumbnail": None,
+    "chapters": [{"_id": "c1", "title": "Cleansing", "type": "text", "content": "...", "duration": 60, "order": 0}]
+}
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class _Courses:
+    def __init__(self):
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        match = pipeline[0]["$match"]
+        found = match["_id"] == COURSE_ID and match["modules._id"] == MODULE["_id"]
+        return _Cursor([{"_id": COURSE_ID, "module": MODULE}] if found else [])
+
+
+class _Meta:
+    async def find_one(self, *args, **kwargs):
+        return None
+
+
+class _Database:
+    def __init__(self):
+        self.courses = _Courses()
+        self.meta = _Meta()
+
+
+def _client(monkeypatch) -> tuple:
+    db = _Database()
+    monkeypatch.setattr(database, "db", db)
+    monkeypatch.setattr(catalog, "_version", None)
+    monkeypatch.setattr(catalog, "_entries", {})
+    app.dependency_overrides[get_current_active_user] = lambda: {"_id": ObjectId()}
+    return TestClient(app), db
+
+
+def test_get_module_reads_it_with_its_chapters(monkeypatch):
+    client, db = _client(monkeypatch)
+    try:
+        response = client.get(f"/api/courses/{COURSE_ID}/modules/m1")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.json()["_id"] == "m1"
+    assert [chapter["_id"] for chapter in response.json()["chapters"]] == ["c1"]
+    assert response.headers["etag"]
+    assert len(db.courses.pipelines) == 1
+
+
+def test_get_module_not_found(monkeypatch):
+    client, _ = _client(monkeypatch)
+    try:
+        response = client.get(f"/api/courses/{COURSE_ID}/modules/missing")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 404
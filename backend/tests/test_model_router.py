@@ -0,0 +1,70 @@
+from app.services import model_router
+from app.services.model_router import ModelRouter
+
+PRIMARY = "primary"
+FALLBACK = "fallback"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _drive(router: ModelRouter, clock: Clock, seconds: float, per_second: float, latency: dict, queue_depth: int = 0):
+    """Send scans at ``per_second`` for ``seconds``; returns the share served by the fallback."""
+    served = {PRIMARY: 0, FALLBACK: 0}
+    end = clock.now + seconds
+    while clock.now < end:
+        model = router.choose(queue_depth)
+        served[model] += 1
+        router.record(model, latency[model], True)
+        clock.now += 1 / per_second
+    return served[FALLBACK] / sum(served.values())
+
+
+def _router(monkeypatch) -> tuple:
+    clock = Clock()
+    monkeypatch.setattr(model_router.time, "monotonic", clock)
+    router = ModelRouter(
+        PRIMARY, FALLBACK,
+        latency_slo=1.0, min_dwell_seconds=30.0, probe_ratio=0.0, min_samples=10, window_seconds=60.0
+    )
+    return router, clock
+
+
+def test_degrades_on_slow_primary_and_recovers(monkeypatch):
+    router, clock = _router(monkeypatch)
+    healthy = {PRIMARY: 0.3, FALLBACK: 0.2}
+    slow = {PRIMARY: 3.0, FALLBACK: 0.2}
+
+    assert _drive(router, clock, 60, 1, healthy) == 0
+    assert not router.degraded
+
+    _drive(router, clock, 60, 1, slow)
+    assert router.degraded
+    assert router.reason.startswith("p95")
+
+    # Still slow: the timed probes keep it on the fallback
+    assert _drive(router, clock, 120, 1, slow) > 0.8
+    assert router.degraded
+
+    _drive(router, clock, 180, 1, healthy)
+    assert not router.degraded
+    assert _drive(router, clock, 30, 1, healthy) == 0
+
+
+def test_recovers_at_low_traffic_after_a_queue_spike(monkeypatch):
+    router, clock = _router(monkeypatch)
+    healthy = {PRIMARY: 0.3, FALLBACK: 0.2}
+
+    _drive(router, clock, 1, 1, healthy, queue_depth=50)
+    assert router.degraded
+    assert router.reason.startswith("queue depth")
+
+    # One scan every 10 seconds; without timed probes 5% of them would
+    # never reach the 10 primary samples recovery needs
+    _drive(router, clock, 600, 0.1, healthy)
+    assert not router.degraded
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.services.resilience import call_with_retries, hedged
+
+
+def test_hedge_skipped_without_a_free_slot():
+    async def scenario():
+        slots = asyncio.Semaphore(1)
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        async with slots:
+            result = await hedged(call, 0.01, slots)
+        return result, len(calls)
+
+    assert asyncio.run(scenario()) == ("ok", 1)
+
+
+def test_hedge_holds_a_slot_until_it_finishes():
+    async def scenario():
+        slots = asyncio.Semaphore(2)
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.05 if len(calls) == 1 else 0.01)
+            return len(calls)
+
+        async with slots:
+            result = await hedged(call, 0.01, slots)
+            await asyncio.sleep(0)
+            free = slots._value
+        return result, len(calls), free
+
+    assert asyncio.run(scenario()) == (2, 2, 1)
+
+
+def test_hedge_cancels_its_calls_with_the_caller():
+    async def scenario():
+        started = []
+
+        async def call():
+            task = asyncio.current_task()
+            started.append(task)
+            await asyncio.sleep(1)
+
+        caller = asyncio.ensure_future(hedged(call, 0.01))
+        await asyncio.sleep(0.05)
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        await asyncio.sleep(0)
+        return [task.cancelled() for task in started]
+
+    assert asyncio.run(scenario()) == [True, True]
+
+
+def test_malformed_reply_is_not_retried():
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        raise json.JSONDecodeError("truncated", "{", 1)
+
+    with pytest.raises(json.JSONDecodeError):
+        asyncio.run(call_with_retries(call, attempts=3, base_delay=0.01, max_delay=0.01))
+    assert len(attempts) == 1
+
+
+def test_no_retry_after_the_deadline():
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        raise asyncio.TimeoutError()
+
+    async def scenario():
+        await call_with_retries(
+            call, attempts=5, base_delay=0.01, max_delay=0.01, deadline=time.monotonic() - 1
+        )
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(scenario())
+    assert len(attempts) == 1
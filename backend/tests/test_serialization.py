@@ -0,0 +1,111 @@
+import json
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.models.course import CourseResponse
+from app.models.progress import ProgressResponse
+from app.models.scan import ScanResponse
+from app.models.user import UserResponse
+from app.utils.serialization import DocumentResponse, serializer_for
+
+CREATED = datetime(2024, 5, 6, 7, 8, 9, 123456)
+
+
+def _validated(model, doc: dict) -> bytes:
+    """What the route returned before: the validated response model, as FastAPI encodes it."""
+    return model.model_validate({**doc, "id": str(doc["_id"])}).model_dump_json(by_alias=True).encode()
+
+
+def _assert_same(model, doc: dict):
+    # Byte for byte, so 7 vs 7.0 or key order would show
+    assert serializer_for(model).dump(doc) == _validated(model, doc)
+
+
+def test_scan_with_full_analysis():
+    _assert_same(ScanResponse, {
+        "_id": ObjectId(),
+        "userId": "u1",
+        "imageUrl": None,
+        "image": {"sha256": "abc", "width": 512},
+        "analysis": {
+            "overallScore": 7.5,
+            "summary": "Good",
+            "categories": [
+                {"name": "Skin", "score": 7, "observation": "Clear", "recommendations": ["Sleep"]},
+                {"name": "Jaw", "score": 8.2, "observation": "Defined"}
+            ]
+        },
+        "promptVersion": "v3",
+        "model": "gemini",
+        "isBlurred": False,
+        "createdAt": CREATED
+    })
+
+
+def test_scan_with_locked_analysis_and_defaults():
+    _assert_same(ScanResponse, {
+        "_id": ObjectId(),
+        "userId": "u1",
+        "analysis": {"categories": [{"name": "Skin"}, {"name": "Jaw"}]}
+    })
+
+
+def test_course_tree():
+    _assert_same(CourseResponse, {
+        "_id": ObjectId(),
+        "title": "Skin",
+        "description": "Basics",
+        "modules": [
+            {
+                "_id": "m1",
+                "title": "Week 1",
+                "chapters": [
+                    {"_id": "c1", "title": "Intro", "type": "video", "content": "https://x", "duration": 60, "order": 1},
+                    {"_id": "c2", "title": "Notes", "type": "text", "content": "...", "courseId": ObjectId(), "moduleId": "m1"}
+                ]
+            },
+            {"_id": "m2", "title": "Week 2", "order": 1}
+        ],
+        "totalDuration": 60,
+        "totalChapters": 2,
+        "chapterStorage": "collection",
+        "createdAt": CREATED,
+        "updatedAt": CREATED
+    })
+
+
+def test_user_drops_private_fields():
+    doc = {
+        "_id": ObjectId(),
+        "email": "a@example.com",
+        "name": "A",
+        "password": "hash",
+        "isAdmin": True,
+        "onboarding": {"age": 30, "goals": ["jaw"]},
+        "subscription": {"status": "active", "stripeCustomerId": "cus_1", "expiresAt": CREATED},
+        "createdAt": CREATED
+    }
+    _assert_same(UserResponse, doc)
+    assert b"password" not in serializer_for(UserResponse).dump(doc)
+
+
+def test_progress():
+    _assert_same(ProgressResponse, {
+        "_id": ObjectId(),
+        "userId": "u1",
+        "courseId": "c1",
+        "completedChapters": ["a", "b"],
+        "percentComplete": 12.5,
+        "lastAccessedAt": CREATED,
+        "createdAt": CREATED
+    })
+
+
+def test_document_response_renders_lists():
+    docs = [
+        {"_id": ObjectId(), "userId": "u1", "courseId": "c1"},
+        {"_id": ObjectId(), "userId": "u1", "courseId": "c2", "percentComplete": 50.0}
+    ]
+    body = json.loads(DocumentResponse(docs, ProgressResponse).body)
+    assert body == [json.loads(_validated(ProgressResponse, doc)) for doc in docs]
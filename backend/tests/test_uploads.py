@@ -0,0 +1,80 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.utils.uploads import MAX_FIELDS, read_body, read_multipart_upload
+
+BOUNDARY = "xyz"
+MAX_BYTES = 1024
+
+app = FastAPI()
+
+
+@app.post("/upload")
+async def upload(request: Request):
+    result = await read_multipart_upload(request, "image", MAX_BYTES)
+    return {"size": len(result["file"] or b""), "fields": result["fields"]}
+
+
+@app.post("/body")
+async def body(request: Request):
+    return {"size": len(await read_body(request, MAX_BYTES, MAX_BYTES))}
+
+
+client = TestClient(app, raise_server_exceptions=False)
+
+
+def _part(name: str, data: bytes, filename: str = None) -> bytes:
+    disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+    return f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + data + b"\r\n"
+
+
+def _post(body: bytes):
+    return client.post(
+        "/upload",
+        content=body,
+        headers={"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+    )
+
+
+def test_reads_file_and_fields():
+    response = _post(_part("image", b"\x89PNG", "a.png") + _part("imageUrl", b"x") + f"--{BOUNDARY}--\r\n".encode())
+    assert response.status_code == 200
+    assert response.json() == {"size": 4, "fields": {"imageUrl": "x"}}
+
+
+def test_malformed_body_is_rejected():
+    assert _post(b"--wrong\r\nnot a part\r\n").status_code == 400
+
+
+def test_truncated_body_is_rejected():
+    assert _post(_part("image", b"\x89PNG", "a.png")[:-10]).status_code == 400
+
+
+def test_second_image_is_rejected():
+    body = _part("image", b"a", "a.png") + _part("image", b"b", "b.png") + f"--{BOUNDARY}--\r\n".encode()
+    assert _post(body).status_code == 400
+
+
+def test_field_count_is_capped():
+    body = b"".join(_part(f"f{i}", b"x") for i in range(MAX_FIELDS + 1)) + f"--{BOUNDARY}--\r\n".encode()
+    assert _post(body).status_code == 400
+
+
+def test_fields_count_toward_the_size_limit():
+    body = b"".join(_part(f"f{i}", b"x" * 200) for i in range(6)) + f"--{BOUNDARY}--\r\n".encode()
+    assert _post(body).status_code == 413
+
+
+def _chunks(data: bytes, size: int = 256):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def test_body_within_the_limit_is_read():
+    response = client.post("/body", content=_chunks(b"x" * MAX_BYTES))
+    assert response.json() == {"size": MAX_BYTES}
+
+
+def test_body_is_cut_off_at_the_limit():
+    # Chunked, so there is no content-length to reject it up front
+    assert client.post("/body", content=_chunks(b"x" * (MAX_BYTES + 1))).status_code == 413